@@ -148,17 +148,18 @@ class ReasoningDemo:
             print(f"   Contexto: '{context}'")
             
             # Obtener patrones activos
-            active_patterns = self.model._get_active_patterns(context)
+            active_patterns = self.model._activate_patterns(context)
             print(f"   Patrones activos: {len(active_patterns)}")
             
             if active_patterns:
                 # Mostrar top 3 patrones
-                for i, (pattern, score) in enumerate(active_patterns[:3], 1):
-                    print(f"     {i}. '{pattern}' (score: {score:.3f})")
+                for i, (pattern_id, score) in enumerate(active_patterns[:3], 1):
+                    print(f"     {i}. '{self.model._pattern_string(pattern_id)}' (score: {score:.3f})")
                 
-                # Predecir siguiente token
-                next_token = self.model._predict_next_token(context, active_patterns, 0.7)
-                if next_token:
+                # Predecir siguiente token (el modelo devuelve un ID de palabra)
+                next_token_id = self.model._predict_next_token(context, active_patterns, 0.7)
+                if next_token_id is not None:
+                    next_token = self.model.vocab[next_token_id]
                     result_tokens.append(next_token)
                     print(f"   → Predicción: '{next_token}'")
                     print(f"   → Resultado parcial: '{' '.join(result_tokens)}'")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Benchmark del Tokenizador del UltraEfficientLLM
+Mide tokens/segundo de smart_tokenize (por texto y en lote)
+"""
+
+import sys
+import os
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from ultra_efficient_llm import benchmark_tokenizer
+
+
+def load_texts(paths, min_texts):
+    """Lee los archivos (una línea = un texto) y los repite hasta tener `min_texts` textos"""
+    texts = []
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            texts.extend(line.strip() for line in f if line.strip())
+    if not texts:
+        raise ValueError("No hay textos para el benchmark")
+    return (texts * (min_texts // len(texts) + 1))[:max(min_texts, len(texts))]
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    default_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'test_text.txt')
+    parser = argparse.ArgumentParser(description="Benchmark del tokenizador del UltraEfficientLLM")
+    parser.add_argument("paths", nargs="*", default=[default_path], help="Archivos de texto (una línea = un texto)")
+    parser.add_argument("--texts", type=int, default=20000, help="Número mínimo de textos")
+    parser.add_argument("--repeats", type=int, default=3, help="Pasadas (se toma la mejor)")
+    
+    args = parser.parse_args()
+    
+    texts = load_texts(args.paths, args.texts)
+    print("⏱️ BENCHMARK DEL TOKENIZADOR")
+    print("=" * 60)
+    result = benchmark_tokenizer(texts, args.repeats)
+    print(f"📄 Textos: {result['texts']}")
+    print(f"🔤 Tokens: {result['tokens']}")
+    print(f"⚡ Por texto: {result['tokens_per_second']:,.0f} tokens/seg")
+    print(f"⚡ En lote:   {result['batch_tokens_per_second']:,.0f} tokens/seg")
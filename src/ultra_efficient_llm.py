@@ -3,58 +3,1125 @@ UltraEfficientLLM - Modelo de lenguaje ultra-eficiente basado en patrones select
 """
 
 import re
+import bisect
+import hashlib
+import heapq
+import itertools
 import random
 import time
 import math
 import sys
 import pickle
+import json
+import mmap
 import os
-from collections import defaultdict, Counter
-from typing import List, Dict, Tuple, Optional
+import tempfile
+import threading
+import tracemalloc
+import zlib
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+from collections import defaultdict, Counter, OrderedDict
+from collections.abc import Mapping, ItemsView
+from typing import List, Dict, Tuple, Optional, Sequence
 import concurrent.futures
+try:
+    import resource  # memoria pico (RSS) del perfil de entrenamiento; no existe en Windows
+except ImportError:
+    resource = None
 import multiprocessing
+import numpy as np
+
+# Puente usado cuando dos patrones son contiguos
+DIRECT_BRIDGE = "__DIRECT__"
+
+# Líneas por lote al entrenar desde archivos (acota la memoria de cada worker)
+STREAM_BATCH_LINES = 1000
+
+# Conteos de los workers por memoria compartida (ver write_pattern_shards). En
+# POSIX el bloque (/dev/shm) sobrevive al cierre del worker hasta el unlink del
+# padre; en Windows un mapa con nombre se libera al cerrarse su último handle,
+# así que allí los workers devuelven el dict serializado
+SHARED_MEMORY_HANDOFF = os.name != 'nt'
+
+# Tareas por worker al repartir el corpus: con fragmentos pequeños el pool
+# reparte la carga dinámicamente (un worker libre toma la siguiente tarea)
+TASKS_PER_WORKER = 4
+
+# Medidas de tamaño para repartir textos en fragmentos (ver split_texts_by_size);
+# 'tokens' se estima por palabras separadas por espacios, sin tokenizar
+CHUNK_SIZE_MEASURES = {
+    'chars': len,
+    'tokens': lambda text: len(text.split())
+}
+
+# Formato de modelo mapeable en memoria: cabecera JSON + arrays planos alineados
+MMAP_MAGIC = b"UELMMAP1"
+MMAP_EXTENSION = ".uelm"
+MMAP_ALIGNMENT = 64
+
+# Etapas de entrenamiento y su progreso aproximado (%) al comenzar cada una
+TRAINING_STAGES = {'extract': 0, 'filter': 40, 'graph': 50, 'embed': 80, 'done': 100}
+
+# Dimensión de los embeddings compactos (8 vs 4096 de modelos tradicionales)
+EMBEDDING_DIM = 8
+
+# Conteos crudos conservados para update(): Count-Min Sketch de tamaño acotado
+# (SKETCH_DEPTH x hasta SKETCH_WIDTH int64) más conteos exactos de los mejores candidatos
+SKETCH_WIDTH = 1 << 17
+SKETCH_DEPTH = 4
+SKETCH_PRESENCE_BITS = 1 << 24  # filtro de presencia: hasta 2 MB
+RETAINED_PATTERNS_FACTOR = 4  # conteos exactos retenidos = factor * max_patterns
+
+# Extracción aproximada con memoria acotada (sketch_memory_mb): bytes estimados
+# por patrón vigilado en el resumen Space-Saving (string + entradas de dict)
+SPACE_SAVING_ENTRY_BYTES = 200
+
+# Ponderación de patrones: un stop word aislado no tiene valor semántico y una
+# palabra clave a 2 tokens o menos suma 2 al peso (palabras clave configurables)
+STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'})
+DEFAULT_KEYWORDS = ('machine', 'learning', 'artificial', 'intelligence')
+PUNCTUATION_PATTERN = re.compile(r'^[^\w\s]+$')
+
+# Bits por token del vocabulario (ver token_flags)
+TOKEN_STOPWORD = 1
+TOKEN_SIGNIFICANT = 2
+TOKEN_KEYWORD = 4
+
 
 # --- FUNCIONES AUXILIARES PARA PARALELISMO ---
-def extract_patterns_chunk(chunk, max_pattern_length, min_frequency):
-    import re
-    from collections import defaultdict
-    def smart_tokenize(text):
-        text = re.sub(r'\b([A-Z][a-z]+(?:_[A-Z][a-z]+)*(?:\s+[A-Z][a-z]+(?:_[A-Z][a-z]+)*)*)\b', r'ENTITY_\1', text)
-        tokens = re.findall(r'\w+|[^\w\s]', text.lower())
-        tokens = [token.replace('entity_', '').replace('_', ' ') for token in tokens]
-        return [token for token in tokens if len(token) > 0]
-    def has_semantic_value(pattern):
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-        words = pattern.split()
-        if len(words) == 1 and words[0] in stop_words:
-            return False
-        if re.match(r'^[^\w\s]+$', pattern):
-            return False
-        significant_words = [w for w in words if w not in stop_words and len(w) > 2]
-        return len(significant_words) > 0
-    def calculate_pattern_weight(tokens, start, length):
-        base_weight = 1
-        if start == 0 or start + length == len(tokens):
-            base_weight += 1
-        base_weight += length - 1
-        context_start = max(0, start - 2)
-        context_end = min(len(tokens), start + length + 2)
-        context = " ".join(tokens[context_start:context_end])
-        if any(keyword in context for keyword in ['machine', 'learning', 'artificial', 'intelligence']):
-            base_weight += 2
-        return base_weight
+def extract_patterns_chunk(chunk, max_pattern_length, min_frequency, keywords=DEFAULT_KEYWORDS):
+    return count_corpus_patterns(TokenizedCorpus.from_texts(chunk), max_pattern_length, keywords)
+
+
+def extract_patterns_encoded_chunk(chunk: List[str], max_pattern_length: int, min_frequency: int,
+                                   keywords: Sequence[str] = DEFAULT_KEYWORDS) -> Tuple[Dict[str, int], 'TokenizedCorpus']:
+    """extract_patterns_chunk que además devuelve el fragmento tokenizado (para el grafo)"""
+    corpus = TokenizedCorpus.from_texts(chunk)
+    return count_corpus_patterns(corpus, max_pattern_length, keywords), corpus
+
+
+def token_flags(vocab: List[str], keywords: Sequence[str] = DEFAULT_KEYWORDS) -> np.ndarray:
+    """
+    Bitmap por token del vocabulario (uint8) con TOKEN_STOPWORD, TOKEN_SIGNIFICANT y TOKEN_KEYWORD
+
+    Significativo = alguna palabra que no es stop word y tiene más de 2
+    letras (un token puede contener espacios: 'machine_learning'). Se
+    calcula una vez por token distinto, no por ventana.
+    """
+    flags = np.zeros(len(vocab), dtype=np.uint8)
+    for token_id, token in enumerate(vocab):
+        flag = 0
+        if token in STOP_WORDS:
+            flag |= TOKEN_STOPWORD
+        if any(word not in STOP_WORDS and len(word) > 2 for word in token.split()):
+            flag |= TOKEN_SIGNIFICANT
+        if any(keyword in token for keyword in keywords):
+            flag |= TOKEN_KEYWORD
+        flags[token_id] = flag
+    return flags
+
+
+def count_corpus_patterns(corpus: 'TokenizedCorpus', max_pattern_length: int,
+                          keywords: Sequence[str] = DEFAULT_KEYWORDS) -> Dict[str, int]:
+    """
+    Cuenta los n-gramas con valor semántico de un corpus tokenizado, con su peso
+
+    Vectorizado con NumPy sobre los IDs de token: para cada longitud n, la
+    clave de la ventana que empieza en i combina la clave (compactada con
+    np.unique) del (n-1)-grama en i con el token i+n-1, así que es exacta y
+    sin colisiones. Las reglas por ventana se reducen a bits por token
+    (token_flags) y sumas prefijas, con coste O(1) por ventana:
+    - valor semántico: algún token significativo (las ventanas de un stop
+      word o de puntuación nunca lo tienen)
+    - peso: 1, +1 en inicio/fin de texto, + (n - 1), +2 si un token del
+      contexto (2 tokens a cada lado) contiene una palabra clave
+    Los pesos se suman con np.bincount y cada patrón se materializa como
+    string una sola vez.
+
+    Args:
+        keywords: Palabras clave (sin espacios) que suben el peso del contexto
+
+    Returns:
+        Dict: patrón -> peso total, en orden de primera aparición (texto, n, posición)
+    """
+    vocab = corpus.vocab
+    tokens = np.frombuffer(corpus.tokens, dtype=np.int32).astype(np.int64)
+    num_tokens = len(tokens)
+    if num_tokens == 0:
+        return {}
+
+    flags = token_flags(vocab, keywords)[tokens]
+    significant_sums = np.concatenate(([0], np.cumsum((flags & TOKEN_SIGNIFICANT) > 0)))
+    keyword_sums = np.concatenate(([0], np.cumsum((flags & TOKEN_KEYWORD) > 0)))
+
+    offsets = np.frombuffer(corpus.offsets, dtype=np.int32).astype(np.int64)
+    text_of = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    text_start = offsets[:-1][text_of]
+    text_end = offsets[1:][text_of]
+
+    positions = np.arange(num_tokens)
+    keys = tokens
+    found_positions, found_lengths, found_counts = [], [], []
+    for n in range(1, max_pattern_length + 1):
+        num_windows = num_tokens - n + 1
+        if num_windows <= 0:
+            break
+        if n > 1:
+            keys = keys[:num_windows] * len(vocab) + tokens[n - 1:]
+        # Compactar a [0, claves distintas) mantiene acotado el producto del siguiente n
+        _, keys = np.unique(keys, return_inverse=True)
+
+        starts = positions[:num_windows]
+        ends = starts + n
+        selected = (ends <= text_end[:num_windows]) & (significant_sums[ends] > significant_sums[starts])
+        starts, ends = starts[selected], ends[selected]
+        if not len(starts):
+            continue
+        first_token, last_token = text_start[starts], text_end[starts]
+        context_start = np.maximum(first_token, starts - 2)
+        context_end = np.minimum(last_token, ends + 2)
+        weights = (n + ((starts == first_token) | (ends == last_token))
+                   + 2 * (keyword_sums[context_end] > keyword_sums[context_start]))
+
+        groups = keys[:num_windows][selected]
+        unique_groups, first = np.unique(groups, return_index=True)
+        found_positions.append(starts[first])
+        found_lengths.append(np.full(len(first), n))
+        found_counts.append(np.bincount(groups, weights=weights)[unique_groups])
+
+    if not found_positions:
+        return {}
+    found_positions = np.concatenate(found_positions)
+    found_lengths = np.concatenate(found_lengths)
+    found_counts = np.concatenate(found_counts).astype(np.int64)
+    order = np.lexsort((found_positions, found_lengths, text_of[found_positions]))
+
+    token_list = corpus.tokens
+    patterns_found = [" ".join([vocab[token] for token in token_list[start:start + n]])
+                      for start, n in zip(found_positions[order].tolist(), found_lengths[order].tolist())]
+    counts = found_counts[order].tolist()
+    if not any(' ' in token for token in vocab):
+        return dict(zip(patterns_found, counts))
+    # Tokens con espacios: secuencias distintas pueden dar el mismo patrón
+    patterns = {}
+    for pattern, count in zip(patterns_found, counts):
+        patterns[pattern] = patterns.get(pattern, 0) + count
+    return patterns
+
+
+# Palabras (\w+) y signos sueltos, compilado una vez por proceso
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+def _restore_underscores(tokens: List[str]) -> List[str]:
+    """Quita el marcador 'entity_' y convierte '_' en espacio (descarta tokens vacíos)"""
+    restored = []
+    for token in tokens:
+        if '_' in token:
+            token = token.replace('entity_', '').replace('_', ' ')
+            if not token:
+                continue
+        restored.append(token)
+    return restored
+
+
+def smart_tokenize(text: str) -> List[str]:
+    """
+    Tokenización que preserva estructura semántica
+
+    Una sola pasada de TOKEN_PATTERN sobre el texto en minúsculas. El marcado
+    de entidades original (prefijo ENTITY_ ante palabras capitalizadas) queda
+    siempre pegado al token de la palabra y se eliminaba al restaurarlas, así
+    que no altera el resultado y no se ejecuta; solo los tokens con '_' necesitan
+    la restauración.
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    return _restore_underscores(tokens) if '_' in text else tokens
+
+
+def smart_tokenize_batch(texts: List[str]) -> List[List[str]]:
+    """Tokeniza una lista de textos (mismo resultado que smart_tokenize por texto)"""
+    findall = TOKEN_PATTERN.findall
+    return [_restore_underscores(findall(text.lower())) if '_' in text else findall(text.lower())
+            for text in texts]
+
+
+def benchmark_tokenizer(texts: List[str], repeats: int = 3) -> Dict[str, float]:
+    """
+    Mide el rendimiento del tokenizador (mejor de `repeats` pasadas)
+
+    Returns:
+        Dict: textos, tokens, y tokens/segundo por texto y en lote
+    """
+    num_tokens = sum(len(tokens) for tokens in smart_tokenize_batch(texts))
+    single_time = batch_time = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        [smart_tokenize(text) for text in texts]
+        single_time = min(single_time, time.perf_counter() - start)
+        start = time.perf_counter()
+        smart_tokenize_batch(texts)
+        batch_time = min(batch_time, time.perf_counter() - start)
+    return {
+        'texts': len(texts),
+        'tokens': num_tokens,
+        'tokens_per_second': num_tokens / max(single_time, 1e-9),
+        'batch_tokens_per_second': num_tokens / max(batch_time, 1e-9)
+    }
+
+
+class TokenizedCorpus:
+    """
+    Textos tokenizados una sola vez: IDs de token int32 en formato CSR
+
+    Los workers de extracción lo devuelven junto a los conteos y el grafo se
+    construye sobre él sin volver a pasar cada texto por smart_tokenize. Los
+    IDs son locales al corpus (vocabulario propio, no el del modelo).
+    """
+
+    def __init__(self, vocab: List[str], offsets: array, tokens: array):
+        self.vocab = vocab  # ID de token -> token
+        self.offsets = offsets  # texto -> inicio de sus tokens (textos + 1 elementos)
+        self.tokens = tokens  # IDs de token concatenados
+
+    @classmethod
+    def from_tokens(cls, token_lists) -> 'TokenizedCorpus':
+        """Codifica listas de tokens (una por texto)"""
+        token_ids = {}
+        offsets = array('i', [0])
+        tokens = array('i')
+        for text_tokens in token_lists:
+            tokens.extend([token_ids.setdefault(token, len(token_ids)) for token in text_tokens])
+            offsets.append(len(tokens))
+        return cls(list(token_ids), offsets, tokens)
+
+    @classmethod
+    def from_texts(cls, texts: List[str]) -> 'TokenizedCorpus':
+        """Tokeniza y codifica textos"""
+        return cls.from_tokens(smart_tokenize_batch(texts))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        """IDs de token de cada texto"""
+        offsets, tokens = self.offsets, self.tokens
+        for i in range(len(offsets) - 1):
+            yield tokens[offsets[i]:offsets[i + 1]]
+
+
+def encode_tokens(tokens: List[str], word_ids: Dict[str, int]) -> List[int]:
+    """Convierte tokens a IDs de palabra (-1 si el token no está en el vocabulario)"""
+    return [word_ids.get(token, -1) for token in tokens]
+
+
+def build_graph_chunk(chunk: List[str], patterns: List[Tuple[int, ...]],
+                      vocab: List[str]) -> Dict[Tuple[int, str, int], int]:
+    """
+    Cuenta las transiciones entre patrones de un fragmento de textos
+
+    Args:
+        chunk: Textos del fragmento
+        patterns: Patrones seleccionados como tuplas de IDs de palabra (su posición es su ID)
+        vocab: ID de palabra -> palabra
+
+    Returns:
+        Dict: (ID origen, puente, ID siguiente) -> frecuencia, en orden de primera aparición
+    """
+    transitions = {}
+    word_ids = {word: word_id for word_id, word in enumerate(vocab)}
+    count_transitions(chunk, index_patterns_by_length(patterns), word_ids, transitions)
+    return transitions
+
+
+def build_graph_corpus(corpus: TokenizedCorpus, patterns: List[Tuple[int, ...]],
+                       vocab: List[str]) -> Dict[Tuple[int, str, int], int]:
+    """build_graph_chunk sobre un fragmento ya tokenizado"""
+    transitions = {}
+    word_ids = {word: word_id for word_id, word in enumerate(vocab)}
+    count_corpus_transitions(corpus, index_patterns_by_length(patterns), word_ids, transitions)
+    return transitions
+
+
+def count_transitions(texts, patterns_by_length: Dict[int, Dict[Tuple[int, ...], int]],
+                      word_ids: Dict[str, int], transitions: Dict[Tuple[int, str, int], int]) -> None:
+    """Acumula en `transitions` las transiciones entre patrones de `texts`"""
+    count_corpus_transitions(TokenizedCorpus.from_texts(texts), patterns_by_length, word_ids, transitions)
+
+
+def count_corpus_transitions(corpus: TokenizedCorpus, patterns_by_length: Dict[int, Dict[Tuple[int, ...], int]],
+                             word_ids: Dict[str, int], transitions: Dict[Tuple[int, str, int], int]) -> None:
+    """Acumula en `transitions` las transiciones entre patrones de un corpus tokenizado"""
+    token_words = corpus.vocab
+    token_map = encode_tokens(token_words, word_ids)  # ID de token -> ID de palabra del modelo
+    for text_tokens in corpus:
+        token_ids = [token_map[token] for token in text_tokens]
+
+        # Encontrar patrones en el texto (una pasada por ventanas de n-gramas)
+        pattern_positions = find_pattern_positions(token_ids, patterns_by_length)
+
+        # Construir transiciones
+        for i, (start1, end1, pattern1) in enumerate(pattern_positions):
+            for start2, end2, pattern2 in pattern_positions[i+1:]:
+                if start2 - end1 > 3:
+                    break  # Posiciones ordenadas por inicio: no hay más candidatos
+                if start2 >= end1:  # Proximidad razonable
+                    # Encontrar palabra/token de transición
+                    if start2 == end1:
+                        transition = DIRECT_BRIDGE
+                    else:
+                        transition = " ".join([token_words[token] for token in text_tokens[end1:start2]])
+
+                    key = (pattern1, transition, pattern2)
+                    transitions[key] = transitions.get(key, 0) + 1
+
+
+# --- LECTURA EN STREAMING DESDE ARCHIVOS ---
+def split_texts_by_size(texts: List[str], num_chunks: int, measure: str = 'chars') -> List[List[str]]:
+    """
+    Divide textos en fragmentos contiguos de tamaño total similar
+
+    Repartir por número de textos deja fragmentos muy desiguales cuando se
+    mezclan textos largos y cortos; aquí cada fragmento suma aproximadamente
+    total / num_chunks caracteres (o tokens). Un texto mayor que esa cuota
+    queda en su propio fragmento. Los fragmentos conservan el orden, así que
+    el resultado de la extracción no depende del reparto.
+
+    Args:
+        texts: Textos a repartir
+        num_chunks: Número máximo de fragmentos
+        measure: Clave de CHUNK_SIZE_MEASURES ('chars' o 'tokens')
+
+    Returns:
+        List: fragmentos no vacíos, en orden
+    """
+    size = CHUNK_SIZE_MEASURES[measure]
+    if not texts:
+        return []
+    # +1 por texto: el coste por texto no es nulo aunque esté vacío
+    cumulative = list(itertools.accumulate(size(text) + 1 for text in texts))
+    total = cumulative[-1]
+    num_chunks = max(1, min(num_chunks, len(texts)))
+    chunks = []
+    start = 0
+    for k in range(1, num_chunks):
+        # Corte en el límite entre textos más cercano a la cuota acumulada k
+        target = total * k / num_chunks
+        end = bisect.bisect_left(cumulative, target)
+        if end == 0 or cumulative[end] - target <= target - cumulative[end - 1]:
+            end += 1
+        if end > start:
+            chunks.append(texts[start:end])
+            start = end
+    if start < len(texts):
+        chunks.append(texts[start:])
+    return chunks
+
+
+def split_file_ranges(paths: List[str], num_ranges: int) -> List[Tuple[str, int, int]]:
+    """
+    Divide archivos en rangos de bytes alineados a inicio de línea
+
+    Los workers reciben (ruta, inicio, fin) en lugar del texto, así que
+    el proceso padre nunca carga el corpus.
+
+    Args:
+        paths: Archivos de texto (una línea = un texto)
+        num_ranges: Número aproximado de rangos en total
+
+    Returns:
+        List: (ruta, byte inicial, byte final) en orden de archivo y posición
+    """
+    sizes = [os.path.getsize(path) for path in paths]
+    range_size = max(1, sum(sizes) // max(num_ranges, 1))
+    ranges = []
+
+    for path, size in zip(paths, sizes):
+        with open(path, 'rb') as f:
+            start = 0
+            while start < size:
+                f.seek(min(start + range_size, size))
+                f.readline()  # Avanzar hasta el siguiente inicio de línea
+                end = min(f.tell(), size) if start + range_size < size else size
+                ranges.append((path, start, end))
+                start = end
+
+    return ranges
+
+
+def iter_file_range(path: str, start: int, end: int, batch_lines: int = STREAM_BATCH_LINES,
+                    encoding: str = 'utf-8'):
+    """
+    Lee un rango de un archivo en lotes acotados de líneas no vacías
+
+    Yields:
+        List[str]: Hasta `batch_lines` textos
+    """
+    batch = []
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            text = line.decode(encoding, errors='replace').strip()
+            if text:
+                batch.append(text)
+                if len(batch) >= batch_lines:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+def extract_patterns_file_range(file_range: Tuple[str, int, int], max_pattern_length: int, min_frequency: int,
+                                keywords: Sequence[str] = DEFAULT_KEYWORDS) -> Dict[str, int]:
+    """Extrae patrones de un rango de archivo procesándolo por lotes"""
     patterns = defaultdict(int)
-    for text in chunk:
-        tokens = smart_tokenize(text)
-        for n in range(1, max_pattern_length + 1):
-            for i in range(len(tokens) - n + 1):
-                pattern = " ".join(tokens[i:i+n])
-                if has_semantic_value(pattern):
-                    weight = calculate_pattern_weight(tokens, i, n)
-                    patterns[pattern] += weight
+    for batch in iter_file_range(*file_range):
+        for pattern, weight in extract_patterns_chunk(batch, max_pattern_length, min_frequency, keywords).items():
+            patterns[pattern] += weight
     return dict(patterns)
 
 
+# --- TRANSFERENCIA DE CONTEOS POR MEMORIA COMPARTIDA ---
+def write_pattern_shards(patterns: Dict[str, int], num_shards: int) -> Tuple[str, List[Tuple[int, int, int]]]:
+    """
+    Escribe conteos de patrones en un bloque de memoria compartida, particionados por hash
+
+    El fragmento s contiene los patrones con crc32(patrón) % num_shards == s:
+    sus conteos y sus posiciones en `patterns` (int64), seguidos de los
+    patrones en UTF-8 unidos por '\\n' (un patrón nunca contiene saltos de
+    línea). Por la tubería del pool solo viajan el nombre del bloque y los
+    desplazamientos, no un dict de strings.
+
+    El worker cierra su handle antes de que el padre se conecte al bloque por
+    nombre: solo es válido donde el bloque sobrevive sin handles abiertos
+    (POSIX). Con SHARED_MEMORY_HANDOFF falso (Windows) no se usa.
+
+    Returns:
+        (nombre del bloque, [(inicio, número de patrones, bytes de patrones)] por fragmento)
+    """
+    keys_by_shard = [[] for _ in range(num_shards)]
+    values_by_shard = [[] for _ in range(num_shards)]  # conteos y luego posiciones
+    positions_by_shard = [[] for _ in range(num_shards)]
+    for position, (pattern, count) in enumerate(patterns.items()):
+        key = pattern.encode('utf-8')
+        shard = zlib.crc32(key) % num_shards
+        keys_by_shard[shard].append(key)
+        values_by_shard[shard].append(count)
+        positions_by_shard[shard].append(position)
+
+    blobs = [b'\n'.join(keys) for keys in keys_by_shard]
+    segments = []
+    offset = 0
+    for keys, blob in zip(keys_by_shard, blobs):
+        segments.append((offset, len(keys), len(blob)))
+        offset += 16 * len(keys) + len(blob)
+        offset += -offset % 8  # enteros alineados a 8 bytes
+
+    block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for (start, num_patterns, num_bytes), values, positions, blob in zip(
+                segments, values_by_shard, positions_by_shard, blobs):
+            keys_start = start + 16 * num_patterns
+            values.extend(positions)
+            block.buf[start:keys_start] = np.array(values, dtype=np.int64).tobytes()
+            block.buf[keys_start:keys_start + num_bytes] = blob
+        return block.name, segments
+    finally:
+        block.close()  # en POSIX el bloque persiste; el padre lo libera (unlink) tras la fusión
+
+
+def extract_patterns_chunk_shards(chunk: List[str], max_pattern_length: int, min_frequency: int,
+                                  num_shards: int, keywords: Sequence[str] = DEFAULT_KEYWORDS
+                                  ) -> Tuple[str, List[Tuple[int, int, int]], 'TokenizedCorpus']:
+    """extract_patterns_encoded_chunk con los conteos en memoria compartida (ver write_pattern_shards)"""
+    patterns, corpus = extract_patterns_encoded_chunk(chunk, max_pattern_length, min_frequency, keywords)
+    return write_pattern_shards(patterns, num_shards) + (corpus,)
+
+
+def extract_patterns_file_range_shards(file_range: Tuple[str, int, int], max_pattern_length: int,
+                                       min_frequency: int, num_shards: int,
+                                       keywords: Sequence[str] = DEFAULT_KEYWORDS
+                                       ) -> Tuple[str, List[Tuple[int, int, int]]]:
+    """extract_patterns_file_range con el resultado en memoria compartida (ver write_pattern_shards)"""
+    return write_pattern_shards(extract_patterns_file_range(file_range, max_pattern_length, min_frequency, keywords),
+                                num_shards)
+
+
+def merge_pattern_shards(shard: int,
+                         blocks: List[Tuple[str, List[Tuple[int, int, int]]]]) -> Tuple[bytes, np.ndarray, np.ndarray]:
+    """
+    Suma los conteos de un fragmento escritos por todos los workers
+
+    Los fragmentos son disjuntos, así que cada uno se fusiona en un worker
+    distinto y el padre solo tiene que unirlos.
+
+    Returns:
+        (patrones UTF-8 unidos por '\\n', conteos int64, orden de primera aparición
+        int64 = índice de bloque << 32 | posición en el bloque)
+    """
+    counts_by_key = {}
+    ranks = {}
+    for block_index, (name, segments) in enumerate(blocks):
+        start, num_patterns, num_bytes = segments[shard]
+        if not num_patterns:
+            continue
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            keys_start = start + 16 * num_patterns
+            values = np.frombuffer(bytes(block.buf[start:keys_start]), dtype=np.int64)
+            keys = bytes(block.buf[keys_start:keys_start + num_bytes]).split(b'\n')
+        finally:
+            block.close()
+        counts = values[:num_patterns].tolist()
+        block_ranks = ((block_index << 32) + values[num_patterns:]).tolist()
+        if counts_by_key:
+            get = counts_by_key.get
+            for key, count in zip(keys, counts):
+                counts_by_key[key] = get(key, 0) + count
+            for key, rank in zip(keys, block_ranks):
+                ranks.setdefault(key, rank)
+        else:
+            counts_by_key = dict(zip(keys, counts))
+            ranks = dict(zip(keys, block_ranks))
+    return (b'\n'.join(counts_by_key),
+            np.fromiter(counts_by_key.values(), dtype=np.int64, count=len(counts_by_key)),
+            np.fromiter(ranks.values(), dtype=np.int64, count=len(ranks)))
+
+
+def extract_heavy_hitters(batches, max_pattern_length: int, min_frequency: int, width: int, capacity: int,
+                          keywords: Sequence[str] = DEFAULT_KEYWORDS) -> Tuple['CountMinSketch', 'SpaceSaving']:
+    """
+    Extracción aproximada con memoria acotada: Count-Min Sketch + Space-Saving
+
+    Cada lote se cuenta de forma exacta (memoria proporcional al lote), se suma
+    al sketch y al resumen de heavy hitters y se descarta.
+
+    Args:
+        batches: Iterable de listas de textos
+        width: Columnas del sketch
+        capacity: Patrones vigilados por el resumen
+
+    Returns:
+        (CountMinSketch de todos los patrones, SpaceSaving con los más frecuentes)
+    """
+    sketch = CountMinSketch(width, presence_bits=8 * width)
+    summary = SpaceSaving(capacity, sketch)
+    for batch in batches:
+        counts = extract_patterns_chunk(batch, max_pattern_length, min_frequency, keywords)
+        sketch.add(list(counts), list(counts.values()))
+        summary.add(counts)
+    return sketch, summary
+
+
+def extract_heavy_hitters_chunk(chunk: List[str], max_pattern_length: int, min_frequency: int,
+                                width: int, capacity: int, keywords: Sequence[str] = DEFAULT_KEYWORDS
+                                ) -> Tuple['CountMinSketch', 'SpaceSaving']:
+    """Extracción aproximada de un fragmento de textos, por lotes de STREAM_BATCH_LINES"""
+    batches = (chunk[i:i+STREAM_BATCH_LINES] for i in range(0, len(chunk), STREAM_BATCH_LINES))
+    return extract_heavy_hitters(batches, max_pattern_length, min_frequency, width, capacity, keywords)
+
+
+def extract_heavy_hitters_file_range(file_range: Tuple[str, int, int], max_pattern_length: int,
+                                     min_frequency: int, width: int, capacity: int,
+                                     keywords: Sequence[str] = DEFAULT_KEYWORDS
+                                     ) -> Tuple['CountMinSketch', 'SpaceSaving']:
+    """Extracción aproximada de un rango de archivo"""
+    return extract_heavy_hitters(iter_file_range(*file_range), max_pattern_length, min_frequency,
+                                 width, capacity, keywords)
+
+
+def build_graph_file_range(file_range: Tuple[str, int, int], patterns: List[Tuple[int, ...]],
+                           vocab: List[str]) -> Dict[Tuple[int, str, int], int]:
+    """Cuenta transiciones de un rango de archivo procesándolo por lotes"""
+    patterns_by_length = index_patterns_by_length(patterns)
+    word_ids = {word: word_id for word_id, word in enumerate(vocab)}
+    transitions = {}
+    for batch in iter_file_range(*file_range):
+        count_transitions(batch, patterns_by_length, word_ids, transitions)
+    return transitions
+
+
+def _splitmix64(values: np.ndarray) -> np.ndarray:
+    """Mezcla SplitMix64 vectorizada: contador uint64 -> bits pseudoaleatorios"""
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def word_embedding_matrix(words: List[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Genera la matriz de embeddings (float32, palabras x dim) en una sola operación
+
+    Cada fila depende solo de su palabra (semilla CRC32 + contador), así que
+    el resultado es estable entre procesos y al añadir palabras nuevas.
+    Los valores siguen N(0, 0.5) mediante Box-Muller.
+    """
+    seeds = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words),
+                        dtype=np.uint64, count=len(words))
+    counters = seeds[:, None] * np.uint64(2 * dim) + np.arange(2 * dim, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        bits = _splitmix64(counters)
+    # 53 bits -> uniforme en [0, 1)
+    uniforms = (bits >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+    radius = np.sqrt(-2.0 * np.log1p(-uniforms[:, :dim]))
+    angle = 2.0 * np.pi * uniforms[:, dim:]
+    return (0.5 * radius * np.cos(angle)).astype(np.float32)
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Menor string mayor que todos los que empiezan por `prefix`
+
+    Returns:
+        Optional[str]: Cota superior exclusiva, o None si no existe
+    """
+    while prefix:
+        last = ord(prefix[-1])
+        if last < sys.maxunicode:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+def index_patterns_by_length(patterns: List[Tuple[int, ...]]) -> Dict[int, Dict[Tuple[int, ...], int]]:
+    """
+    Agrupa los patrones por número de palabras
+
+    Returns:
+        Dict: longitud -> {tupla de IDs de palabra: ID de patrón}, con IDs en el orden de `patterns`
+    """
+    patterns_by_length = defaultdict(dict)
+    for pattern_id, pattern in enumerate(patterns):
+        patterns_by_length[len(pattern)][tuple(pattern)] = pattern_id
+    return dict(patterns_by_length)
+
+
+def find_pattern_positions(token_ids: List[int],
+                           patterns_by_length: Dict[int, Dict[Tuple[int, ...], int]]) -> List[Tuple[int, int, int]]:
+    """
+    Encuentra todas las apariciones de patrones en una secuencia de IDs de token
+
+    Cada posición se resuelve con una búsqueda hash por longitud de ventana,
+    así que el coste es O(tokens * longitudes) y no depende del número de patrones.
+
+    Returns:
+        List: (inicio, fin, ID de patrón) ordenado por inicio y luego por ID
+    """
+    lengths = sorted(length for length in patterns_by_length if length > 0)
+    positions = []
+    for i in range(len(token_ids)):
+        if token_ids[i] < 0:
+            continue  # Ningún patrón empieza por un token fuera del vocabulario
+        matches = []
+        for length in lengths:
+            if i + length > len(token_ids):
+                break
+            pattern_id = patterns_by_length[length].get(tuple(token_ids[i:i+length]))
+            if pattern_id is not None:
+                matches.append((pattern_id, i + length))
+        matches.sort()
+        positions.extend((i, end, pattern_id) for pattern_id, end in matches)
+    return positions
+
+
+class PatternView(Mapping):
+    """
+    Vista de solo lectura patrón -> frecuencia sobre el almacenamiento compacto
+
+    El modelo trabaja con IDs; los strings solo se materializan al recorrer la vista.
+    """
+
+    def __init__(self, model: 'UltraEfficientLLM'):
+        self._model = model
+
+    def __len__(self) -> int:
+        return len(self._model.pattern_freqs)
+
+    def __iter__(self):
+        for pattern_id in range(len(self)):
+            yield self._model._pattern_string(pattern_id)
+
+    def __getitem__(self, pattern: str) -> int:
+        pattern_id = self._model._find_pattern(pattern)
+        if pattern_id is None:
+            raise KeyError(pattern)
+        return self._model.pattern_freqs[pattern_id]
+
+    def items(self) -> ItemsView:
+        return _PatternItemsView(self)
+
+
+class _PatternItemsView(ItemsView):
+    """items() de PatternView sin búsquedas por string"""
+
+    def __iter__(self):
+        model = self._mapping._model
+        for pattern_id in range(len(model.pattern_freqs)):
+            yield model._pattern_string(pattern_id), model.pattern_freqs[pattern_id]
+
+
+class VocabularyView(Mapping):
+    """Vista de solo lectura palabra -> valor sobre una secuencia indexada por ID de palabra"""
+
+    def __init__(self, vocab: List[str], word_ids: Dict[str, int], values):
+        self._vocab = vocab
+        self._word_ids = word_ids
+        self._values = values
+
+    def __len__(self) -> int:
+        return len(self._vocab)
+
+    def __iter__(self):
+        return iter(self._vocab)
+
+    def __getitem__(self, word: str):
+        return self._values[self._word_ids[word]]
+
+
+def peak_rss_kb(who: int = 0) -> Optional[float]:
+    """Memoria residente pico (KB) del proceso, o de sus hijos terminados con who=-1 (None sin `resource`)"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if who == -1 else resource.RUSAGE_SELF)
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return usage.ru_maxrss / 1024 if sys.platform == 'darwin' else float(usage.ru_maxrss)
+
+
+class TrainingProfiler:
+    """
+    Perfil por etapa del entrenamiento (etapas de TRAINING_STAGES)
+
+    Por etapa: tiempo real, tiempo de CPU del proceso y de los workers ya
+    terminados (un pool persistente sigue vivo y no cuenta), memoria
+    residente pico del proceso al terminarla (ru_maxrss es un máximo
+    acumulado: `rss_growth_kb` > 0 indica que la etapa fijó un pico nuevo),
+    elementos procesados y elementos por segundo. Con trace_memory también
+    el pico de memoria asignada por Python en la etapa (tracemalloc, que
+    ralentiza el entrenamiento).
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._stage = None
+        self._started_tracing = False
+
+    def start(self, stage: str, items: Optional[int] = None, unit: Optional[str] = None) -> None:
+        """Cierra la etapa en curso y empieza `stage` con `items` elementos de tipo `unit`"""
+        self.stop()
+        self._stage, self._items, self._unit = stage, items, unit
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        self._start_rss = peak_rss_kb()
+        self._start_times = os.times()
+        self._start_wall = time.perf_counter()
+
+    def stop(self) -> None:
+        """Registra la etapa en curso, si la hay"""
+        if self._stage is None:
+            return
+        wall_time = time.perf_counter() - self._start_wall
+        times = os.times()
+        rss = peak_rss_kb()
+        profile = {
+            'wall_s': round(wall_time, 4),
+            'cpu_s': round(max(0.0, times.user + times.system
+                               - self._start_times.user - self._start_times.system), 4),
+            'workers_cpu_s': round(max(0.0, times.children_user + times.children_system
+                                       - self._start_times.children_user - self._start_times.children_system), 4),
+            'peak_rss_kb': rss,
+            'rss_growth_kb': rss - self._start_rss if rss is not None else None,
+            'workers_peak_rss_kb': peak_rss_kb(-1),
+            'items': self._items,
+            'unit': self._unit,
+            'items_per_s': round(self._items / wall_time, 1) if self._items is not None and wall_time > 0 else None
+        }
+        if self.trace_memory:
+            profile['peak_traced_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        self.stages[self._stage] = profile
+        self._stage = None
+
+    def finish(self) -> Dict:
+        """Cierra la última etapa y devuelve el perfil (serializable en JSON)"""
+        self.stop()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return {
+            'stages': self.stages,
+            'total_wall_s': round(sum(stage['wall_s'] for stage in self.stages.values()), 4),
+            'total_cpu_s': round(sum(stage['cpu_s'] + stage['workers_cpu_s'] for stage in self.stages.values()), 4),
+            'peak_rss_kb': peak_rss_kb()
+        }
+
+
+class ActivationCache:
+    """
+    Cache LRU acotado (con TTL opcional) para activaciones de patrones
+
+    Al superar la capacidad se expulsa la entrada usada hace más tiempo;
+    con TTL, las entradas más antiguas que `ttl` segundos cuentan como fallo.
+    """
+
+    def __init__(self, capacity: int = 1024, ttl: Optional[float] = None):
+        if capacity < 0:
+            raise ValueError("La capacidad del cache no puede ser negativa")
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # clave -> (instante de inserción, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key):
+        """Valor cacheado para `key` (lo marca como recién usado) o None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value) -> None:
+        """Guarda `value`, expulsando las entradas LRU que sobren"""
+        if self.capacity == 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Vacía el cache (los contadores se conservan)"""
+        with self._lock:
+            self._entries.clear()
+
+    def items(self):
+        """Pares (clave, valor) en orden LRU"""
+        return [(key, entry[1]) for key, entry in self._entries.items()]
+
+    def get_stats(self) -> Dict:
+        """Contadores del cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': f"{self.hits / lookups:.1%}" if lookups else "0.0%"
+        }
+
+
+class CountMinSketch:
+    """
+    Count-Min Sketch de conteos con memoria fija (depth x width int64)
+
+    Cada fila indexa la clave con un hash distinto, estable entre procesos: un
+    hash de 64 bits de la clave (blake2b) combinado con una semilla por fila y
+    mezclado con SplitMix64. Dos claves solo coinciden en todas las filas a la
+    vez si coincide su hash de 64 bits (probabilidad ~2^-64), así que las filas
+    se comportan como independientes. La estimación es el mínimo de las filas.
+    Las sumas usan actualización conservadora (solo suben los contadores que
+    quedan por debajo de la nueva estimación): nunca subestima y, con
+    probabilidad 1 - e^-depth, sobrestima como mucho e/width * total. Un filtro
+    de presencia (Bloom, con los mismos hashes) hace que una clave nunca añadida
+    estime 0 salvo falsos positivos, en lugar del ruido de sus colisiones.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH,
+                 presence_bits: int = SKETCH_PRESENCE_BITS):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.presence = np.zeros(max(presence_bits // 8, 1), dtype=np.uint8)
+        self.total = 0
+
+    @classmethod
+    def for_keys(cls, num_keys: int) -> 'CountMinSketch':
+        """Sketch dimensionado para `num_keys` claves (potencias de 2, hasta los máximos del módulo)"""
+        width = 1 << max(10, (max(num_keys, 1) - 1).bit_length())
+        return cls(min(width, SKETCH_WIDTH), presence_bits=min(8 * width, SKETCH_PRESENCE_BITS))
+
+    def _hashes(self, keys: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(columna, bit de presencia) de cada clave en cada fila (depth x claves)"""
+        digests = b''.join(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest() for key in keys)
+        seeds = np.frombuffer(digests, dtype='<u8').astype(np.uint64)
+        with np.errstate(over='ignore'):
+            # XOR con una semilla distinta por fila: biyectivo, así que claves con
+            # hash distinto siguen siendo distintas en cada fila
+            row_seeds = _splitmix64(np.arange(self.depth, dtype=np.uint64))
+            bits = _splitmix64(seeds[None, :] ^ row_seeds[:, None])
+        columns = (bits % np.uint64(self.width)).astype(np.intp)
+        positions = ((bits >> np.uint64(32)) % np.uint64(8 * len(self.presence))).astype(np.intp)
+        return columns, positions
+
+    def add(self, keys: List[str], counts: List[int]) -> None:
+        """Suma `counts` (no negativos) a las claves `keys`, distintas entre sí"""
+        if not keys:
+            return
+        columns, positions = self._hashes(keys)
+        counts = np.asarray(counts, dtype=np.int64)
+        targets = self.table[np.arange(self.depth)[:, None], columns].min(axis=0) + counts
+        for row in range(self.depth):
+            np.maximum.at(self.table[row], columns[row], targets)
+        np.bitwise_or.at(self.presence, positions.reshape(-1) >> 3,
+                         (1 << (positions.reshape(-1) & 7)).astype(np.uint8))
+        self.total += int(counts.sum())
+
+    def estimate(self, keys: List[str]) -> np.ndarray:
+        """Conteo estimado (cota superior) de cada clave"""
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        columns, positions = self._hashes(keys)
+        present = ((self.presence[positions >> 3] >> (positions & 7)) & 1).all(axis=0)
+        return np.where(present, self.table[np.arange(self.depth)[:, None], columns].min(axis=0), 0)
+
+    def merge(self, other: 'CountMinSketch') -> None:
+        """Suma otro sketch de las mismas dimensiones (p. ej. de otro worker)"""
+        self.table += other.table
+        self.presence |= other.presence
+        self.total += other.total
+
+    def error_bound(self) -> float:
+        """Sobrestimación máxima (con probabilidad 1 - e^-depth)"""
+        return math.e / self.width * self.total
+
+    def to_state(self) -> Dict:
+        """Estado con solo tipos básicos y arrays, para pickle (no depende de la ruta de importación)"""
+        return {
+            'width': self.width,
+            'depth': self.depth,
+            'total': self.total,
+            'table': array('q', self.table.tobytes()),
+            'presence': self.presence.tobytes()
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'CountMinSketch':
+        """Reconstruye un sketch guardado con to_state"""
+        sketch = cls(state['width'], state['depth'], presence_bits=8 * len(state['presence']))
+        sketch.table = np.array(state['table'], dtype=np.int64).reshape(state['depth'], state['width'])
+        sketch.presence = np.frombuffer(state['presence'], dtype=np.uint8).copy()
+        sketch.total = state['total']
+        return sketch
+
+
+class SpaceSaving:
+    """
+    Resumen Space-Saving de los patrones más frecuentes (heavy hitters)
+
+    Vigila hasta 2 * capacity claves. Al superarlas conserva las `capacity` de
+    mayor conteo y `floor` pasa a ser el mayor conteo descartado; una clave no
+    vigilada entra con floor + peso. Así cada conteo es una cota superior con
+    error como mucho `floor`, y toda clave cuyo conteo real supere `floor`
+    está en el resumen.
+
+    Con un `sketch` que reciba los mismos conteos, antes de recortar cada
+    conteo baja a la estimación del sketch si es menor (ambas son cotas
+    superiores): el sketch recuerda la historia de las claves que vuelven a
+    entrar y evita que el floor las empate con claves realmente frecuentes.
+    """
+
+    def __init__(self, capacity: int, sketch: Optional['CountMinSketch'] = None):
+        self.capacity = capacity
+        self.sketch = sketch
+        self.counts = {}  # clave -> conteo (cota superior)
+        self.errors = {}  # clave -> sobrestimación máxima (solo si no es 0)
+        self.floor = 0
+
+    def add(self, counts: Dict[str, int]) -> None:
+        """Suma conteos (p. ej. de un lote de textos, ya sumados al sketch)"""
+        own_counts, errors, floor = self.counts, self.errors, self.floor
+        for key, weight in counts.items():
+            count = own_counts.get(key)
+            if count is None:
+                own_counts[key] = floor + weight
+                if floor:
+                    errors[key] = floor
+            else:
+                own_counts[key] = count + weight
+        if len(own_counts) > 2 * self.capacity:
+            self._truncate()
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        """Combina con el resumen de otro fragmento (una clave ausente cuenta con el floor de ese resumen)"""
+        counts, errors = self.counts, self.errors
+        if other.floor:
+            for key in counts.keys() - other.counts.keys():
+                counts[key] += other.floor
+                errors[key] = errors.get(key, 0) + other.floor
+        for key, count in other.counts.items():
+            own_count = counts.get(key)
+            if own_count is None:
+                own_count, own_error = self.floor, self.floor
+            else:
+                own_error = errors.get(key, 0)
+            counts[key] = own_count + count
+            error = own_error + other.errors.get(key, 0)
+            if error:
+                errors[key] = error
+        self.floor += other.floor
+        if len(counts) > 2 * self.capacity:
+            self._truncate()
+
+    def tighten(self) -> None:
+        """Baja cada conteo a la estimación del sketch cuando es menor"""
+        if self.sketch is None or not self.counts:
+            return
+        keys = list(self.counts)
+        for key, count, estimate in zip(keys, self.counts.values(), self.sketch.estimate(keys).tolist()):
+            if estimate < count:
+                # La cota inferior (conteo - error) no cambia
+                error = self.errors.pop(key, 0) - (count - estimate)
+                self.counts[key] = estimate
+                if error > 0:
+                    self.errors[key] = error
+
+    def _truncate(self) -> None:
+        """Conserva las `capacity` claves de mayor conteo"""
+        self.tighten()
+        top = heapq.nlargest(self.capacity + 1, self.counts.items(), key=lambda item: item[1])
+        self.floor = max(self.floor, top[-1][1])
+        self.counts = dict(top[:self.capacity])
+        self.errors = {key: self.errors[key] for key in self.counts if key in self.errors}
+
+
 class UltraEfficientLLM:
     """
     Modelo de lenguaje ultra-eficiente basado en patrones selectivos
@@ -66,16 +1133,67 @@ class UltraEfficientLLM:
     - Hardware: Funciona en cualquier PC vs GPUs especializadas
     """
 
-    def __init__(self, max_pattern_length=5, min_frequency=2, max_patterns=10000):
+    def __init__(self, max_pattern_length=5, min_frequency=2, max_patterns=10000,
+                 cache_size=1024, cache_ttl=None, sketch_memory_mb=None, keywords=None,
+                 chunk_by='chars', persistent_pool=False, trace_memory=False):
         self.max_pattern_length = max_pattern_length
         self.min_frequency = min_frequency
         self.max_patterns = max_patterns
-
-        # Estructuras de datos ultra-compactas
-        self.patterns = {}  # pattern -> frequency
-        self.pattern_graph = defaultdict(dict)  # pattern -> next_words -> frequency
-        self.word_vectors = {}  # Embeddings ultra-compactos
-        self.activation_cache = {}  # Cache inteligente
+        # Presupuesto (MB por proceso) de la extracción aproximada; None = conteo exacto
+        self.sketch_memory_mb = sketch_memory_mb
+        # Palabras clave que suben el peso de los patrones cercanos (ver count_corpus_patterns)
+        self.keywords = self._normalize_keywords(DEFAULT_KEYWORDS if keywords is None else keywords)
+        # Reparto del corpus entre workers por tamaño ('chars' o 'tokens', ver split_texts_by_size)
+        if chunk_by not in CHUNK_SIZE_MEASURES:
+            raise ValueError(f"chunk_by debe ser uno de {list(CHUNK_SIZE_MEASURES)}")
+        self.chunk_by = chunk_by
+        # Pool de procesos reutilizado entre train()/update() (se crea al primer uso)
+        self.persistent_pool = persistent_pool
+        self._executor = None
+        self._executor_workers = 0
+        # Pico de memoria por etapa con tracemalloc en el perfil de entrenamiento (más lento)
+        self.trace_memory = trace_memory
+
+        # Vocabulario interno: cada palabra se guarda una sola vez
+        self.vocab = []  # ID de palabra -> palabra
+        self.word_ids = {}  # palabra -> ID de palabra
+
+        # Patrones como secuencias de IDs de palabra (int32) en formato CSR
+        self.pattern_offsets = array('i', [0])  # ID de patrón -> inicio de sus palabras
+        self.pattern_tokens = array('i')  # IDs de palabra concatenados
+        self.pattern_freqs = array('d')  # ID de patrón -> frecuencia (score de utilidad, float64)
+        self._pattern_lookup = None  # tupla de IDs -> ID de patrón (se construye bajo demanda)
+
+        # Grafo de transiciones en formato CSR (IDs enteros, sin strings "a -> b")
+        self.bridges = [DIRECT_BRIDGE]  # ID de puente -> tokens de transición
+        self.graph_offsets = array('i', [0])  # ID de patrón -> inicio de sus aristas
+        self.graph_next = array('i')  # arista -> ID del patrón siguiente
+        self.graph_bridge = array('i')  # arista -> ID del puente
+        self.graph_counts = array('i')  # arista -> frecuencia
+        self.embeddings = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)  # fila = ID de palabra
+        # Cache LRU acotado: palabras normalizadas del contexto -> [(ID de patrón, score)]
+        self.activation_cache = ActivationCache(cache_size, cache_ttl)
+        self._progress_callback = None  # Callback de progreso del entrenamiento en curso
+        self._profiler = None  # TrainingProfiler del entrenamiento en curso
+
+        # Índice invertido para activación dispersa (CSR por ID de palabra)
+        self.word_index_offsets = array('i', [0])  # ID de palabra -> inicio de sus patrones
+        self.word_index_patterns = array('i')  # IDs de patrones que contienen cada palabra
+        self._pattern_word_counts = array('i')  # ID de patrón -> número de palabras distintas
+        self._pattern_start_words = array('i')  # ID de patrón -> palabra del bonus de inicio (-1 si no hay)
+        self._pattern_first_words = array('i')  # ID de patrón -> primera palabra (candidato en el grafo)
+
+        # Tabla prefijo -> extensiones directas (CSR por ID de patrón)
+        self.extension_offsets = array('i', [0])  # ID de patrón -> inicio de sus extensiones
+        self.extension_words = array('i')  # ID de la palabra que sigue al prefijo
+        self.extension_patterns = array('i')  # ID del patrón que extiende al prefijo
+
+        # Conteos crudos para update() (solo en modelos entrenados o cargados de pickle)
+        self._count_sketch = None  # CountMinSketch con los conteos de todos los patrones vistos
+        self._context_sketch = None  # CountMinSketch con las frecuencias de todos los contextos
+        self._retained_counts = None  # patrón -> conteo exacto (candidatos de mayor utilidad)
+        self._context_freqs = None  # contexto -> frecuencia exacta (contextos de los candidatos)
+        self._extraction_sketch = None  # sketch de la extracción aproximada, hasta _retain_counts
 
         # Estadísticas de eficiencia
         self.stats = {
@@ -86,32 +1204,39 @@ class UltraEfficientLLM:
             'total_generations': 0
         }
 
-    def save_model(self, filepath: str) -> None:
+    # Arrays planos que se guardan tal cual en el formato mapeable en memoria
+    MMAP_ARRAYS = (
+        'pattern_offsets', 'pattern_tokens', 'pattern_freqs',
+        'graph_offsets', 'graph_next', 'graph_bridge', 'graph_counts',
+        'word_index_offsets', 'word_index_patterns',
+        '_pattern_word_counts', '_pattern_start_words', '_pattern_first_words',
+        'extension_offsets', 'extension_words', 'extension_patterns'
+    )
+
+    def save_model(self, filepath: str, format: Optional[str] = None) -> None:
         """
         Guarda el modelo entrenado en un archivo
         
         Args:
             filepath: Ruta del archivo donde guardar el modelo
+            format: 'pickle' o 'mmap' (por defecto 'mmap' si la ruta termina en .uelm)
         """
         print(f"💾 Guardando modelo en: {filepath}")
         
         # Crear directorio si no existe
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
-        # Datos del modelo a guardar
-        model_data = {
-            'max_pattern_length': self.max_pattern_length,
-            'min_frequency': self.min_frequency,
-            'max_patterns': self.max_patterns,
-            'patterns': self.patterns,
-            'pattern_graph': dict(self.pattern_graph),  # Convertir defaultdict a dict
-            'word_vectors': self.word_vectors,
-            'stats': self.stats
-        }
+        if format is None:
+            format = 'mmap' if filepath.endswith(MMAP_EXTENSION) else 'pickle'
+        if format not in ('pickle', 'mmap'):
+            raise ValueError(f"Formato de modelo desconocido: {format}")
         
         try:
-            with open(filepath, 'wb') as f:
-                pickle.dump(model_data, f)
+            if format == 'mmap':
+                self._save_mmap(filepath)
+            else:
+                with open(filepath, 'wb') as f:
+                    pickle.dump(self._pickle_data(), f)
             print(f"✅ Modelo guardado exitosamente: {filepath}")
             
             # Mostrar tamaño del archivo
@@ -122,9 +1247,151 @@ class UltraEfficientLLM:
             print(f"❌ Error guardando modelo: {e}")
             raise
 
+    def _pickle_data(self) -> Dict:
+        """Datos del modelo para el formato pickle"""
+        def owned(values):
+            # Las vistas de un modelo mapeado se copian a arrays propios
+            return values if isinstance(values, array) else array(values.format, values)
+
+        return {
+            'max_pattern_length': self.max_pattern_length,
+            'min_frequency': self.min_frequency,
+            'max_patterns': self.max_patterns,
+            'sketch_memory_mb': self.sketch_memory_mb,
+            'keywords': list(self.keywords),
+            'vocab': self.vocab,
+            'patterns': {
+                'offsets': owned(self.pattern_offsets),
+                'tokens': owned(self.pattern_tokens),
+                'freqs': owned(self.pattern_freqs)
+            },
+            'graph': {
+                'bridges': self.bridges,
+                'offsets': owned(self.graph_offsets),
+                'next': owned(self.graph_next),
+                'bridge': owned(self.graph_bridge),
+                'counts': owned(self.graph_counts)
+            },
+            'embeddings': np.array(self.embeddings),
+            'word_index': {
+                'offsets': owned(self.word_index_offsets),
+                'patterns': owned(self.word_index_patterns)
+            },
+            'update_state': {
+                'sketch': self._count_sketch.to_state(),
+                'context_sketch': self._context_sketch.to_state(),
+                'counts': self._retained_counts,
+                'contexts': self._context_freqs
+            } if self._count_sketch is not None else None,
+            'stats': self.stats
+        }
+
+    def _save_mmap(self, filepath: str) -> None:
+        """
+        Escribe el formato mapeable: MAGIC | longitud de cabecera (uint32) | cabecera JSON | arrays
+
+        Cada array se alinea a MMAP_ALIGNMENT bytes y se describe en la cabecera
+        con (formato, offset, longitud). El archivo se escribe en un temporal y
+        se renombra, así los procesos que ya lo tienen mapeado no se ven afectados.
+        """
+        blobs = [(name, memoryview(getattr(self, name))) for name in self.MMAP_ARRAYS]
+        blobs.append(('vocab', memoryview("\n".join(self.vocab).encode('utf-8'))))
+        blobs.append(('bridges', memoryview("\n".join(self.bridges).encode('utf-8'))))
+        embeddings = np.ascontiguousarray(self.embeddings, dtype=np.float32)
+        blobs.append(('embeddings', memoryview(embeddings.reshape(-1))))
+
+        header = {
+            'byteorder': sys.byteorder,
+            'max_pattern_length': self.max_pattern_length,
+            'min_frequency': self.min_frequency,
+            'max_patterns': self.max_patterns,
+            'keywords': list(self.keywords),
+            'vocab_size': len(self.vocab),
+            'bridge_count': len(self.bridges),
+            'embedding_dim': int(embeddings.shape[1]),
+            'stats': self.stats,
+            'arrays': {}
+        }
+
+        # La cabecera depende de los offsets y viceversa: se reserva un tamaño fijo
+        def layout(data_start: int) -> int:
+            position = data_start
+            for name, blob in blobs:
+                position = -(-position // MMAP_ALIGNMENT) * MMAP_ALIGNMENT
+                header['arrays'][name] = [blob.format, position, len(blob)]
+                position += blob.nbytes
+            return position
+
+        data_start = MMAP_ALIGNMENT
+        while True:
+            layout(data_start)
+            header_bytes = json.dumps(header).encode('utf-8')
+            needed = len(MMAP_MAGIC) + 4 + len(header_bytes)
+            if needed <= data_start:
+                break
+            data_start = -(-needed // MMAP_ALIGNMENT) * MMAP_ALIGNMENT
+
+        directory = os.path.dirname(filepath) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MMAP_MAGIC)
+                f.write(len(header_bytes).to_bytes(4, 'little'))
+                f.write(header_bytes)
+                for name, blob in blobs:
+                    f.write(b"\0" * (header['arrays'][name][1] - f.tell()))
+                    f.write(blob.cast('B'))
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _load_mmap(self, filepath: str) -> Dict:
+        """
+        Mapea un modelo en formato .uelm sin copiar sus arrays
+
+        Los arrays quedan como vistas de solo lectura sobre el mapa, de modo que
+        varios procesos comparten las mismas páginas físicas. Solo el vocabulario
+        y los puentes se decodifican a strings.
+
+        Returns:
+            Dict: cabecera del archivo
+        """
+        with open(filepath, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(mapped)
+        header_size = int.from_bytes(buffer[len(MMAP_MAGIC):len(MMAP_MAGIC) + 4], 'little')
+        header_start = len(MMAP_MAGIC) + 4
+        header = json.loads(bytes(buffer[header_start:header_start + header_size]))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"Modelo guardado con byteorder {header['byteorder']}")
+
+        def view(name: str) -> memoryview:
+            fmt, offset, length = header['arrays'][name]
+            return buffer[offset:offset + length * array(fmt).itemsize].cast(fmt)
+
+        def strings(name: str, count: int) -> List[str]:
+            return str(view(name), 'utf-8').split("\n") if count else []
+
+        self.max_pattern_length = header['max_pattern_length']
+        self.min_frequency = header['min_frequency']
+        self.max_patterns = header['max_patterns']
+        self.keywords = tuple(header.get('keywords', DEFAULT_KEYWORDS))
+        self.vocab = strings('vocab', header['vocab_size'])
+        self.word_ids = {word: word_id for word_id, word in enumerate(self.vocab)}
+        self.bridges = strings('bridges', header['bridge_count'])
+        for name in self.MMAP_ARRAYS:
+            setattr(self, name, view(name))
+        fmt, offset, length = header['arrays']['embeddings']
+        self.embeddings = np.frombuffer(mapped, dtype=np.float32, count=length, offset=offset).reshape(
+            -1, header['embedding_dim'])
+        self._mmap = mapped
+        return header
+
     def load_model(self, filepath: str) -> None:
         """
-        Carga un modelo entrenado desde un archivo
+        Carga un modelo entrenado desde un archivo (formato .uelm mapeado o pickle)
         
         Args:
             filepath: Ruta del archivo del modelo a cargar
@@ -133,15 +1400,18 @@ class UltraEfficientLLM:
         
         try:
             with open(filepath, 'rb') as f:
-                model_data = pickle.load(f)
-            
-            # Restaurar datos del modelo
-            self.max_pattern_length = model_data['max_pattern_length']
-            self.min_frequency = model_data['min_frequency']
-            self.max_patterns = model_data['max_patterns']
-            self.patterns = model_data['patterns']
-            self.pattern_graph = defaultdict(dict, model_data['pattern_graph'])
-            self.word_vectors = model_data['word_vectors']
+                is_mmap = f.read(len(MMAP_MAGIC)) == MMAP_MAGIC
+            self._count_sketch = self._context_sketch = None
+            self._retained_counts = self._context_freqs = None
+            if is_mmap:
+                header = self._load_mmap(filepath)
+                model_data = {'stats': header['stats']}
+            else:
+                with open(filepath, 'rb') as f:
+                    model_data = pickle.load(f)
+                self._load_pickle(model_data)
+            self._pattern_lookup = None
+            self.activation_cache.clear()
             self.stats = model_data['stats']
             
             print(f"✅ Modelo cargado exitosamente")
@@ -156,6 +1426,121 @@ class UltraEfficientLLM:
             print(f"❌ Error cargando modelo: {e}")
             raise
 
+    def _load_pickle(self, model_data: Dict) -> None:
+        """Restaura el modelo desde los datos de un archivo pickle"""
+        self.max_pattern_length = model_data['max_pattern_length']
+        self.min_frequency = model_data['min_frequency']
+        self.max_patterns = model_data['max_patterns']
+        self.sketch_memory_mb = model_data.get('sketch_memory_mb')
+        self.keywords = tuple(model_data.get('keywords', DEFAULT_KEYWORDS))
+        if 'vocab' in model_data:
+            self.vocab = model_data['vocab']
+            self.word_ids = {word: word_id for word_id, word in enumerate(self.vocab)}
+            patterns = model_data['patterns']
+            self.pattern_offsets = patterns['offsets']
+            self.pattern_tokens = patterns['tokens']
+            self.pattern_freqs = patterns['freqs']
+            self._set_graph(model_data['graph'])
+            self.embeddings = model_data['embeddings']
+            word_index = model_data['word_index']
+            self._build_pattern_index((word_index['offsets'], word_index['patterns']))
+            update_state = model_data.get('update_state')
+            # Solo el formato de sketches como dicts (to_state); el de objetos pickleados no se restaura
+            if update_state is not None and isinstance(update_state['sketch'], dict):
+                self._count_sketch = CountMinSketch.from_state(update_state['sketch'])
+                self._context_sketch = CountMinSketch.from_state(update_state['context_sketch'])
+                self._retained_counts = update_state['counts']
+                self._context_freqs = update_state['contexts']
+        else:
+            # Formato antiguo: patrones, grafo y embeddings indexados por strings
+            pattern_ids = self._set_patterns(model_data['patterns'])
+            if 'graph' in model_data:
+                self._set_graph(model_data['graph'])
+            else:
+                self._load_legacy_graph(model_data['pattern_graph'], pattern_ids)
+            self._create_compact_embeddings()
+            for word, vector in model_data['word_vectors'].items():
+                if word in self.word_ids:
+                    self.embeddings[self.word_ids[word]] = vector
+            self._build_pattern_index()
+
+    @property
+    def patterns(self) -> PatternView:
+        """Vista patrón -> frecuencia (los strings se materializan bajo demanda)"""
+        return PatternView(self)
+
+    @patterns.setter
+    def patterns(self, patterns: Dict[str, int]) -> None:
+        self._set_patterns(patterns)
+
+    @property
+    def word_vectors(self) -> VocabularyView:
+        """Vista palabra -> embedding"""
+        return VocabularyView(self.vocab, self.word_ids, self.embeddings)
+
+    def _set_patterns(self, patterns: Dict[str, int]) -> Dict[str, int]:
+        """
+        Interna los patrones como secuencias de IDs de palabra
+
+        Los patrones con las mismas palabras (p. ej. con espacios repetidos)
+        se fusionan sumando sus frecuencias.
+
+        Args:
+            patterns: patrón -> frecuencia
+
+        Returns:
+            Dict: patrón original -> ID de patrón
+        """
+        self.vocab = []
+        self.word_ids = {}
+        self.pattern_offsets = array('i', [0])
+        self.pattern_tokens = array('i')
+        self.pattern_freqs = array('d')
+        self.activation_cache.clear()
+        lookup = {}
+        pattern_ids = {}
+
+        for pattern, frequency in patterns.items():
+            key = tuple(self._intern_word(word) for word in pattern.split())
+            pattern_id = lookup.get(key)
+            if pattern_id is None:
+                pattern_id = lookup[key] = len(self.pattern_freqs)
+                self.pattern_tokens.extend(key)
+                self.pattern_offsets.append(len(self.pattern_tokens))
+                self.pattern_freqs.append(frequency)
+            else:
+                self.pattern_freqs[pattern_id] += frequency
+            pattern_ids[pattern] = pattern_id
+
+        self._pattern_lookup = lookup
+        return pattern_ids
+
+    def _intern_word(self, word: str) -> int:
+        """Devuelve el ID de una palabra, añadiéndola al vocabulario si es nueva"""
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = self.word_ids[word] = len(self.vocab)
+            self.vocab.append(word)
+        return word_id
+
+    def _pattern_words(self, pattern_id: int) -> array:
+        """IDs de palabra de un patrón"""
+        return self.pattern_tokens[self.pattern_offsets[pattern_id]:self.pattern_offsets[pattern_id + 1]]
+
+    def _pattern_keys(self) -> List[Tuple[int, ...]]:
+        """Todos los patrones como tuplas de IDs de palabra, en orden de ID"""
+        return [tuple(self._pattern_words(pattern_id)) for pattern_id in range(len(self.pattern_freqs))]
+
+    def _pattern_string(self, pattern_id: int) -> str:
+        """Materializa un patrón como string (solo en la frontera de la API)"""
+        return " ".join(self.vocab[word_id] for word_id in self._pattern_words(pattern_id))
+
+    def _find_pattern(self, pattern: str) -> Optional[int]:
+        """ID del patrón con las mismas palabras que `pattern`, o None"""
+        if self._pattern_lookup is None:
+            self._pattern_lookup = {key: pattern_id for pattern_id, key in enumerate(self._pattern_keys())}
+        return self._pattern_lookup.get(tuple(self.word_ids.get(word, -1) for word in pattern.split()))
+
     def is_trained(self) -> bool:
         """
         Verifica si el modelo está entrenado
@@ -176,72 +1561,519 @@ class UltraEfficientLLM:
             'is_trained': self.is_trained(),
             'patterns_count': len(self.patterns),
             'word_vectors_count': len(self.word_vectors),
-            'pattern_graph_nodes': len(self.pattern_graph),
+            'pattern_graph_nodes': self._graph_node_count(),
             'memory_usage_kb': self.stats['memory_kb'],
             'max_pattern_length': self.max_pattern_length,
             'min_frequency': self.min_frequency,
-            'max_patterns': self.max_patterns
+            'max_patterns': self.max_patterns,
+            'sketch_memory_mb': self.sketch_memory_mb,
+            'keywords': list(self.keywords)
         }
 
-    def train(self, texts: List[str]) -> None:
+    def train(self, texts: List[str], num_workers: Optional[int] = None,
+              progress_callback=None) -> Dict:
+        """
+        Entrena el modelo extrayendo patrones y construyendo el grafo
+
+        Args:
+            texts: Textos de entrenamiento
+            num_workers: Procesos para extracción y grafo (default: núcleos disponibles, máx. 32)
+            progress_callback: Función opcional `(etapa, progreso %)` llamada al comenzar
+                cada etapa de TRAINING_STAGES
+
+        Returns:
+            Dict: perfil por etapa del entrenamiento (ver TrainingProfiler), también
+            en stats['training_profile']
+        """
         print("🚀 Iniciando entrenamiento ultra-eficiente (paralelizado real)...")
         start_time = time.time()
-        all_patterns = self._extract_smart_patterns_parallel(texts)
+        self._start_training(progress_callback)
+        if num_workers is None:
+            num_workers = min(multiprocessing.cpu_count(), 32)
+        self._report_progress('extract', len(texts), 'texts')
+        corpus_parts = []
+        all_patterns = self._extract_smart_patterns_parallel(texts, num_workers, corpus_parts)
+        print(f"   Patrones extraídos: {len(all_patterns)}")
+        self._report_progress('filter', len(all_patterns), 'patterns')
+        context_freqs, candidates = {}, {}
+        useful_patterns = self._filter_by_utility(all_patterns, context_freqs, candidates)
+        print(f"   Patrones útiles: {len(useful_patterns)}")
+        self._retain_counts(candidates, context_freqs, all_patterns)
+        self._report_progress('graph', len(texts), 'texts')
+        self._build_pattern_graph(useful_patterns, texts, num_workers, corpus_parts)
+        return self._finish_training(useful_patterns, start_time)
+
+    def train_from_files(self, paths: List[str], num_workers: Optional[int] = None,
+                         progress_callback=None) -> Dict:
+        """
+        Entrena leyendo los archivos en streaming (una línea = un texto)
+
+        Los workers reciben rangos de bytes y leen por lotes acotados, así que
+        ni el proceso padre ni los workers mantienen el corpus completo en memoria.
+
+        Args:
+            paths: Archivos de texto de entrenamiento
+            num_workers: Procesos para extracción y grafo (default: núcleos disponibles, máx. 32)
+            progress_callback: Función opcional `(etapa, progreso %)` (ver train)
+
+        Returns:
+            Dict: perfil por etapa del entrenamiento (ver train)
+        """
+        print(f"🚀 Iniciando entrenamiento en streaming desde {len(paths)} archivos...")
+        start_time = time.time()
+        self._start_training(progress_callback)
+        corpus_bytes = sum(os.path.getsize(path) for path in paths)
+        self._report_progress('extract', corpus_bytes, 'bytes')
+        if num_workers is None:
+            num_workers = min(multiprocessing.cpu_count(), 32)
+        file_ranges = split_file_ranges(paths, num_workers * TASKS_PER_WORKER)
+
+        print(f"🧩 Extrayendo patrones de {len(file_ranges)} rangos usando {num_workers} núcleos...")
+        if self.sketch_memory_mb is not None:
+            all_patterns = self._extract_heavy_hitters(extract_heavy_hitters_file_range, file_ranges, num_workers)
+        else:
+            all_patterns = self._extract_sharded(extract_patterns_file_range, extract_patterns_file_range_shards,
+                                                 file_ranges, num_workers)
+            self.stats.pop('extraction', None)
         print(f"   Patrones extraídos: {len(all_patterns)}")
-        useful_patterns = self._filter_by_utility(all_patterns)
+        self._report_progress('filter', len(all_patterns), 'patterns')
+        context_freqs, candidates = {}, {}
+        useful_patterns = self._filter_by_utility(all_patterns, context_freqs, candidates)
         print(f"   Patrones útiles: {len(useful_patterns)}")
-        self._build_pattern_graph(useful_patterns, texts)
-        print(f"   Grafo construido: {len(self.pattern_graph)} nodos")
-        self._create_compact_embeddings(useful_patterns)
-        print(f"   Embeddings creados: {len(self.word_vectors)}")
+        self._retain_counts(candidates, context_freqs, all_patterns)
+
+        self._report_progress('graph', corpus_bytes, 'bytes')
+        self._set_patterns(useful_patterns)
+        partials = self._map_chunks(build_graph_file_range, file_ranges, num_workers,
+                                    self._pattern_keys(), self.vocab)
+        self._merge_graph_partials(partials, len(self.pattern_freqs))
+        return self._finish_training(useful_patterns, start_time)
+
+    def train_stream(self, texts, num_workers: Optional[int] = None, progress_callback=None) -> Dict:
+        """
+        Entrena desde un iterable de textos sin materializarlo en una lista
+
+        Los textos se vuelcan a un archivo temporal (una línea por texto) y se
+        entrena con train_from_files; los saltos de línea internos se sustituyen
+        por espacios, lo que no altera la tokenización.
+
+        Args:
+            texts: Iterable (o generador) de textos
+            num_workers: Procesos para extracción y grafo
+            progress_callback: Función opcional `(etapa, progreso %)` (ver train)
+        """
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+            spool_path = f.name
+            for text in texts:
+                f.write(text.replace('\r', ' ').replace('\n', ' '))
+                f.write('\n')
+        try:
+            return self.train_from_files([spool_path], num_workers, progress_callback)
+        finally:
+            os.remove(spool_path)
+
+    def update(self, new_texts: List[str], num_workers: Optional[int] = None) -> Dict:
+        """
+        Entrenamiento incremental: añade textos sin reprocesar el corpus anterior
+
+        Solo se extraen patrones de `new_texts`. Sus conteos se suman a los
+        conservados del entrenamiento (exactos para los patrones retenidos,
+        estimados con Count-Min Sketch para el resto), la selección por
+        utilidad se repite solo sobre los candidatos retenidos y las
+        transiciones de los textos nuevos se suman al grafo. Las transiciones
+        de un patrón recién seleccionado solo cuentan desde los textos nuevos.
+        Un modelo sin entrenar se entrena con `train()`.
+
+        Args:
+            new_texts: Textos nuevos
+            num_workers: Procesos para extracción y grafo (default: núcleos disponibles, máx. 32)
+
+        Returns:
+            Dict: perfil por etapa de la actualización (ver train)
+
+        Raises:
+            ValueError: si el modelo no conserva conteos (p. ej. cargado de un .uelm)
+        """
+        if not self.is_trained():
+            return self.train(new_texts, num_workers)
+        if self._count_sketch is None:
+            raise ValueError("El modelo no conserva conteos de entrenamiento; reentrene con train()")
+
+        print(f"🔄 Actualizando modelo con {len(new_texts)} textos nuevos...")
+        start_time = time.time()
+        self._start_training(None)
+        self._report_progress('extract', len(new_texts), 'texts')
+        if num_workers is None:
+            num_workers = min(multiprocessing.cpu_count(), 32)
+        chunks = self._split_texts(new_texts, num_workers)
+
+        corpus_parts = []
+        new_patterns = self._extract_sharded(extract_patterns_encoded_chunk, extract_patterns_chunk_shards, chunks,
+                                             num_workers, corpus_parts)
+        print(f"   Patrones en textos nuevos: {len(new_patterns)}")
+        self._report_progress('filter', len(self._retained_counts) + len(new_patterns), 'patterns')
+        context_estimates = self._merge_pattern_counts(new_patterns)
+        candidates = {}
+        useful_patterns = self._filter_by_utility(self._retained_counts, self._context_freqs, candidates,
+                                                  context_estimates)
+        print(f"   Patrones útiles: {len(useful_patterns)}")
+        self._retain_counts(candidates, self._context_freqs)
+
+        # Los IDs cambian con la nueva selección: ID anterior -> ID nuevo (-1 si sale)
+        self._report_progress('graph', len(new_texts), 'texts')
+        previous_patterns = list(self.patterns)
+        self._set_patterns(useful_patterns)
+        id_map = np.array([-1 if pattern_id is None else pattern_id
+                           for pattern_id in map(self._find_pattern, previous_patterns)], dtype=np.int64)
+        partials = self._map_chunks(build_graph_corpus, corpus_parts, num_workers, self._pattern_keys(), self.vocab)
+        self._extend_graph(id_map, partials)
+        return self._finish_training(useful_patterns, start_time)
+
+    def _retain_counts(self, candidates: Dict[str, int], context_freqs: Dict[str, int],
+                       all_patterns: Optional[Dict[str, int]] = None) -> None:
+        """
+        Conserva los conteos crudos para update() con memoria acotada
+
+        Quedan exactos los candidatos (los RETAINED_PATTERNS_FACTOR * max_patterns
+        patrones de mayor utilidad) y las frecuencias de sus contextos. Con
+        `all_patterns` (tras un entrenamiento completo) se crean además los
+        sketches con los conteos de todos los patrones y contextos; en la
+        extracción aproximada se reutiliza su sketch, que ya cuenta todos los patrones.
+        """
+        if all_patterns is not None:
+            if self._extraction_sketch is not None:
+                self._count_sketch, self._extraction_sketch = self._extraction_sketch, None
+            else:
+                self._count_sketch = CountMinSketch.for_keys(len(all_patterns))
+                self._count_sketch.add(list(all_patterns), list(all_patterns.values()))
+            self._context_sketch = CountMinSketch.for_keys(len(context_freqs))
+            self._context_sketch.add(list(context_freqs), list(context_freqs.values()))
+
+        contexts = {" ".join(pattern.split()[:-1]) for pattern in candidates}
+        self._retained_counts = candidates
+        self._context_freqs = {context: freq for context, freq in context_freqs.items() if context in contexts}
+
+    def _merge_pattern_counts(self, new_patterns: Dict[str, int]) -> Dict[str, int]:
+        """
+        Suma conteos nuevos a los conservados
+
+        Un patrón no retenido parte de su estimación en el sketch. La variación de
+        masa frecuente (>= min_frequency) se suma a las frecuencias de contexto
+        (exactas y del sketch) que son prefijo de caracteres del patrón, como
+        las calcula _filter_by_utility.
+
+        Returns:
+            Dict: estimación del sketch de contextos para los contextos nuevos
+                sin frecuencia exacta
+        """
+        keys = list(new_patterns)
+        weights = [new_patterns[key] for key in keys]
+        previous_estimates = self._count_sketch.estimate(keys)
+        self._count_sketch.add(keys, weights)
+
+        counts = self._retained_counts
+        context_freqs = self._context_freqs
+        min_frequency = self.min_frequency
+        context_deltas = defaultdict(int)
+        missing_contexts = set()
+        for key, weight, estimate in zip(keys, weights, previous_estimates.tolist()):
+            old = counts.get(key)
+            if old is None:
+                old = estimate
+                words = key.split()
+                if len(words) > 1 and " ".join(words[:-1]) not in context_freqs:
+                    missing_contexts.add(" ".join(words[:-1]))
+            new = counts[key] = old + weight
+            delta = (new if new >= min_frequency else 0) - (old if old >= min_frequency else 0)
+            if delta:
+                # Contexto = prefijo de caracteres, como en _filter_by_utility
+                for end in range(1, len(key) + 1):
+                    context = key[:end]
+                    context_deltas[context] += delta
+                    if context in context_freqs:
+                        context_freqs[context] += delta
+
+        self._context_sketch.add(list(context_deltas), list(context_deltas.values()))
+        missing_contexts = list(missing_contexts)
+        return dict(zip(missing_contexts, self._context_sketch.estimate(missing_contexts).tolist()))
+
+    def _start_training(self, progress_callback) -> None:
+        """Prepara el callback de progreso y el perfil de un entrenamiento"""
+        self._progress_callback = progress_callback
+        self._profiler = TrainingProfiler(self.trace_memory)
+
+    def _finish_training(self, useful_patterns: Dict[str, int], start_time: float) -> Dict:
+        """Etapas finales comunes: embeddings, índices, estadísticas y perfil del entrenamiento"""
+        print(f"   Grafo construido: {self._graph_node_count()} nodos")
+        self._report_progress('embed', len(useful_patterns), 'patterns')
+        self._create_compact_embeddings()
+        print(f"   Embeddings creados: {len(self.embeddings)}")
+        self._build_pattern_index()
+        self._pattern_lookup = None  # Solo hace falta durante el entrenamiento
         training_time = time.time() - start_time
         self._update_memory_stats()
         print(f"✅ Entrenamiento completado en {training_time:.2f} segundos")
         print(f"📊 Memoria utilizada: {self.stats['memory_kb']:.2f} KB")
         print(f"🎯 Eficiencia: {len(useful_patterns)} patrones vs ~175B parámetros GPT")
+        self._report_progress('done')
+        self._progress_callback = None
+
+        profile = self._profiler.finish()
+        self._profiler = None
+        self.stats['training_profile'] = profile
+        for stage, stage_profile in profile['stages'].items():
+            throughput = (f", {stage_profile['items_per_s']:.0f} {stage_profile['unit']}/s"
+                          if stage_profile['items_per_s'] is not None else "")
+            print(f"   ⏱️ {stage}: {stage_profile['wall_s']:.2f}s (CPU {stage_profile['cpu_s']:.2f}s){throughput}")
+        return profile
+
+    def _report_progress(self, stage: str, items: Optional[int] = None, unit: Optional[str] = None) -> None:
+        """
+        Marca el comienzo de una etapa de entrenamiento
+
+        Cierra la etapa anterior en el perfil (con 'done', la última) y la
+        notifica al callback, si lo hay. `items` son los elementos que
+        procesa la etapa, de tipo `unit` (para el throughput del perfil).
+        """
+        if self._profiler is not None:
+            if stage == 'done':
+                self._profiler.stop()
+            else:
+                self._profiler.start(stage, items, unit)
+        if self._progress_callback is not None:
+            self._progress_callback(stage, TRAINING_STAGES[stage])
+
+    def _map_chunks(self, func, chunks: list, num_workers: int, *args) -> list:
+        """Aplica `func(chunk, *args)` a cada fragmento (en paralelo si hay varios workers), conservando el orden"""
+        if num_workers > 1 and len(chunks) > 1:
+            arg_lists = [[arg] * len(chunks) for arg in args]
+            if self.persistent_pool:
+                return list(self._get_executor(num_workers).map(func, chunks, *arg_lists))
+            # Con fork, los workers solo comparten el resource tracker del padre si ya
+            # está en marcha; uno propio borraría los bloques de memoria compartida
+            resource_tracker.ensure_running()
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+                return list(executor.map(func, chunks, *arg_lists))
+        return [func(chunk, *args) for chunk in chunks]
+
+    def _imap_chunks_unordered(self, func, chunks: list, num_workers: int, *args):
+        """
+        Como _map_chunks, pero entrega cada resultado al terminar (en orden de llegada)
 
-    def _extract_smart_patterns_parallel(self, texts: List[str]) -> Dict[str, int]:
-        num_workers = min(multiprocessing.cpu_count(), 32)
+        Solo hay num_workers fragmentos enviados a la vez, así que el padre no
+        acumula los resultados: quien consume los combina a medida que llegan.
+        """
+        if num_workers > 1 and len(chunks) > 1:
+            if self.persistent_pool:
+                yield from self._as_completed_window(self._get_executor(num_workers), func, chunks, num_workers, args)
+                return
+            resource_tracker.ensure_running()
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+                yield from self._as_completed_window(executor, func, chunks, num_workers, args)
+            return
+        for chunk in chunks:
+            yield func(chunk, *args)
+
+    @staticmethod
+    def _as_completed_window(executor: concurrent.futures.Executor, func, chunks: list, window: int, args: tuple):
+        """Envía `window` fragmentos y uno nuevo por cada resultado entregado"""
+        remaining = iter(chunks)
+        pending = {executor.submit(func, chunk, *args) for chunk in itertools.islice(remaining, window)}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            while done:
+                pending.update(executor.submit(func, chunk, *args) for chunk in itertools.islice(remaining, 1))
+                # Sin referencias locales: el parcial se libera cuando quien consume lo suelta
+                yield done.pop().result()
+
+    def _get_executor(self, num_workers: int) -> concurrent.futures.ProcessPoolExecutor:
+        """Pool persistente con num_workers procesos (se recrea si cambia el número)"""
+        if self._executor is None or self._executor_workers != num_workers:
+            self.shutdown_pool()
+            resource_tracker.ensure_running()
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers)
+            self._executor_workers = num_workers
+        return self._executor
+
+    def shutdown_pool(self) -> None:
+        """Detiene el pool persistente (con persistent_pool=True); el siguiente entrenamiento lo recrea"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._executor_workers = 0
+
+    def _split_texts(self, texts: List[str], num_workers: int) -> List[List[str]]:
+        """Fragmentos de `texts` por tamaño: TASKS_PER_WORKER por worker si hay varios"""
+        return split_texts_by_size(texts, num_workers * TASKS_PER_WORKER if num_workers > 1 else 1,
+                                   self.chunk_by)
+
+    def _extract_smart_patterns_parallel(self, texts: List[str], num_workers: Optional[int] = None,
+                                         corpus_parts: Optional[list] = None) -> Dict[str, int]:
+        """
+        Extrae los patrones de `texts` repartidos en fragmentos entre los workers
+
+        Args:
+            corpus_parts: Si se pasa, recibe cada fragmento como TokenizedCorpus
+                (en orden) para construir el grafo sin volver a tokenizar; la
+                extracción aproximada no los devuelve
+        """
+        if num_workers is None:
+            num_workers = min(multiprocessing.cpu_count(), 32)
         print(f"🧩 Extrayendo patrones usando {num_workers} núcleos...")
-        chunk_size = max(1, len(texts) // num_workers)
-        chunks = [texts[i:i+chunk_size] for i in range(0, len(texts), chunk_size)]
-        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
-            futures = [executor.submit(extract_patterns_chunk, chunk, self.max_pattern_length, self.min_frequency) for chunk in chunks]
+        if self.sketch_memory_mb is not None:
+            # Un fragmento por worker: cada tarea devuelve un sketch del tamaño del presupuesto
+            chunks = split_texts_by_size(texts, num_workers, self.chunk_by)
+            return self._extract_heavy_hitters(extract_heavy_hitters_chunk, chunks, num_workers)
+        chunks = self._split_texts(texts, num_workers)
+        self.stats.pop('extraction', None)
+        if corpus_parts is None:
+            corpus_parts = []
+        return self._extract_sharded(extract_patterns_encoded_chunk, extract_patterns_chunk_shards, chunks,
+                                     num_workers, corpus_parts)
+
+    def _extract_sharded(self, func, shards_func, chunks: list, num_workers: int,
+                         corpus_parts: Optional[list] = None) -> Dict[str, int]:
+        """
+        Extracción exacta: conteos de todos los fragmentos sumados
+
+        Con un solo worker se suman en proceso los dicts de `func` (también en
+        paralelo, devueltos por la tubería del pool, sin SHARED_MEMORY_HANDOFF).
+        Con varios, `shards_func` deja los conteos de cada worker en memoria compartida
+        particionados por hash en num_workers fragmentos, cada fragmento se
+        suma en paralelo (merge_pattern_shards) y el padre solo une fragmentos
+        disjuntos, en lugar de deserializar y fusionar clave a clave un dict
+        por worker. El resultado sigue el orden de primera aparición, como la
+        suma en serie (los empates de utilidad dependen de él).
+
+        Con `corpus_parts`, `func` y `shards_func` devuelven además el fragmento
+        tokenizado, que se añade a la lista.
+        """
+        if num_workers <= 1 or len(chunks) <= 1 or not SHARED_MEMORY_HANDOFF:
             all_patterns = defaultdict(int)
-            for future in concurrent.futures.as_completed(futures):
-                partial = future.result()
+            partials = self._map_chunks(func, chunks, num_workers, self.max_pattern_length,
+                                        self.min_frequency, self.keywords)
+            for partial in partials:
+                if corpus_parts is not None:
+                    partial, corpus = partial
+                    corpus_parts.append(corpus)
                 for k, v in partial.items():
                     all_patterns[k] += v
-        return dict(all_patterns)
+            return dict(all_patterns)
 
-    def _smart_tokenize(self, text: str) -> List[str]:
-        """Tokenización que preserva estructura semántica"""
-        # Preservar entidades importantes
-        text = re.sub(r'\b([A-Z][a-z]+(?:_[A-Z][a-z]+)*(?:\s+[A-Z][a-z]+(?:_[A-Z][a-z]+)*)*)\b', r'ENTITY_\1', text)
+        blocks = self._map_chunks(shards_func, chunks, num_workers, self.max_pattern_length,
+                                  self.min_frequency, num_workers, self.keywords)
+        if corpus_parts is not None:
+            corpus_parts.extend(corpus for _, _, corpus in blocks)
+            blocks = [(name, segments) for name, segments, _ in blocks]
+        try:
+            merged = self._map_chunks(merge_pattern_shards, list(range(num_workers)), num_workers, blocks)
+        finally:
+            for name, _ in blocks:
+                block = shared_memory.SharedMemory(name=name)
+                block.close()
+                block.unlink()
+
+        keys = []
+        for shard_keys, shard_counts, _ in merged:
+            if len(shard_counts):
+                keys.extend(shard_keys.decode('utf-8').split('\n'))
+        if not keys:
+            return {}
+        order = np.argsort(np.concatenate([ranks for _, _, ranks in merged])).tolist()
+        counts = np.concatenate([counts for _, counts, _ in merged]).tolist()
+        return {keys[i]: counts[i] for i in order}
+
+    def _heavy_hitter_sizes(self) -> Tuple[int, int]:
+        """
+        (columnas del sketch, capacidad del resumen) para sketch_memory_mb
+
+        Mitad del presupuesto para el sketch (SKETCH_DEPTH int64 + 1 byte de
+        presencia por columna) y mitad para el resumen, que llega a vigilar
+        2 * capacidad patrones antes de recortar.
+        """
+        budget = self.sketch_memory_mb * 1024 * 1024 / 2
+        width = 1 << max(10, int(budget // (SKETCH_DEPTH * 8 + 1)).bit_length() - 1)
+        capacity = int(budget // (2 * SPACE_SAVING_ENTRY_BYTES))
+        if capacity < self.max_patterns:
+            raise ValueError(f"sketch_memory_mb={self.sketch_memory_mb} no alcanza para "
+                             f"{self.max_patterns} patrones (resumen de {capacity})")
+        return width, capacity
+
+    def _extract_heavy_hitters(self, func, chunks: list, num_workers: int) -> Dict[str, int]:
+        """
+        Extracción aproximada: combina los sketches y resúmenes de los workers
+
+        Cada patrón vigilado recibe la menor de sus dos cotas superiores (resumen
+        y sketch combinado). Las cotas de error quedan en stats['extraction'].
+
+        sketch_memory_mb es el presupuesto de cada proceso: cada worker tiene su
+        sketch y su resumen, y el padre combina cada parcial en cuanto llega, así
+        que guarda el acumulado y poco más, no los num_workers parciales. El orden
+        de llegada puede cambiar qué claves se recortan, pero no las cotas.
+
+        Returns:
+            Dict: patrón -> conteo estimado, para _filter_by_utility
+        """
+        width, capacity = self._heavy_hitter_sizes()
+        print(f"   Modo heavy hitters: sketch de {SKETCH_DEPTH}x{width}, {capacity} patrones vigilados")
+        sketch = summary = None
+        for partial_sketch, partial_summary in self._imap_chunks_unordered(
+                func, chunks, num_workers, self.max_pattern_length, self.min_frequency,
+                width, capacity, self.keywords):
+            if sketch is None:
+                sketch, summary = partial_sketch, partial_summary  # summary.sketch es `sketch`
+            else:
+                sketch.merge(partial_sketch)
+                summary.merge(partial_summary)
+            del partial_sketch, partial_summary  # libre antes de esperar el siguiente
+
+        summary.tighten()
+        patterns = summary.counts
+        self._extraction_sketch = sketch
+        self.stats['extraction'] = {
+            'mode': 'heavy_hitters',
+            'memory_mb': self.sketch_memory_mb,
+            'sketch_width': width,
+            'heavy_hitters': len(patterns),
+            'total_weight': sketch.total,
+            'count_min_error': sketch.error_bound(),  # con probabilidad 1 - e^-SKETCH_DEPTH
+            'space_saving_error': summary.floor  # determinista; conteos reales > floor no se pierden
+        }
+        return patterns
 
-        # Tokenizar preservando patrones
-        tokens = re.findall(r'\w+|[^\w\s]', text.lower())
+    @staticmethod
+    def _normalize_keywords(keywords: Sequence[str]) -> Tuple[str, ...]:
+        """
+        Palabras clave en minúsculas, como los tokens
 
-        # Restore entities, handling potential underscores
-        tokens = [token.replace('entity_', '').replace('_', ' ') for token in tokens]
+        Cada palabra clave se busca dentro de un solo token (bitmap por token),
+        así que no puede contener espacios.
+        """
+        if isinstance(keywords, str):
+            raise ValueError("keywords debe ser una lista de palabras, no un string")
+        normalized = tuple(keyword.lower() for keyword in keywords)
+        if any(not keyword or any(c.isspace() for c in keyword) for keyword in normalized):
+            raise ValueError(f"Palabras clave inválidas (vacías o con espacios): {list(keywords)}")
+        return normalized
 
-        return [token for token in tokens if len(token) > 0]
+    def _smart_tokenize(self, text: str) -> List[str]:
+        """Tokenización que preserva estructura semántica"""
+        return smart_tokenize(text)
 
     def _has_semantic_value(self, pattern: str) -> bool:
         """Determina si un patrón tiene valor semántico real"""
         # Filtrar stop words aislados
-        stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
         words = pattern.split()
 
-        if len(words) == 1 and words[0] in stop_words:
+        if len(words) == 1 and words[0] in STOP_WORDS:
             return False
 
         # Filtrar solo puntuación
-        if re.match(r'^[^\w\s]+$', pattern):
+        if PUNCTUATION_PATTERN.match(pattern):
             return False
 
         # Debe tener al menos una palabra significativa
-        significant_words = [w for w in words if w not in stop_words and len(w) > 2]
+        significant_words = [w for w in words if w not in STOP_WORDS and len(w) > 2]
         return len(significant_words) > 0
 
     def _calculate_pattern_weight(self, tokens: List[str], start: int, length: int) -> int:
@@ -260,16 +2092,39 @@ class UltraEfficientLLM:
         context_end = min(len(tokens), start + length + 2)
         context = " ".join(tokens[context_start:context_end])
 
-        if any(keyword in context for keyword in ['machine', 'learning', 'artificial', 'intelligence']):
+        if any(keyword in context for keyword in self.keywords):
             base_weight += 2
 
         return base_weight
 
-    def _filter_by_utility(self, patterns: Dict[str, int]) -> Dict[str, int]:
-        """Filtra patrones por utilidad predictiva"""
+    def _filter_by_utility(self, patterns: Dict[str, int],
+                           context_freqs: Optional[Dict[str, int]] = None,
+                           candidates: Optional[Dict[str, int]] = None,
+                           context_estimates: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Filtra patrones por utilidad predictiva
+
+        Args:
+            patterns: patrón -> conteo crudo
+            context_freqs: Frecuencias de contexto ya conocidas; las que falten se
+                calculan sobre `patterns` y se añaden al dict
+            context_estimates: Estimaciones para contextos que falten (si `patterns`
+                no es el corpus completo); se usa la mayor de las dos
+            candidates: Si se da, recibe los RETAINED_PATTERNS_FACTOR * max_patterns
+                patrones de mayor utilidad con su conteo crudo (ver update)
+        """
         # Filtro por frecuencia mínima
         frequent = {p: f for p, f in patterns.items() if f >= self.min_frequency}
 
+        # Claves ordenadas + sumas prefijas: la frecuencia de todos los patrones
+        # que empiezan por un contexto es la suma de un rango contiguo
+        sorted_keys = sorted(frequent)
+        prefix_sums = [0]
+        for key in sorted_keys:
+            prefix_sums.append(prefix_sums[-1] + frequent[key])
+        if context_freqs is None:
+            context_freqs = {}
+
         # Calcular utilidad (frecuencia * información mutua aproximada)
         utility_scores = {}
         for pattern, freq in frequent.items():
@@ -279,10 +2134,16 @@ class UltraEfficientLLM:
             if len(words) > 1:
                 # P(último_palabra | contexto) vs P(última_palabra)
                 context = " ".join(words[:-1])
-                last_word = words[-1]
 
-                context_patterns = [p for p in frequent.keys() if p.startswith(context)]
-                context_freq = sum(frequent[p] for p in context_patterns)
+                context_freq = context_freqs.get(context)
+                if context_freq is None:
+                    lo = bisect.bisect_left(sorted_keys, context)
+                    upper = prefix_upper_bound(context)
+                    hi = bisect.bisect_left(sorted_keys, upper, lo) if upper is not None else len(sorted_keys)
+                    context_freq = prefix_sums[hi] - prefix_sums[lo]
+                    if context_estimates is not None:
+                        context_freq = max(context_freq, context_estimates.get(context, 0))
+                    context_freqs[context] = context_freq
 
                 if context_freq > 0:
                     conditional_prob = freq / context_freq
@@ -294,174 +2155,509 @@ class UltraEfficientLLM:
 
             utility_scores[pattern] = utility
 
-        # Seleccionar top patrones por utilidad
-        sorted_patterns = sorted(utility_scores.items(), key=lambda x: x[1], reverse=True)
-        selected = dict(sorted_patterns[:self.max_patterns])
+        # Seleccionar top patrones por utilidad (nlargest es estable como sorted,
+        # así que los max_patterns primeros de un top mayor son el mismo top)
+        keep = self.max_patterns if candidates is None else self.max_patterns * RETAINED_PATTERNS_FACTOR
+        if keep < len(utility_scores):
+            top_patterns = heapq.nlargest(keep, utility_scores.items(), key=lambda x: x[1])
+        else:
+            top_patterns = sorted(utility_scores.items(), key=lambda x: x[1], reverse=True)
+        if candidates is not None:
+            candidates.update((pattern, patterns[pattern]) for pattern, _ in top_patterns)
+        selected = dict(top_patterns[:self.max_patterns])
 
         return selected
 
-    def _build_pattern_graph(self, patterns: Dict[str, int], texts: List[str]) -> None:
-        """Construye grafo de transiciones entre patrones"""
-        self.patterns = patterns
-
-        # Construir grafo de transiciones
-        for text in texts:
-            tokens = self._smart_tokenize(text)
-
-            # Encontrar patrones en el texto
-            pattern_positions = []
-            for i in range(len(tokens)):
-                for pattern in patterns:
-                    pattern_tokens = pattern.split()
-                    if (i + len(pattern_tokens) <= len(tokens) and
-                        " ".join(tokens[i:i+len(pattern_tokens)]) == pattern):
-                        pattern_positions.append((i, i + len(pattern_tokens), pattern))
-
-            # Construir transiciones
-            for i, (start1, end1, pattern1) in enumerate(pattern_positions):
-                for start2, end2, pattern2 in pattern_positions[i+1:]:
-                    if start2 >= end1 and start2 - end1 <= 3:  # Proximidad razonable
-                        # Encontrar palabra/token de transición
-                        if start2 == end1:
-                            transition = "__DIRECT__"
-                        else:
-                            transition = " ".join(tokens[end1:start2])
-
-                        if pattern1 not in self.pattern_graph:
-                            self.pattern_graph[pattern1] = defaultdict(int)
-                        self.pattern_graph[pattern1][transition + " -> " + pattern2] += 1
-
-    def _create_compact_embeddings(self, patterns: Dict[str, int]) -> None:
+    def _build_pattern_graph(self, patterns: Dict[str, int], texts: List[str],
+                             num_workers: int = 1, corpus_parts: Optional[List[TokenizedCorpus]] = None) -> None:
+        """
+        Construye grafo de transiciones entre patrones
+
+        Con varios workers cada proceso cuenta las transiciones de un fragmento
+        y aquí se fusionan en orden de fragmento, lo que da el mismo grafo
+        (incluido el orden de aristas e IDs de puente) que la versión serie.
+        Con `corpus_parts` (los fragmentos ya tokenizados en la extracción, en
+        orden) los textos no se vuelven a tokenizar.
+        """
+        self._set_patterns(patterns)
+        pattern_keys = self._pattern_keys()
+
+        if corpus_parts:
+            partials = self._map_chunks(build_graph_corpus, corpus_parts, num_workers, pattern_keys, self.vocab)
+            self._merge_graph_partials(partials, len(self.pattern_freqs))
+            return
+        if num_workers > 1 and len(texts) > 1:
+            print(f"🕸️ Construyendo grafo usando {num_workers} núcleos...")
+            chunks = self._split_texts(texts, num_workers)
+        else:
+            chunks = [texts]
+
+        partials = self._map_chunks(build_graph_chunk, chunks, num_workers, pattern_keys, self.vocab)
+        self._merge_graph_partials(partials, len(self.pattern_freqs))
+
+    def _merge_graph_partials(self, partials: List[Dict[Tuple[int, str, int], int]], num_patterns: int) -> None:
+        """Fusiona tablas parciales de transiciones (en orden de fragmento) y empaqueta el grafo"""
+        bridge_ids = {DIRECT_BRIDGE: 0}
+        edges = {}  # ID origen -> {(ID siguiente, ID puente): frecuencia}
+        for partial in partials:
+            for (pattern1, transition, pattern2), count in partial.items():
+                bridge_id = bridge_ids.setdefault(transition, len(bridge_ids))
+                source_edges = edges.setdefault(pattern1, {})
+                edge_key = (pattern2, bridge_id)
+                source_edges[edge_key] = source_edges.get(edge_key, 0) + count
+
+        self._pack_graph(edges, list(bridge_ids), num_patterns)
+
+    def _extend_graph(self, id_map: np.ndarray, partials: List[Dict[Tuple[int, str, int], int]]) -> None:
+        """
+        Suma transiciones nuevas al grafo actual tras cambiar la selección de patrones
+
+        Las aristas de patrones que salen de la selección se descartan y las
+        repetidas se suman. El orden es el de _merge_graph_partials (por origen y,
+        dentro de cada origen, por primera aparición: las existentes primero).
+
+        Args:
+            id_map: ID de patrón anterior -> ID nuevo (-1 si ya no está seleccionado)
+            partials: Transiciones de los textos nuevos con los IDs nuevos (ver build_graph_chunk)
+        """
+        offsets = np.asarray(self.graph_offsets, dtype=np.int64)
+        sources = id_map[np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))]
+        targets = id_map[np.asarray(self.graph_next, dtype=np.int64)]
+        kept = (sources >= 0) & (targets >= 0)
+
+        bridge_ids = {bridge: bridge_id for bridge_id, bridge in enumerate(self.bridges)}
+        new_edges = np.array([
+            (pattern1, pattern2, bridge_ids.setdefault(transition, len(bridge_ids)), count)
+            for partial in partials for (pattern1, transition, pattern2), count in partial.items()
+        ], dtype=np.int64).reshape(-1, 4)
+
+        sources = np.concatenate((sources[kept], new_edges[:, 0]))
+        targets = np.concatenate((targets[kept], new_edges[:, 1]))
+        bridges = np.concatenate((np.asarray(self.graph_bridge, dtype=np.int64)[kept], new_edges[:, 2]))
+        counts = np.concatenate((np.asarray(self.graph_counts, dtype=np.int64)[kept], new_edges[:, 3]))
+
+        # Una clave por arista (origen, siguiente, puente); first = primera aparición
+        num_patterns = len(self.pattern_freqs)
+        keys = (sources * num_patterns + targets) * len(bridge_ids) + bridges
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        totals = np.bincount(inverse.reshape(-1), weights=counts)
+        order = np.argsort(first, kind='stable')
+        order = order[np.argsort(sources[first[order]], kind='stable')]
+        edges = first[order]
+
+        def int_array(values: np.ndarray) -> array:
+            return array('i', values.astype(np.int32).tobytes())
+
+        self.bridges = list(bridge_ids)
+        self.graph_offsets = int_array(np.concatenate(([0], np.cumsum(np.bincount(sources[edges], minlength=num_patterns)))))
+        self.graph_next = int_array(targets[edges])
+        self.graph_bridge = int_array(bridges[edges])
+        self.graph_counts = int_array(totals[order])
+
+    def _pack_graph(self, edges: Dict[int, Dict[Tuple[int, int], int]],
+                    bridges: List[str], num_patterns: int) -> None:
+        """
+        Empaqueta las aristas en arrays CSR
+
+        Args:
+            edges: ID origen -> {(ID siguiente, ID puente): frecuencia}
+            bridges: ID de puente -> tokens de transición
+            num_patterns: Número total de patrones
+        """
+        self.bridges = bridges
+        self.graph_offsets = array('i', [0])
+        self.graph_next = array('i')
+        self.graph_bridge = array('i')
+        self.graph_counts = array('i')
+
+        for pattern_id in range(num_patterns):
+            for (next_id, bridge_id), count in edges.get(pattern_id, {}).items():
+                self.graph_next.append(next_id)
+                self.graph_bridge.append(bridge_id)
+                self.graph_counts.append(count)
+            self.graph_offsets.append(len(self.graph_next))
+
+    def _set_graph(self, graph: Dict) -> None:
+        """Restaura los arrays CSR del grafo guardados por save_model"""
+        self.bridges = graph['bridges']
+        self.graph_offsets = graph['offsets']
+        self.graph_next = graph['next']
+        self.graph_bridge = graph['bridge']
+        self.graph_counts = graph['counts']
+
+    def _load_legacy_graph(self, pattern_graph: Dict[str, Dict[str, int]], pattern_ids: Dict[str, int]) -> None:
+        """Convierte un grafo con claves "puente -> patrón" al formato CSR"""
+        bridge_ids = {DIRECT_BRIDGE: 0}
+        edges = {}
+
+        for pattern, transitions in pattern_graph.items():
+            if pattern not in pattern_ids:
+                continue
+            source_edges = edges.setdefault(pattern_ids[pattern], {})
+            for transition, count in transitions.items():
+                bridge, next_pattern = transition.split(" -> ", 1)
+                if next_pattern in pattern_ids:
+                    bridge_id = bridge_ids.setdefault(bridge, len(bridge_ids))
+                    edge_key = (pattern_ids[next_pattern], bridge_id)
+                    source_edges[edge_key] = source_edges.get(edge_key, 0) + count
+
+        self._pack_graph(edges, list(bridge_ids), len(self.pattern_freqs))
+
+    def _graph_node_count(self) -> int:
+        """Número de patrones con al menos una transición saliente"""
+        offsets = self.graph_offsets
+        return sum(1 for i in range(len(offsets) - 1) if offsets[i + 1] > offsets[i])
+
+    @property
+    def pattern_graph(self) -> Dict[str, Dict[str, int]]:
+        """
+        Vista dict del grafo (compatibilidad con el formato anterior)
+
+        Returns:
+            Dict: patrón -> {"puente -> patrón siguiente": frecuencia}
+        """
+        patterns = list(self.patterns)
+        graph = {}
+        for pattern_id in range(len(self.graph_offsets) - 1):
+            start, end = self.graph_offsets[pattern_id], self.graph_offsets[pattern_id + 1]
+            if start < end:
+                graph[patterns[pattern_id]] = {
+                    self.bridges[self.graph_bridge[edge]] + " -> " + patterns[self.graph_next[edge]]:
+                        self.graph_counts[edge]
+                    for edge in range(start, end)
+                }
+        return graph
+
+    def _create_compact_embeddings(self) -> None:
         """Crea embeddings ultra-compactos (8 dimensiones vs 4096)"""
-        # Extraer vocabulario único
-        vocabulary = set()
-        for pattern in patterns:
-            vocabulary.update(pattern.split())
+        # Una fila float32 por palabra del vocabulario, en orden de ID
+        self.embeddings = word_embedding_matrix(self.vocab)
+
+    def similar_words(self, word: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Palabras más similares por coseno, con un único producto matriz-vector
+
+        Args:
+            word: Palabra de consulta
+            top_k: Número de palabras a devolver
 
-        # Crear embeddings compactos usando hash + distribución normal
-        for word in vocabulary:
-            # Seed determinístico basado en la palabra
-            word_hash = hash(word) % (2**31)
-            random.seed(word_hash)
+        Returns:
+            Lista de (palabra, similitud) ordenada de mayor a menor
+        """
+        word_id = self.word_ids.get(word)
+        if word_id is None or top_k <= 0:
+            return []
+
+        norms = np.linalg.norm(self.embeddings, axis=1)
+        norms[norms == 0] = 1.0
+        scores = (self.embeddings @ self.embeddings[word_id]) / (norms * norms[word_id])
+        scores[word_id] = -np.inf
+
+        top_k = min(top_k, len(self.vocab) - 1)
+        if top_k <= 0:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(self.vocab[i], float(scores[i])) for i in best]
+
+    def _build_pattern_index(self, word_index: Optional[Tuple[array, array]] = None) -> None:
+        """
+        Construye el índice invertido palabra -> IDs de patrones
 
-            # Vector de 8 dimensiones
-            vector = [random.gauss(0, 0.5) for _ in range(8)]
-            self.word_vectors[word] = vector
+        Los IDs de patrón de cada palabra quedan ordenados, de modo que
+        recorrerlos ordenados reproduce el orden de un barrido completo.
+
+        Args:
+            word_index: (offsets, IDs de patrón) previamente persistidos (se reutilizan si se dan)
+        """
+        self._pattern_word_counts = array('i')
+        self._pattern_start_words = array('i')
+        self._pattern_first_words = array('i')
+        postings = [[] for _ in self.vocab] if word_index is None else None
+
+        for pattern_id in range(len(self.pattern_freqs)):
+            word_ids = self._pattern_words(pattern_id)
+            # Misma palabra que list(set(pattern.split()))[0] en el barrido original
+            pattern_words = set(self.vocab[word_id] for word_id in word_ids)
+            start_word = next(iter(pattern_words), None)
+            self._pattern_word_counts.append(len(pattern_words))
+            self._pattern_start_words.append(self.word_ids[start_word] if start_word is not None else -1)
+            self._pattern_first_words.append(word_ids[0] if word_ids else -1)
+            if postings is not None:
+                for word_id in set(word_ids):
+                    postings[word_id].append(pattern_id)
+
+        if postings is None:
+            self.word_index_offsets, self.word_index_patterns = word_index
+        else:
+            self.word_index_offsets = array('i', [0])
+            self.word_index_patterns = array('i')
+            for pattern_ids in postings:
+                self.word_index_patterns.extend(pattern_ids)
+                self.word_index_offsets.append(len(self.word_index_patterns))
+
+        self._build_extension_table()
+
+    def _word_patterns(self, word_id: int) -> array:
+        """IDs de los patrones que contienen una palabra"""
+        return self.word_index_patterns[self.word_index_offsets[word_id]:self.word_index_offsets[word_id + 1]]
+
+    def _build_extension_table(self) -> None:
+        """
+        Construye la tabla prefijo -> extensiones directas
+
+        Para cada patrón guarda los patrones más largos que empiezan por él,
+        junto con la palabra que sigue al prefijo, en orden de ID.
+        """
+        pattern_keys = self._pattern_keys()
+        prefix_ids = {key: pattern_id for pattern_id, key in enumerate(pattern_keys) if key}
+        extensions = [[] for _ in pattern_keys]
+
+        for pattern_id, words in enumerate(pattern_keys):
+            for length in range(1, len(words)):
+                prefix_id = prefix_ids.get(words[:length])
+                if prefix_id is not None:
+                    extensions[prefix_id].append((words[length], pattern_id))
+
+        self.extension_offsets = array('i', [0])
+        self.extension_words = array('i')
+        self.extension_patterns = array('i')
+        for pattern_extensions in extensions:
+            for next_word, pattern_id in pattern_extensions:
+                self.extension_words.append(next_word)
+                self.extension_patterns.append(pattern_id)
+            self.extension_offsets.append(len(self.extension_words))
 
     def generate(self, prompt: str, max_length: int = 20, temperature: float = 0.7) -> str:
         """Generación ultra-rápida activando solo patrones relevantes"""
         start_time = time.time()
-        self.stats['total_generations'] += 1
 
-        # Tokenizar prompt
+        # Tokenizar prompt (una sola vez: los pasos extienden esta misma lista)
         result_tokens = self._smart_tokenize(prompt)
+        for _ in self._generate_steps(prompt, result_tokens, max_length, temperature):
+            pass
+
+        generation_time = time.time() - start_time
+        result = " ".join(result_tokens)
+
+        # Log de eficiencia
+        tokens_per_second = len(result_tokens) / (generation_time + 0.001)
+        # Calculate sparsity based on total activations over all generations
+        total_possible_activations = self.stats['total_generations'] * len(self.patterns) if self.patterns else 1
+        sparsity = 1 - (self.stats['activations_per_generation'] / total_possible_activations) if total_possible_activations > 0 else 0
+
+        print(f"⚡ Generado en {generation_time:.3f}s | {tokens_per_second:.0f} tokens/s | Sparsity: {sparsity:.1%}")
+
+        return result
+
+    def generate_stream(self, prompt: str, max_length: int = 20, temperature: float = 0.7):
+        """
+        Genera token a token, entregando cada uno en cuanto se muestrea
+
+        Args:
+            prompt: Texto inicial
+            max_length: Máximo de tokens a generar
+            temperature: Temperatura de muestreo
+
+        Yields:
+            Dict con 'token', 'index' (posición en lo generado), 'step_ms'
+            (tiempo del paso) y 'active_patterns' (patrones activados en el paso)
+        """
+        return self._generate_steps(prompt, self._smart_tokenize(prompt), max_length, temperature)
+
+    def _generate_steps(self, prompt: str, result_tokens: List[str], max_length: int, temperature: float):
+        """Pasos de generate_stream: cada token generado se añade a `result_tokens` (los del prompt)"""
+        self.stats['total_generations'] += 1
         activations_this_gen = 0
         
         # Asegurar que generamos al menos algunos tokens adicionales
         min_generated = max(3, max_length // 2)
         generated_count = 0
 
-        for step in range(max_length):
-            # Obtener contexto reciente
-            context = " ".join(result_tokens[-8:])  # Ventana de contexto ampliada
+        try:
+            for step in range(max_length):
+                step_start = time.perf_counter()
 
-            # Activar solo patrones relevantes
-            active_patterns = self._get_active_patterns(context)
-            activations_this_gen += len(active_patterns)
+                # Obtener contexto reciente
+                context = " ".join(result_tokens[-8:])  # Ventana de contexto ampliada
 
-            # Si no hay patrones activos y ya generamos suficiente, parar
-            if not active_patterns and generated_count >= min_generated:
-                break
+                # Activar solo patrones relevantes
+                active_patterns = self._activate_patterns(context)
+                activations_this_gen += len(active_patterns)
 
-            # Predecir siguiente token usando solo patrones activos
-            next_token = self._predict_next_token(context, active_patterns, temperature)
-
-            if next_token is None:
-                # Si no podemos predecir, intentar con patrones más generales
-                if generated_count < min_generated:
-                    # Buscar patrones que contengan palabras del prompt
-                    prompt_words = set(prompt.lower().split())
-                    for pattern, freq in self.patterns.items():
-                        pattern_words = set(pattern.lower().split())
-                        if any(word in pattern_words for word in prompt_words):
-                            pattern_tokens = pattern.split()
-                            if len(pattern_tokens) > len(result_tokens):
-                                next_token = pattern_tokens[len(result_tokens)]
-                                break
-                
-                if next_token is None:
+                # Si no hay patrones activos y ya generamos suficiente, parar
+                if not active_patterns and generated_count >= min_generated:
                     break
 
-            result_tokens.append(next_token)
-            generated_count += 1
+                # Predecir siguiente token usando solo patrones activos
+                next_token = self._predict_next_token(context, active_patterns, temperature)
 
-        generation_time = time.time() - start_time
-        # Only update activations if there were any active patterns
-        if activations_this_gen > 0:
-             self.stats['activations_per_generation'] += activations_this_gen
+                if next_token is None:
+                    # Si no podemos predecir, intentar con patrones más generales
+                    if generated_count < min_generated:
+                        next_token = self._prompt_fallback_token(prompt, len(result_tokens))
+                    
+                    if next_token is None:
+                        break
 
-        result = " ".join(result_tokens)
+                token = self.vocab[next_token]
+                result_tokens.append(token)
+                generated_count += 1
+
+                yield {
+                    'token': token,
+                    'index': generated_count - 1,
+                    'step_ms': (time.perf_counter() - step_start) * 1000,
+                    'active_patterns': len(active_patterns)
+                }
+        finally:
+            # Only update activations if there were any active patterns
+            if activations_this_gen > 0:
+                self.stats['activations_per_generation'] += activations_this_gen
+
+    def generate_batch(self, prompts: List[str], max_length: int = 20,
+                       temperature: float = 0.7) -> List[str]:
+        """
+        Genera varias secuencias a la vez, avanzando todas en cada paso
 
-        # Log de eficiencia
-        tokens_per_second = len(result_tokens) / (generation_time + 0.001)
-        # Calculate sparsity based on total activations over all generations
-        total_possible_activations = self.stats['total_generations'] * len(self.patterns) if self.patterns else 1
-        sparsity = 1 - (self.stats['activations_per_generation'] / total_possible_activations) if total_possible_activations > 0 else 0
+        Cada secuencia sigue las mismas reglas que generate(), pero la
+        activación se calcula una sola vez por conjunto de palabras de
+        contexto distinto y el scoring de candidatos una vez por contexto
+        distinto en todo el lote. Los prompts repetidos se tokenizan una vez.
 
-        print(f"⚡ Generado en {generation_time:.3f}s | {tokens_per_second:.0f} tokens/s | Sparsity: {sparsity:.1%}")
+        Args:
+            prompts: Lista de prompts
+            max_length: Máximo de tokens a generar por secuencia
+            temperature: Temperatura de muestreo
 
-        return result
+        Returns:
+            Textos generados, en el mismo orden que `prompts`
+        """
+        start_time = time.time()
+        self.stats['total_generations'] += len(prompts)
+
+        tokenized = {}
+        sequences = []
+        for prompt in prompts:
+            if prompt not in tokenized:
+                tokenized[prompt] = self._smart_tokenize(prompt)
+            sequences.append(list(tokenized[prompt]))
+
+        min_generated = max(3, max_length // 2)
+        generated_counts = [0] * len(prompts)
+        live = list(range(len(prompts)))
+        activations = 0
+        active_by_words = {}  # palabras del contexto -> patrones activos
+        candidates_by_context = {}  # contexto -> candidatos puntuados (sin relleno aleatorio)
+
+        for step in range(max_length):
+            still_live = []
+            for index in live:
+                result_tokens = sequences[index]
+                context = " ".join(result_tokens[-8:])
+                context_words = frozenset(context.lower().split())
+
+                active_patterns = active_by_words.get(context_words)
+                if active_patterns is None:
+                    active_patterns = active_by_words[context_words] = self._activate_patterns(context)
+                activations += len(active_patterns)
+
+                if not active_patterns and generated_counts[index] >= min_generated:
+                    continue
+
+                context_ids = [self.word_ids.get(word, -1) for word in context.lower().split()]
+                candidates = candidates_by_context.get(context)
+                if candidates is None:
+                    candidates = candidates_by_context[context] = self._score_candidates(context_ids, active_patterns)
+                next_token = self._sample_candidates(candidates, context_ids, temperature)
+
+                if next_token is None and generated_counts[index] < min_generated:
+                    next_token = self._prompt_fallback_token(prompts[index], len(result_tokens))
+                if next_token is None:
+                    continue
+
+                result_tokens.append(self.vocab[next_token])
+                generated_counts[index] += 1
+                still_live.append(index)
+            live = still_live
+            if not live:
+                break
+
+        if activations > 0:
+            self.stats['activations_per_generation'] += activations
+
+        generation_time = time.time() - start_time
+        total_tokens = sum(len(tokens) for tokens in sequences)
+        print(f"⚡ Lote de {len(prompts)} generado en {generation_time:.3f}s | "
+              f"{total_tokens / (generation_time + 0.001):.0f} tokens/s | "
+              f"{len(active_by_words)} activaciones distintas")
+
+        return [" ".join(tokens) for tokens in sequences]
+
+    def _prompt_fallback_token(self, prompt: str, position: int) -> Optional[int]:
+        """Palabra en `position` del primer patrón (por ID) que comparte palabras con el prompt"""
+        prompt_word_ids = {self.word_ids[word] for word in prompt.lower().split() if word in self.word_ids}
+        matched = set()
+        for word_id in prompt_word_ids:
+            matched.update(self._word_patterns(word_id))
+        for pattern_id in sorted(matched):
+            pattern_tokens = self._pattern_words(pattern_id)
+            if len(pattern_tokens) > position:
+                return pattern_tokens[position]
+        return None
 
     def _get_active_patterns(self, context: str) -> List[Tuple[str, float]]:
-        """Activa solo patrones relevantes - CLAVE de la eficiencia"""
-        cache_key = context[-20:]  # Key de cache - mantiene 20 caracteres para la clave
+        """Patrones activos como (patrón, score) - frontera de la API"""
+        return [(self._pattern_string(pattern_id), score)
+                for pattern_id, score in self._activate_patterns(context)]
 
-        if cache_key in self.activation_cache:
+    def _activate_patterns(self, context: str) -> List[Tuple[int, float]]:
+        """Activa solo patrones relevantes - CLAVE de la eficiencia"""
+        # La activación solo depende del conjunto de palabras normalizadas del contexto
+        context_words = frozenset(context.lower().split())
+        cached = self.activation_cache.get(context_words)
+        if cached is not None:
             self.stats['cache_hits'] += 1
-            return self.activation_cache[cache_key]
+            return cached
 
         active = []
-        context_words = set(context.lower().split())
-        
-        # Si no hay palabras en el contexto, usar el prompt completo
-        if not context_words:
-            context_words = set(context.lower().split())
-
-        # Examinar patrones que comparten palabras con el contexto
-        for pattern, frequency in self.patterns.items():
-            pattern_words = set(pattern.lower().split())
-
-            # Overlap semántico mejorado
-            overlap = len(context_words & pattern_words)
-            if overlap > 0:
-                # Score de activación mejorado
-                semantic_score = overlap / max(len(pattern_words), 1)
-                frequency_score = min(frequency / 5.0, 1.0)  # Normalizar con umbral más bajo
-                
-                # Bonus para patrones que empiezan con palabras del contexto
-                start_bonus = 1.0
-                if pattern_words and context_words:
-                    if list(pattern_words)[0] in context_words:
-                        start_bonus = 2.0
-
-                activation_score = semantic_score * frequency_score * start_bonus
-
-                # Umbral de activación más bajo para mayor sensibilidad
-                if activation_score > 0.1:  # Reducido de 0.3 a 0.1
-                    active.append((pattern, activation_score))
+        context_ids = {self.word_ids[word] for word in context_words if word in self.word_ids}
+
+        # Contar overlap solo en patrones que comparten palabras con el contexto
+        overlaps = defaultdict(int)
+        for word_id in context_ids:
+            for pattern_id in self._word_patterns(word_id):
+                overlaps[pattern_id] += 1
+
+        for pattern_id in sorted(overlaps):
+            frequency = self.pattern_freqs[pattern_id]
+
+            # Score de activación mejorado
+            semantic_score = overlaps[pattern_id] / max(self._pattern_word_counts[pattern_id], 1)
+            frequency_score = min(frequency / 5.0, 1.0)  # Normalizar con umbral más bajo
+
+            # Bonus para patrones que empiezan con palabras del contexto
+            start_bonus = 1.0
+            if self._pattern_start_words[pattern_id] in context_ids:
+                start_bonus = 2.0
+
+            activation_score = semantic_score * frequency_score * start_bonus
+
+            # Umbral de activación más bajo para mayor sensibilidad
+            if activation_score > 0.1:  # Reducido de 0.3 a 0.1
+                active.append((pattern_id, activation_score))
 
         # Si no hay patrones activos, buscar patrones que contengan palabras similares
         if not active:
-            for pattern, frequency in self.patterns.items():
-                pattern_words = set(pattern.lower().split())
-                
-                # Buscar patrones que contengan palabras del contexto
-                for context_word in context_words:
-                    if any(context_word in pattern_word or pattern_word in context_word 
-                           for pattern_word in pattern_words):
-                        activation_score = min(frequency / 10.0, 1.0)
-                        active.append((pattern, activation_score))
-                        break
+            matched = set()
+            for word_id, pattern_word in enumerate(self.vocab):
+                if any(context_word in pattern_word or pattern_word in context_word
+                       for context_word in context_words):
+                    matched.update(self._word_patterns(word_id))
+
+            for pattern_id in sorted(matched):
+                activation_score = min(self.pattern_freqs[pattern_id] / 10.0, 1.0)
+                active.append((pattern_id, activation_score))
 
         # Ordenar por relevancia y tomar más patrones
         active.sort(key=lambda x: x[1], reverse=True)
@@ -470,72 +2666,73 @@ class UltraEfficientLLM:
         top_active = active[:max(5, len(active) // 5)]  # Tomar más patrones
 
         # Cache the result
-        self.activation_cache[cache_key] = top_active
+        self.activation_cache.put(context_words, top_active)
 
         return top_active
 
-    def _predict_next_token(self, context: str, active_patterns: List[Tuple[str, float]],
-                           temperature: float) -> Optional[str]:
-        """Predicción usando solo patrones activos con anti-repetición"""
+    def _predict_next_token(self, context: str, active_patterns: List[Tuple[int, float]],
+                           temperature: float) -> Optional[int]:
+        """Predicción usando solo patrones activos con anti-repetición (devuelve un ID de palabra)"""
+        context_ids = [self.word_ids.get(word, -1) for word in context.lower().split()]
+        candidates = self._score_candidates(context_ids, active_patterns)
+        return self._sample_candidates(candidates, context_ids, temperature)
+
+    def _score_candidates(self, context_ids: List[int],
+                          active_patterns: List[Tuple[int, float]]) -> Dict[int, float]:
+        """Puntúa las palabras candidatas (determinista: solo depende del contexto y los patrones)"""
         candidates = defaultdict(float)
-        context_words = context.lower().split()
 
         # Penalize words in the last 6 and 10 words of the context
-        recent_words_6 = set(context_words[-6:])
-        recent_words_10 = set(context_words[-10:])
-
-        for pattern, activation_score in active_patterns:
-            # Look for possible continuations from the pattern graph
-            if pattern in self.pattern_graph:
-                for transition, count in self.pattern_graph[pattern].items():
-                    if " -> " in transition:
-                        bridge, next_pattern = transition.split(" -> ", 1)
-                        next_words = next_pattern.split()
-
-                        if next_words:
-                            candidate = next_words[0]
-
-                            # ANTI-REPETITION: Penalize recent words
-                            repetition_penalty = 1.0
-                            if candidate in recent_words_6:
-                                repetition_penalty = 0.3
-                            elif candidate in recent_words_10:
-                                repetition_penalty = 0.5
-
-                            score = activation_score * count * repetition_penalty
-                            candidates[candidate] += score
-
-            # Also consider direct extensions of the pattern
-            pattern_words = pattern.split()
-            if len(pattern_words) > 0: # Ensure pattern is not empty
-                 for other_pattern in self.patterns:
-                     other_words = other_pattern.split()
-                     if (len(other_words) > len(pattern_words) and
-                         other_words[:len(pattern_words)] == pattern_words):
-
-                         next_word = other_words[len(pattern_words)]
-
-                         # ANTI-REPETITION applied here as well
-                         repetition_penalty = 1.0
-                         if next_word in recent_words_6:
-                             repetition_penalty = 0.3
-                         elif next_word in context_words[-10:]:
-                             repetition_penalty = 0.5
-
-                         # Adjust scoring for direct extensions - prioritize longer, more frequent extensions
-                         extension_score_factor = self.patterns.get(other_pattern, 0) / max(self.patterns.get(pattern, 1), 1) # Prevent division by zero
-                         score = activation_score * extension_score_factor * 10.0 * repetition_penalty # Boost this pathway
-                         candidates[next_word] += score
-
+        recent_words_6 = set(context_ids[-6:])
+        recent_words_10 = set(context_ids[-10:])
+
+        for pattern_id, activation_score in active_patterns:
+            # Look for possible continuations from the pattern graph (CSR, no string parsing)
+            for edge in range(self.graph_offsets[pattern_id], self.graph_offsets[pattern_id + 1]):
+                candidate = self._pattern_first_words[self.graph_next[edge]]
+
+                if candidate >= 0:
+                    # ANTI-REPETITION: Penalize recent words
+                    repetition_penalty = 1.0
+                    if candidate in recent_words_6:
+                        repetition_penalty = 0.3
+                    elif candidate in recent_words_10:
+                        repetition_penalty = 0.5
+
+                    score = activation_score * self.graph_counts[edge] * repetition_penalty
+                    candidates[candidate] += score
+
+            # Also consider direct extensions of the pattern (precomputed prefix table)
+            pattern_frequency = max(self.pattern_freqs[pattern_id], 1)
+            for extension in range(self.extension_offsets[pattern_id], self.extension_offsets[pattern_id + 1]):
+                next_word = self.extension_words[extension]
+
+                # ANTI-REPETITION applied here as well
+                repetition_penalty = 1.0
+                if next_word in recent_words_6:
+                    repetition_penalty = 0.3
+                elif next_word in recent_words_10:
+                    repetition_penalty = 0.5
+
+                # Adjust scoring for direct extensions - prioritize longer, more frequent extensions
+                extension_score_factor = self.pattern_freqs[self.extension_patterns[extension]] / pattern_frequency
+                score = activation_score * extension_score_factor * 10.0 * repetition_penalty # Boost this pathway
+                candidates[next_word] += score
+
+        return candidates
+
+    def _sample_candidates(self, candidates: Dict[int, float], context_ids: List[int],
+                           temperature: float) -> Optional[int]:
+        """Completa los candidatos con palabras aleatorias si hay pocos y muestrea uno"""
         # DIVERSIDAD: If very few candidates, add random words from vocabulary
         if len(candidates) < 3:
-            vocab_words = list(self.word_vectors.keys())
+            candidates = dict(candidates)  # No modificar candidatos compartidos
             # Avoid adding words that are already very close in the extended context
-            recent_context_set = set(context_words[-8:])
+            recent_context_set = set(context_ids[-8:])
             added_count = 0
             for _ in range(5): # Try adding up to 5 random words
                 if added_count >= 3: break
-                random_word = random.choice(vocab_words)
+                random_word = random.randrange(len(self.vocab))  # Equivale a random.choice sobre el vocabulario
                 if random_word not in candidates and random_word not in recent_context_set:
                      candidates[random_word] = 0.01  # Very low score
                      added_count += 1
@@ -546,7 +2743,7 @@ class UltraEfficientLLM:
         # Apply temperature and sampling
         return self._sample_with_temperature(candidates, temperature)
 
-    def _sample_with_temperature(self, candidates: Dict[str, float], temperature: float) -> str:
+    def _sample_with_temperature(self, candidates: Dict[int, float], temperature: float) -> int:
         """Sampling con temperatura"""
         if not candidates:
             return None
@@ -609,25 +2806,22 @@ class UltraEfficientLLM:
         """Actualiza estadísticas de memoria"""
         total_size = 0
 
-        # Tamaño de patrones
-        total_size += sys.getsizeof(self.patterns)
-        total_size += sum(sys.getsizeof(p) for p in self.patterns.keys())
-        total_size += sum(sys.getsizeof(f) for f in self.patterns.values())
-
-        # Tamaño del grafo
-        total_size += sys.getsizeof(self.pattern_graph)
-        for pattern, next_words_dict in self.pattern_graph.items():
-             total_size += sys.getsizeof(pattern) # Size of the key
-             total_size += sys.getsizeof(next_words_dict) # Size of the inner dict
-             total_size += sum(sys.getsizeof(k) for k in next_words_dict.keys()) # Size of transition keys
-             total_size += sum(sys.getsizeof(v) for v in next_words_dict.values()) # Size of counts
-
-        # Tamaño de embeddings
-        total_size += sys.getsizeof(self.word_vectors)
-        for word, vector in self.word_vectors.items():
-             total_size += sys.getsizeof(word) # Size of the key
-             total_size += sys.getsizeof(vector) # Size of the vector list
-             total_size += sum(sys.getsizeof(item) for item in vector) # Size of floats
+        # Tamaño del vocabulario (cada palabra se guarda una sola vez)
+        total_size += sys.getsizeof(self.vocab) + sys.getsizeof(self.word_ids)
+        total_size += sum(sys.getsizeof(word) for word in self.vocab)
+
+        # Tamaño de patrones, índices y grafo (arrays int32, buffer incluido)
+        for int_array in (self.pattern_offsets, self.pattern_tokens, self.pattern_freqs,
+                          self.word_index_offsets, self.word_index_patterns,
+                          self._pattern_word_counts, self._pattern_start_words, self._pattern_first_words,
+                          self.extension_offsets, self.extension_words, self.extension_patterns,
+                          self.graph_offsets, self.graph_next, self.graph_bridge, self.graph_counts):
+             total_size += sys.getsizeof(int_array)
+        total_size += sys.getsizeof(self.bridges)
+        total_size += sum(sys.getsizeof(b) for b in self.bridges) # Bridge strings
+
+        # Tamaño de embeddings (matriz float32 contigua)
+        total_size += self.embeddings.nbytes
 
         # Tamaño de cache (can be variable)
         total_size += sys.getsizeof(self.activation_cache)
@@ -639,6 +2833,16 @@ class UltraEfficientLLM:
         self.stats['memory_kb'] = total_size / 1024
         self.stats['patterns_stored'] = len(self.patterns)
 
+        # Conteos conservados para update() (no se usan al generar)
+        update_size = 0
+        if self._count_sketch is not None:
+            for sketch in (self._count_sketch, self._context_sketch):
+                update_size += sketch.table.nbytes + sketch.presence.nbytes
+            update_size += sys.getsizeof(self._retained_counts) + sys.getsizeof(self._context_freqs)
+            update_size += sum(sys.getsizeof(pattern) for pattern in self._retained_counts)
+            update_size += sum(sys.getsizeof(context) for context in self._context_freqs)
+        self.stats['update_state_kb'] = update_size / 1024
+
     def get_efficiency_report(self) -> Dict:
         """Genera reporte completo de eficiencia"""
         traditional_llm_memory = 14 * 1024 * 1024  # 14GB in KB
@@ -658,5 +2862,7 @@ class UltraEfficientLLM:
             'sparsity_achieved': f"{sparsity:.1%}",
             'cache_hit_rate': f"{cache_hit_rate:.1%}",
             'activation_efficiency': f"{100 - (avg_activations/len(self.patterns)*100):.1f}%" if self.patterns and len(self.patterns) > 0 else "N/A",
-            'average_activations_per_gen': f"{avg_activations:.2f}"
+            'average_activations_per_gen': f"{avg_activations:.2f}",
+            'activation_cache': self.activation_cache.get_stats(),
+            'training_profile': self.stats.get('training_profile')
         } 
\ No newline at end of file
@@ -4,12 +4,24 @@ Tests para UltraEfficientLLM
 
 import sys
 import os
+import concurrent.futures
+import importlib
+import pickle
+import random
+import subprocess
+import tempfile
+import time
 import unittest
+import unittest.mock
 
 # Agregar el directorio src al path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from ultra_efficient_llm import UltraEfficientLLM
+from ultra_efficient_llm import (
+    UltraEfficientLLM, ActivationCache, CountMinSketch, SpaceSaving, TokenizedCorpus, benchmark_tokenizer,
+    TOKEN_KEYWORD, TOKEN_SIGNIFICANT, TOKEN_STOPWORD, count_corpus_patterns, encode_tokens, find_pattern_positions, index_patterns_by_length,
+    smart_tokenize, smart_tokenize_batch, split_texts_by_size, token_flags, word_embedding_matrix
+)
 from data_processor import DataProcessor
 from utils import validate_model_parameters
 
@@ -50,6 +62,33 @@ class TestUltraEfficientLLM(unittest.TestCase):
         # Verificar que se crearon embeddings
         self.assertGreater(len(self.model.word_vectors), 0)
     
+    def test_training_progress(self):
+        """Test del callback de progreso por etapas"""
+        stages = []
+        self.model.train(self.test_texts, progress_callback=lambda stage, progress: stages.append((stage, progress)))
+        
+        self.assertEqual([stage for stage, _ in stages], ['extract', 'filter', 'graph', 'embed', 'done'])
+        self.assertEqual([progress for _, progress in stages], sorted(progress for _, progress in stages))
+        self.assertIsNone(self.model._progress_callback)
+    
+    def test_training_profile(self):
+        """Test del perfil por etapa del entrenamiento"""
+        model = UltraEfficientLLM(max_pattern_length=3, trace_memory=True)
+        profile = model.train(self.test_texts, num_workers=1)
+        
+        self.assertEqual(list(profile['stages']), ['extract', 'filter', 'graph', 'embed'])
+        extract = profile['stages']['extract']
+        self.assertEqual((extract['items'], extract['unit']), (len(self.test_texts), 'texts'))
+        for stage in profile['stages'].values():
+            self.assertGreaterEqual(stage['wall_s'], 0)
+            self.assertGreaterEqual(stage['cpu_s'], 0)
+            self.assertGreater(stage['peak_traced_kb'], 0)
+        self.assertIs(model.stats['training_profile'], profile)
+        self.assertEqual(model.get_efficiency_report()['training_profile'], profile)
+        
+        update_profile = model.update(["the machine learns new patterns"], num_workers=1)
+        self.assertEqual(list(update_profile['stages']), ['extract', 'filter', 'graph', 'embed'])
+    
     def test_generation(self):
         """Test de generación de texto"""
         self.model.train(self.test_texts)
@@ -78,6 +117,517 @@ class TestUltraEfficientLLM(unittest.TestCase):
         for key in expected_keys:
             self.assertIn(key, report)
     
+    def test_word_index(self):
+        """Test del índice invertido palabra -> patrones"""
+        self.model.train(self.test_texts)
+        
+        self.assertGreater(len(self.model.word_index_patterns), 0)
+        for pattern_id, pattern in enumerate(self.model.patterns):
+            for word in pattern.split():
+                self.assertIn(pattern_id, self.model._word_patterns(self.model.word_ids[word]))
+        
+        # Solo se activan patrones que comparten alguna palabra con el contexto
+        for pattern, score in self.model._get_active_patterns("machine learning"):
+            self.assertTrue({"machine", "learning"} & set(pattern.split()))
+    
+    def test_save_and_load_index(self):
+        """Test de persistencia del índice invertido"""
+        self.model.train(self.test_texts)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path = os.path.join(tmp_dir, "models", "model.pkl")
+            self.model.save_model(model_path)
+            
+            loaded = UltraEfficientLLM()
+            loaded.load_model(model_path)
+        
+        self.assertEqual(loaded.vocab, self.model.vocab)
+        self.assertEqual(loaded.word_index_patterns, self.model.word_index_patterns)
+        self.assertEqual(dict(loaded.patterns), dict(self.model.patterns))
+        self.assertEqual(
+            loaded._get_active_patterns("machine learning"),
+            self.model._get_active_patterns("machine learning")
+        )
+    
+    def test_extension_table(self):
+        """Test de la tabla prefijo -> extensiones directas"""
+        self.model.train(self.test_texts)
+        
+        patterns = list(self.model.patterns)
+        for pattern_id, pattern in enumerate(patterns):
+            words = pattern.split()
+            expected = [
+                (other.split()[len(words)], other_id)
+                for other_id, other in enumerate(patterns)
+                if len(other.split()) > len(words) and other.split()[:len(words)] == words
+            ]
+            start, end = self.model.extension_offsets[pattern_id], self.model.extension_offsets[pattern_id + 1]
+            extensions = [
+                (self.model.vocab[self.model.extension_words[i]], self.model.extension_patterns[i])
+                for i in range(start, end)
+            ]
+            self.assertEqual(extensions, expected)
+    
+    def test_pattern_graph_view(self):
+        """Test de la vista dict del grafo CSR"""
+        self.model.train(self.test_texts)
+        
+        graph = self.model.pattern_graph
+        self.assertEqual(len(graph), self.model.get_model_info()['pattern_graph_nodes'])
+        self.assertEqual(sum(len(t) for t in graph.values()), len(self.model.graph_next))
+        for pattern, transitions in graph.items():
+            self.assertIn(pattern, self.model.patterns)
+            for transition, count in transitions.items():
+                bridge, next_pattern = transition.split(" -> ", 1)
+                self.assertIn(next_pattern, self.model.patterns)
+                self.assertGreater(count, 0)
+    
+    def test_load_legacy_graph(self):
+        """Test de carga de modelos con el grafo en formato de strings"""
+        self.model.train(self.test_texts)
+        
+        legacy_data = {
+            'max_pattern_length': self.model.max_pattern_length,
+            'min_frequency': self.model.min_frequency,
+            'max_patterns': self.model.max_patterns,
+            'patterns': dict(self.model.patterns),
+            'pattern_graph': self.model.pattern_graph,
+            'word_vectors': {word: vector.tolist() for word, vector in self.model.word_vectors.items()},
+            'stats': self.model.stats
+        }
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path = os.path.join(tmp_dir, "legacy.pkl")
+            with open(model_path, 'wb') as f:
+                pickle.dump(legacy_data, f)
+            
+            loaded = UltraEfficientLLM()
+            loaded.load_model(model_path)
+        
+        self.assertEqual(loaded.pattern_graph, self.model.pattern_graph)
+        self.assertEqual(list(loaded.graph_offsets), list(self.model.graph_offsets))
+        self.assertEqual(loaded.embeddings.tolist(), self.model.embeddings.tolist())
+    
+    def test_save_and_load_mmap(self):
+        """Test del formato de modelo mapeado en memoria (.uelm)"""
+        self.model.train(self.test_texts)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path = os.path.join(tmp_dir, "model.uelm")
+            self.model.save_model(model_path)
+            
+            loaded = UltraEfficientLLM()
+            loaded.load_model(model_path)
+            
+            self.assertIsInstance(loaded.pattern_tokens, memoryview)
+            self.assertEqual(dict(loaded.patterns), dict(self.model.patterns))
+            self.assertEqual(loaded.pattern_graph, self.model.pattern_graph)
+            self.assertEqual(loaded.embeddings.tolist(), self.model.embeddings.tolist())
+            for name in UltraEfficientLLM.MMAP_ARRAYS:
+                self.assertEqual(list(getattr(loaded, name)), list(getattr(self.model, name)), name)
+            self.assertEqual(loaded._get_active_patterns("machine learning"),
+                             self.model._get_active_patterns("machine learning"))
+            
+            # Un modelo mapeado se puede volver a guardar en ambos formatos
+            pickle_path = os.path.join(tmp_dir, "model.pkl")
+            loaded.save_model(pickle_path)
+            loaded.save_model(model_path)
+            reloaded = UltraEfficientLLM()
+            reloaded.load_model(pickle_path)
+            self.assertEqual(dict(reloaded.patterns), dict(self.model.patterns))
+    
+    def test_generate_stream(self):
+        """Test de generación token a token"""
+        self.model.train(self.test_texts)
+        
+        random.seed(3)
+        events = list(self.model.generate_stream("machine learning", max_length=6))
+        random.seed(3)
+        generated = self.model.generate("machine learning", max_length=6)
+        
+        self.assertGreater(len(events), 0)
+        self.assertEqual(generated, " ".join(["machine", "learning"] + [e['token'] for e in events]))
+        self.assertEqual([e['index'] for e in events], list(range(len(events))))
+        for event in events:
+            self.assertGreaterEqual(event['step_ms'], 0)
+            self.assertGreaterEqual(event['active_patterns'], 0)
+    
+    def test_generate_batch(self):
+        """Test de generación por lotes"""
+        self.model.train(self.test_texts)
+        prompts = ["machine learning", "the quick", "machine learning", "natural language"]
+        
+        # Con un solo prompt el lote consume el RNG igual que generate()
+        random.seed(7)
+        single = self.model.generate("machine learning", max_length=8)
+        random.seed(7)
+        self.assertEqual(self.model.generate_batch(["machine learning"], max_length=8), [single])
+        
+        results = self.model.generate_batch(prompts, max_length=8)
+        self.assertEqual(len(results), len(prompts))
+        for prompt, result in zip(prompts, results):
+            self.assertTrue(result.startswith(prompt))
+        self.assertEqual(self.model.generate_batch([], max_length=8), [])
+    
+    def test_activation_cache(self):
+        """Test del cache LRU/TTL de activaciones"""
+        cache = ActivationCache(capacity=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)  # expulsa 'b', el menos usado
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        
+        expiring = ActivationCache(capacity=2, ttl=0)
+        expiring.put('a', 1)
+        time.sleep(0.001)
+        self.assertIsNone(expiring.get('a'))
+        self.assertEqual(expiring.expirations, 1)
+        
+        # Contextos con el mismo final de 20 caracteres ya no colisionan
+        model = UltraEfficientLLM(max_pattern_length=3, min_frequency=2, max_patterns=100, cache_size=4)
+        model.train(self.test_texts)
+        first = model._activate_patterns("machine learning enables the quick brown fox")
+        second = model._activate_patterns("natural language enables the quick brown fox")
+        self.assertNotEqual(first, second)
+        self.assertEqual(model._activate_patterns("Machine learning enables the quick brown fox"), first)
+        self.assertEqual(model.activation_cache.hits, 1)
+        self.assertIn('activation_cache', model.get_efficiency_report())
+    
+    def test_embedding_matrix(self):
+        """Test de la matriz de embeddings float32 alineada con el vocabulario"""
+        self.model.train(self.test_texts)
+        embeddings = self.model.embeddings
+        
+        self.assertEqual(embeddings.shape, (len(self.model.vocab), 8))
+        self.assertEqual(embeddings.dtype.name, 'float32')
+        # Cada fila depende solo de su palabra
+        word = self.model.vocab[-1]
+        self.assertEqual(word_embedding_matrix([word]).tolist(), [self.model.word_vectors[word].tolist()])
+        
+        similar = self.model.similar_words(word, top_k=3)
+        self.assertEqual(len(similar), 3)
+        self.assertNotIn(word, [w for w, _ in similar])
+        self.assertEqual([score for _, score in similar], sorted((score for _, score in similar), reverse=True))
+    
+    def test_pattern_positions(self):
+        """Test del escaneo lineal de apariciones de patrones"""
+        self.model.train(self.test_texts)
+        patterns = list(self.model.patterns)
+        patterns_by_length = index_patterns_by_length(self.model._pattern_keys())
+        
+        for text in self.test_texts:
+            tokens = self.model._smart_tokenize(text)
+            token_ids = encode_tokens(tokens, self.model.word_ids)
+            expected = []
+            for i in range(len(tokens)):
+                for pattern_id, pattern in enumerate(patterns):
+                    length = len(pattern.split())
+                    if i + length <= len(tokens) and " ".join(tokens[i:i+length]) == pattern:
+                        expected.append((i, i + length, pattern_id))
+            
+            self.assertEqual(find_pattern_positions(token_ids, patterns_by_length), expected)
+    
+    def test_parallel_graph_matches_serial(self):
+        """Test de construcción del grafo por fragmentos en paralelo"""
+        self.model.train(self.test_texts * 3, num_workers=1)
+        patterns = dict(self.model.patterns)
+        serial = (list(self.model.graph_offsets), list(self.model.graph_next),
+                  list(self.model.graph_bridge), list(self.model.graph_counts), self.model.bridges)
+        
+        self.model._build_pattern_graph(patterns, self.test_texts * 3, num_workers=3)
+        parallel = (list(self.model.graph_offsets), list(self.model.graph_next),
+                    list(self.model.graph_bridge), list(self.model.graph_counts), self.model.bridges)
+        
+        self.assertEqual(parallel, serial)
+        
+        # Entrenamiento en paralelo: el grafo se construye sobre los fragmentos ya tokenizados
+        self.model.train(self.test_texts * 3, num_workers=3)
+        corpus_graph = (list(self.model.graph_offsets), list(self.model.graph_next),
+                        list(self.model.graph_bridge), list(self.model.graph_counts), self.model.bridges)
+        self.assertEqual(corpus_graph, serial)
+    
+    def test_tokenized_corpus(self):
+        """Test de la codificación del corpus tokenizado una sola vez"""
+        texts = self.test_texts + ["", "the lazy dog"]
+        corpus = TokenizedCorpus.from_texts(texts)
+        
+        self.assertEqual(len(corpus), len(texts))
+        self.assertEqual([[corpus.vocab[token] for token in tokens] for tokens in corpus],
+                         smart_tokenize_batch(texts))
+        self.assertEqual(len(corpus.vocab), len(set(corpus.vocab)))
+    
+    def test_count_corpus_patterns(self):
+        """Test del conteo vectorizado de n-gramas (mismos pesos que ventana a ventana)"""
+        texts = self.test_texts + ["", "the of", "Machine_Learning the AI, of learning_rate!"]
+        expected = {}
+        for tokens in smart_tokenize_batch(texts):
+            for length in range(1, 4):
+                for start in range(len(tokens) - length + 1):
+                    pattern = " ".join(tokens[start:start + length])
+                    if self.model._has_semantic_value(pattern):
+                        weight = self.model._calculate_pattern_weight(tokens, start, length)
+                        expected[pattern] = expected.get(pattern, 0) + weight
+        
+        patterns = count_corpus_patterns(TokenizedCorpus.from_texts(texts), 3)
+        self.assertEqual(list(patterns.items()), list(expected.items()))
+        self.assertEqual(count_corpus_patterns(TokenizedCorpus.from_texts([""]), 3), {})
+    
+    def test_keyword_flags(self):
+        """Test del bitmap por token y de las palabras clave configurables"""
+        flags = token_flags(['the', 'of', 'dog', 'machine learning', ',', 'robots'], ['robot'])
+        self.assertEqual(flags.tolist(), [TOKEN_STOPWORD, TOKEN_STOPWORD, TOKEN_SIGNIFICANT,
+                                          TOKEN_SIGNIFICANT, 0, TOKEN_SIGNIFICANT | TOKEN_KEYWORD])
+        
+        corpus = TokenizedCorpus.from_texts(["the robots are here", "machine learning"])
+        default_patterns = count_corpus_patterns(corpus, 2)
+        robot_patterns = count_corpus_patterns(corpus, 2, ['robot'])
+        self.assertEqual(robot_patterns['here'], default_patterns['here'] + 2)
+        self.assertEqual(robot_patterns['machine'], default_patterns['machine'] - 2)
+        
+        model = UltraEfficientLLM(max_pattern_length=3, keywords=['Robot'])
+        self.assertEqual(model.keywords, ('robot',))
+        model.train(self.test_texts + ["the robots are here"], num_workers=1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for filename in ("model.pkl", "model.uelm"):
+                path = os.path.join(tmp_dir, filename)
+                model.save_model(path)
+                loaded_model = UltraEfficientLLM()
+                loaded_model.load_model(path)
+                self.assertEqual(loaded_model.keywords, ('robot',))
+        
+        with self.assertRaises(ValueError):
+            UltraEfficientLLM(keywords=['machine learning'])
+    
+    def test_smart_tokenize(self):
+        """Test del tokenizador de una pasada (mismo resultado que el original)"""
+        expected = {
+            "New York es Grande.": ['new', 'york', 'es', 'grande', '.'],
+            "Machine_Learning y entity_x con _ suelto": ['machine learning', 'y', 'x', 'con', ' ', 'suelto'],
+            "Αθήνα ΣΟΦΟΣ, café!": ['αθήνα', 'σοφος', ',', 'café', '!']
+        }
+        for text, tokens in expected.items():
+            self.assertEqual(smart_tokenize(text), tokens)
+        self.assertEqual(smart_tokenize_batch(list(expected)), list(expected.values()))
+        
+        benchmark = benchmark_tokenizer(self.test_texts, repeats=1)
+        self.assertEqual(benchmark['tokens'], sum(len(smart_tokenize(text)) for text in self.test_texts))
+        self.assertGreater(benchmark['batch_tokens_per_second'], 0)
+    
+    def test_sharded_extraction(self):
+        """Test de la extracción con conteos en memoria compartida"""
+        texts = self.test_texts * 3
+        serial = self.model._extract_smart_patterns_parallel(texts, 1)
+        sharded = self.model._extract_smart_patterns_parallel(texts, 3)
+        
+        # Mismos conteos y mismo orden de primera aparición que la suma en serie
+        self.assertEqual(list(sharded.items()), list(serial.items()))
+        
+        # Sin memoria compartida (Windows) los workers devuelven sus dicts
+        with unittest.mock.patch('ultra_efficient_llm.SHARED_MEMORY_HANDOFF', False):
+            pickled = self.model._extract_smart_patterns_parallel(texts, 3)
+        self.assertEqual(list(pickled.items()), list(serial.items()))
+    
+    def test_adaptive_chunking(self):
+        """Test del reparto por tamaño y del pool persistente"""
+        texts = ["corto"] * 30 + ["un texto mucho más largo que los demás " * 20] + ["corto"] * 30
+        chunks = split_texts_by_size(texts, 4)
+        self.assertEqual([text for chunk in chunks for text in chunk], texts)
+        self.assertLessEqual(len(chunks), 4)
+        self.assertIn([texts[30]], chunks)  # el texto largo va solo
+        self.assertEqual(split_texts_by_size([], 4), [])
+        self.assertEqual(len(split_texts_by_size(texts, 4, 'tokens')), 3)
+        
+        serial_model = UltraEfficientLLM(max_pattern_length=3)
+        serial_model.train(self.test_texts, num_workers=1)
+        model = UltraEfficientLLM(max_pattern_length=3, persistent_pool=True, chunk_by='tokens')
+        try:
+            model.train(self.test_texts, num_workers=2)
+            executor = model._executor
+            model.train(self.test_texts, num_workers=2)
+            self.assertIs(model._executor, executor)
+            self.assertEqual(list(model.patterns.items()), list(serial_model.patterns.items()))
+            self.assertEqual(list(model.graph_counts), list(serial_model.graph_counts))
+        finally:
+            model.shutdown_pool()
+        self.assertIsNone(model._executor)
+        
+        with self.assertRaises(ValueError):
+            UltraEfficientLLM(chunk_by='lines')
+    
+    def test_filter_by_utility(self):
+        """Test del filtro por utilidad con sumas prefijas"""
+        patterns = {
+            "machine": 9, "machine learning": 6, "machine learning is": 4,
+            "machines": 3, "mach": 2, "learning is": 5, "learning": 7,
+            "is a": 2, "is": 1, "art": 4, "artificial intelligence": 3
+        }
+        
+        # Implementación de referencia (barrido cuadrático original)
+        frequent = {p: f for p, f in patterns.items() if f >= self.model.min_frequency}
+        expected_scores = {}
+        for pattern, freq in frequent.items():
+            words = pattern.split()
+            if len(words) > 1:
+                context = " ".join(words[:-1])
+                context_freq = sum(f for p, f in frequent.items() if p.startswith(context))
+                expected_scores[pattern] = freq * (freq / context_freq)
+            else:
+                expected_scores[pattern] = freq
+        
+        for max_patterns in (3, 100):
+            self.model.max_patterns = max_patterns
+            expected = sorted(expected_scores.items(), key=lambda x: x[1], reverse=True)[:max_patterns]
+            self.assertEqual(list(self.model._filter_by_utility(patterns).items()), expected)
+    
+    def test_train_from_files(self):
+        """Test de entrenamiento en streaming desde archivos"""
+        texts = self.test_texts * 4
+        self.model.train(texts, num_workers=1)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for i in range(2):
+                path = os.path.join(tmp_dir, f"corpus_{i}.txt")
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write("\n\n".join(texts[i * 6:(i + 1) * 6]) + "\n")
+                paths.append(path)
+            
+            for num_workers in (1, 2):
+                streamed = UltraEfficientLLM(max_pattern_length=3, min_frequency=2, max_patterns=100)
+                streamed.train_from_files(paths, num_workers=num_workers)
+                self.assertEqual(list(streamed.patterns.items()), list(self.model.patterns.items()))
+                self.assertEqual(streamed.pattern_graph, self.model.pattern_graph)
+    
+    def test_train_stream(self):
+        """Test de entrenamiento desde un iterable de textos"""
+        self.model.train(self.test_texts, num_workers=1)
+        
+        streamed = UltraEfficientLLM(max_pattern_length=3, min_frequency=2, max_patterns=100)
+        streamed.train_stream((text for text in self.test_texts), num_workers=1)
+        
+        self.assertEqual(list(streamed.patterns.items()), list(self.model.patterns.items()))
+        self.assertEqual(streamed.pattern_graph, self.model.pattern_graph)
+    
+    def test_count_min_sketch(self):
+        """Test del Count-Min Sketch usado por update()"""
+        sketch = CountMinSketch.for_keys(100)
+        counts = {f"pattern {i}": i + 1 for i in range(100)}
+        sketch.add(list(counts), list(counts.values()))
+        
+        estimates = sketch.estimate(list(counts)).tolist()
+        self.assertTrue(all(estimate >= count for estimate, count in zip(estimates, counts.values())))
+        self.assertEqual(sketch.estimate(["never seen"]).tolist(), [0])
+        self.assertEqual(sketch.total, sum(counts.values()))
+        self.assertGreater(sketch.error_bound(), 0)
+    
+    def test_space_saving(self):
+        """Test del resumen de heavy hitters con capacidad acotada"""
+        summary = SpaceSaving(capacity=2)
+        for batch in ({"a": 5, "b": 1, "c": 1}, {"a": 5, "d": 1, "e": 1}, {"a": 5, "b": 1}):
+            summary.add(batch)
+        
+        self.assertLessEqual(len(summary.counts), 4)
+        self.assertGreater(summary.floor, 0)
+        self.assertGreaterEqual(summary.counts["a"], 15)
+        self.assertLessEqual(summary.counts["a"] - summary.errors.get("a", 0), 15)
+    
+    def test_heavy_hitter_extraction(self):
+        """Test de la extracción aproximada con presupuesto de memoria"""
+        self.model.train(self.test_texts)
+        approximate = UltraEfficientLLM(max_pattern_length=3, min_frequency=2, max_patterns=100,
+                                        sketch_memory_mb=1)
+        approximate.train(self.test_texts, num_workers=2)
+        
+        # Con un corpus que cabe en el presupuesto la selección es la exacta
+        self.assertEqual(dict(approximate.patterns), dict(self.model.patterns))
+        extraction = approximate.stats['extraction']
+        self.assertEqual(extraction['mode'], 'heavy_hitters')
+        self.assertGreaterEqual(extraction['count_min_error'], 0)
+        self.assertEqual(extraction['space_saving_error'], 0)
+        self.assertNotIn('extraction', self.model.stats)
+        
+        approximate.update(["Machine learning models learn patterns from data."])
+        self.assertIn("learning", approximate.patterns)
+        
+        with self.assertRaises(ValueError):
+            UltraEfficientLLM(max_patterns=100, sketch_memory_mb=0.01).train(self.test_texts)
+    
+    def test_imap_chunks_unordered(self):
+        """Test de la entrega por orden de llegada con num_workers fragmentos enviados a la vez"""
+        chunks = self.test_texts * 4
+        lengths = sorted(map(len, chunks))
+        self.assertEqual(sorted(self.model._imap_chunks_unordered(len, chunks, 2)), lengths)
+        self.assertEqual(sorted(self.model._imap_chunks_unordered(len, chunks, 1)), lengths)
+        
+        submitted = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            submit = executor.submit
+            executor.submit = lambda *args: submitted.append(True) or submit(*args)
+            results = UltraEfficientLLM._as_completed_window(executor, len, chunks, 2, ())
+            for received, _ in enumerate(results, 1):
+                # Enviados y aún sin entregar: nunca más de num_workers
+                self.assertLessEqual(len(submitted) - received, 2)
+        self.assertEqual(len(submitted), len(chunks))
+    
+    def test_incremental_update(self):
+        """Test de update() frente a reentrenar con todos los textos"""
+        new_texts = [
+            "The quick brown fox runs over the lazy dog again.",
+            "Machine learning models learn patterns from data."
+        ]
+        full_model = UltraEfficientLLM(max_pattern_length=3, min_frequency=2, max_patterns=100)
+        full_model.train(self.test_texts + new_texts)
+        
+        self.model.train(self.test_texts)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, "modelo.pkl")
+            self.model.save_model(model_path)
+            loaded_model = UltraEfficientLLM()
+            loaded_model.load_model(model_path)
+        loaded_model.update(new_texts)
+        
+        self.assertEqual(dict(loaded_model.patterns), dict(full_model.patterns))
+        self.assertIn("the lazy dog", loaded_model.patterns)
+        self.assertGreater(loaded_model.stats['update_state_kb'], 0)
+        self.assertIsInstance(loaded_model.generate("the quick", max_length=5), str)
+        
+        # Un modelo sin entrenar se entrena; un .uelm no conserva conteos
+        untrained = UltraEfficientLLM(max_pattern_length=3, min_frequency=2, max_patterns=100)
+        untrained.update(self.test_texts)
+        self.assertEqual(dict(untrained.patterns), dict(self.model.patterns))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, "modelo.uelm")
+            self.model.save_model(model_path)
+            mapped_model = UltraEfficientLLM()
+            mapped_model.load_model(model_path)
+            with self.assertRaises(ValueError):
+                mapped_model.update(new_texts)
+    
+    def test_update_state_import_path(self):
+        """Test de un pickle con conteos de update() guardado y cargado por rutas de importación distintas"""
+        repo_root = os.path.join(os.path.dirname(__file__), '..')
+        sys.path.insert(0, repo_root)
+        try:
+            backend_module = importlib.import_module('src.ultra_efficient_llm')  # como web_app/backend/main.py
+        finally:
+            sys.path.remove(repo_root)
+        model = backend_module.UltraEfficientLLM(max_pattern_length=3, min_frequency=2, max_patterns=100)
+        model.train(self.test_texts, num_workers=1)
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, "modelo.pkl")
+            model.save_model(model_path)
+            # Proceso nuevo que solo ve src/ (como la CLI y estos tests): no existe el paquete 'src'
+            code = ("import sys; from ultra_efficient_llm import UltraEfficientLLM; "
+                    "model = UltraEfficientLLM(); model.load_model(sys.argv[1]); "
+                    "model.update(['machine learning models learn patterns'], num_workers=1)")
+            result = subprocess.run([sys.executable, '-c', code, model_path],
+                                    cwd=os.path.join(repo_root, 'src'), capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+    
     def test_memory_stats(self):
         """Test de estadísticas de memoria"""
         self.model.train(self.test_texts)
@@ -0,0 +1,235 @@
+"""
+Tests para los módulos del backend web (sin servidor: clases de Python puras)
+"""
+
+import sys
+import os
+import asyncio
+import contextlib
+import io
+import tempfile
+import threading
+import unittest
+
+# Agregar los directorios src y backend al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'web_app', 'backend'))
+
+from ultra_efficient_llm import UltraEfficientLLM
+from generation_pool import GenerationExecutor, GenerationQueueFull, GenerationTimeout, ReleasingStreamingResponse
+from inference_pool import InferencePool, worker_generate
+from model_registry import ModelNotFound, ModelRegistry
+from training_jobs import TrainingJobRunner
+
+TEST_TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Machine learning is a subset of artificial intelligence.",
+    "Natural language processing enables computers to understand human language."
+]
+
+
+def train_quietly(texts=TEST_TEXTS) -> UltraEfficientLLM:
+    """Modelo pequeño entrenado sin salida por consola"""
+    model = UltraEfficientLLM(max_pattern_length=3, min_frequency=1, max_patterns=100)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.train(texts, num_workers=1)
+    return model
+
+
+class TestGenerationExecutor(unittest.TestCase):
+    """Tests del pool de generación con backpressure"""
+
+    def setUp(self):
+        self.gate = threading.Event()
+        self.executor = GenerationExecutor(max_workers=1, queue_size=1, timeout=5)
+
+    def tearDown(self):
+        self.gate.set()
+        self.executor.shutdown()
+
+    def test_admission_limit(self):
+        """Test del rechazo (429) al superar workers + cola"""
+        cleanups = []
+
+        async def scenario():
+            running = asyncio.ensure_future(self.executor.run(self.gate.wait, cleanup=lambda: cleanups.append('a')))
+            queued = asyncio.ensure_future(self.executor.run(lambda: 'queued', cleanup=lambda: cleanups.append('b')))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(GenerationQueueFull):
+                await self.executor.run(lambda: 'rejected', cleanup=lambda: cleanups.append('c'))
+            self.assertEqual(cleanups, ['c'])
+            self.gate.set()
+            return await running, await queued
+
+        self.assertEqual(asyncio.run(scenario()), (True, 'queued'))
+        self.assertEqual(sorted(cleanups), ['a', 'b', 'c'])
+        status = self.executor.get_status()
+        self.assertEqual((status['in_flight'], status['rejected'], status['completed']), (0, 1, 2))
+
+    def test_timeout_cancels_queued_job(self):
+        """Test del timeout: el trabajo aún en cola se cancela y libera su plaza"""
+        executed, cleanups = [], []
+
+        async def scenario():
+            running = asyncio.ensure_future(self.executor.run(self.gate.wait))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(GenerationTimeout):
+                await self.executor.run(lambda: executed.append(True), timeout=0.05,
+                                        cleanup=lambda: cleanups.append(True))
+            self.assertEqual(cleanups, [True])
+            self.assertEqual(self.executor.get_status()['in_flight'], 1)
+            self.gate.set()
+            await running
+
+        asyncio.run(scenario())
+        self.assertEqual(executed, [])
+        status = self.executor.get_status()
+        self.assertEqual((status['timeouts'], status['cancelled'], status['completed']), (1, 1, 1))
+
+    def test_explicit_zero_values(self):
+        """Test de que 0 explícito no se sustituye por el valor por defecto"""
+        executor = GenerationExecutor(max_workers=1, queue_size=0, timeout=0)
+        try:
+            self.assertEqual((executor.timeout, executor.capacity), (0, 1))
+        finally:
+            executor.shutdown()
+
+
+class TestReleasingStreamingResponse(unittest.TestCase):
+    """Tests de la liberación de recursos de /api/generate/stream"""
+
+    def test_disconnect_before_first_chunk(self):
+        """Test de que la plaza y el modelo fijado se liberan si el cliente se va antes del primer chunk"""
+        executor = GenerationExecutor(max_workers=1, queue_size=0, timeout=5)
+        registry = ModelRegistry(loader=lambda path: path)
+        registry.register("model-1")
+        started = []
+
+        def events():
+            started.append(True)
+            yield "event: token\ndata: {}\n\n"
+
+        async def disconnect():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            pass
+
+        async def broken_send(message):
+            raise OSError("conexión cerrada")
+
+        # ASGI < 2.4 detecta la desconexión con receive(); ASGI 2.4 con el error de send()
+        for spec_version, sender in (("2.0", send), ("2.4", broken_send)):
+            self.assertTrue(executor.try_acquire())
+            version, _ = registry.acquire()
+
+            def release_stream():
+                executor.release()
+                registry.release("default", version)
+
+            response = ReleasingStreamingResponse(events(), release_stream, media_type="text/event-stream")
+            scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+            with contextlib.suppress(Exception):
+                asyncio.run(response(scope, disconnect, sender))
+
+            self.assertEqual(executor.get_status()['in_flight'], 0)
+            self.assertEqual(registry.list_models()[0]['in_flight'], 0)
+        self.assertEqual(started, [])
+        executor.shutdown()
+
+
+class TestModelRegistry(unittest.TestCase):
+    """Tests del registro de modelos versionados"""
+
+    def test_pin_release_and_evict(self):
+        """Test de que una versión retirada sigue viva mientras esté fijada"""
+        registry = ModelRegistry(loader=lambda path: path)
+        with self.assertRaises(ModelNotFound):
+            registry.acquire()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            first_path = os.path.join(temp_dir, "v1.uelm")
+            open(first_path, 'w').close()
+            self.assertEqual(registry.register("model-1", path=first_path, owns_file=True), 1)
+            version, model = registry.acquire()
+            self.assertEqual((version, model), (1, "model-1"))
+
+            self.assertEqual(registry.register("model-2"), 2)
+            self.assertEqual(registry.active_version(), 2)
+            self.assertEqual([entry['version'] for entry in registry.list_models()], [1, 2])
+            self.assertTrue(os.path.exists(first_path))
+
+            registry.release("default", 1)
+            self.assertEqual([entry['version'] for entry in registry.list_models()], [2])
+            self.assertFalse(os.path.exists(first_path))
+
+        with registry.pinned() as (version, model):
+            self.assertEqual((version, model), (2, "model-2"))
+            self.assertEqual(registry.list_models()[0]['in_flight'], 1)
+        self.assertEqual(registry.list_models()[0]['in_flight'], 0)
+
+
+class TestTrainingJobRunner(unittest.TestCase):
+    """Tests de los trabajos de entrenamiento en segundo plano"""
+
+    def test_job_states(self):
+        """Test de las transiciones queued -> training -> trained y del error"""
+        finished = threading.Event()
+        updates, completed = [], []
+
+        def on_complete(job, model):
+            completed.append((job, model))
+            finished.set()
+
+        def on_update(job):
+            updates.append(job)
+            if job['status'] == 'error':
+                finished.set()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            runner = TrainingJobRunner(UltraEfficientLLM, temp_dir, on_update, on_complete)
+            try:
+                job = runner.submit(TEST_TEXTS, {'max_pattern_length': 3, 'min_frequency': 1})
+                self.assertEqual(job['status'], 'queued')
+                self.assertTrue(finished.wait(60))
+
+                job, model = completed[0]
+                self.assertEqual(job['status'], 'trained')
+                self.assertEqual(runner.get(job['job_id'])['progress'], 100)
+                self.assertTrue(model.is_trained())
+                self.assertIn('training_profile', job['result'])
+
+                finished.clear()
+                failed = runner.submit(TEST_TEXTS, {'unknown_parameter': 1})
+                self.assertTrue(finished.wait(60))
+                self.assertEqual(runner.get(failed['job_id'])['status'], 'error')
+                self.assertIsNone(runner.get("missing"))
+            finally:
+                runner.shutdown()
+
+
+class TestInferencePool(unittest.TestCase):
+    """Tests del pool de procesos de inferencia sobre un modelo compartido"""
+
+    def test_workers_share_model(self):
+        """Test de la conversión pickle -> .uelm y de la generación en los workers"""
+        model = train_quietly()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_path = os.path.join(temp_dir, "modelo.pkl")
+            with contextlib.redirect_stdout(io.StringIO()):
+                model.save_model(model_path)
+
+            pool = InferencePool(UltraEfficientLLM, model_path, num_workers=2)
+            try:
+                self.assertTrue(pool.model_path.endswith(".uelm"))
+                self.assertEqual(len(pool.start()), 2)
+                result = pool.executor.submit(worker_generate, "machine learning", 5, 0.7).result(timeout=60)
+                self.assertIsInstance(result['generated_text'], str)
+                self.assertIn(result['worker_pid'], pool.worker_pids)
+            finally:
+                pool.shutdown(wait=True)
+            self.assertFalse(os.path.exists(pool.model_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Ejecución acotada de generaciones para la API web
+
+`model.generate()` es CPU-bound: ejecutarlo dentro de un endpoint async
+bloquea el event loop y todas las peticiones esperan en fila. Este módulo
+lo despacha a un pool de hilos con un número fijo de workers, limita las
+peticiones admitidas (en ejecución + en cola) y aplica un timeout por
+petición. `ReleasingStreamingResponse` hace lo mismo para /api/generate/stream:
+la plaza y el modelo fijado se liberan al salir de la respuesta.
+
+Configuración por variables de entorno:
+- GENERATION_WORKERS: hilos de generación (default: min(4, núcleos))
+- GENERATION_QUEUE_SIZE: peticiones que pueden esperar un worker libre (default: 32)
+- GENERATION_TIMEOUT: segundos máximos por petición (default: 30)
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import Callable, Optional
+
+from starlette.responses import StreamingResponse
+
+
+class GenerationQueueFull(Exception):
+    """No quedan plazas en la cola de generación (se responde 429)"""
+
+
+class GenerationTimeout(Exception):
+    """La generación superó el timeout de la petición (se responde 504)"""
+
+
+class GenerationExecutor:
+    """
+    Pool de generación con backpressure (hilos por defecto, o el executor dado)
+
+    Una plaza se ocupa al admitir la petición y se libera cuando el trabajo
+    termina de verdad (no al expirar el timeout), así que el límite refleja
+    la carga real de los workers. Un trabajo que expira sin haber salido de
+    la cola se cancela: nadie leería su resultado.
+    """
+
+    def __init__(self, max_workers: int = None, queue_size: int = None, timeout: float = None,
+                 executor: concurrent.futures.Executor = None):
+        """
+        Args:
+            max_workers: Workers del pool (default: GENERATION_WORKERS)
+            queue_size: Peticiones en espera admitidas (default: GENERATION_QUEUE_SIZE)
+            timeout: Segundos por petición (default: GENERATION_TIMEOUT)
+            executor: Pool ya creado con `max_workers` workers (p. ej. de procesos);
+                por defecto se crea un ThreadPoolExecutor
+        """
+        if max_workers is None:
+            max_workers = int(os.environ.get("GENERATION_WORKERS", min(4, os.cpu_count() or 1)))
+        if queue_size is None:
+            queue_size = int(os.environ.get("GENERATION_QUEUE_SIZE", 32))
+        if timeout is None:
+            timeout = float(os.environ.get("GENERATION_TIMEOUT", 30))
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.capacity = self.max_workers + self.queue_size
+
+        self._executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="generation"
+        )
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self.stats = {"completed": 0, "rejected": 0, "timeouts": 0, "cancelled": 0, "errors": 0}
+
+    def try_acquire(self) -> bool:
+        """Reserva una plaza; False si la cola está llena"""
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self.stats["rejected"] += 1
+                return False
+            self._admitted += 1
+            return True
+
+    def release(self) -> None:
+        """Libera una plaza reservada con try_acquire"""
+        with self._lock:
+            self._admitted -= 1
+
+    async def run(self, func: Callable, *args, timeout: float = None,
+                  cleanup: Optional[Callable[[], None]] = None):
+        """
+        Ejecuta `func(*args)` en el pool sin bloquear el event loop
+
+        Si el timeout expira con el trabajo aún en cola, se cancela y no llega
+        a ejecutarse; si ya está en marcha, termina en su worker y conserva la
+        plaza hasta entonces.
+
+        Args:
+            timeout: Segundos para esta petición (default: self.timeout)
+            cleanup: Función que se llama una sola vez cuando la petición deja de
+                ocupar recursos: al rechazarla, al terminar el trabajo o al
+                cancelarlo en cola (p. ej. liberar el modelo fijado)
+
+        Raises:
+            GenerationQueueFull: si no hay plazas libres
+            GenerationTimeout: si el trabajo no termina dentro del timeout
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if not self.try_acquire():
+            if cleanup is not None:
+                cleanup()
+            raise GenerationQueueFull(f"Cola de generación llena ({self.capacity} peticiones en curso)")
+
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self.release()
+            if cleanup is not None:
+                cleanup()
+            raise
+        # El callback corre en el hilo que completa o cancela el trabajo
+        future.add_done_callback(lambda done: self._on_done(done, cleanup))
+        result = asyncio.wrap_future(future)
+        # Tras un timeout nadie espera el resultado: se consume para no avisar de excepciones sin leer
+        result.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+        try:
+            # shield: al expirar el timeout se decide aquí si el trabajo se cancela
+            return await asyncio.wait_for(asyncio.shield(result), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()  # solo tiene efecto si aún no ha empezado
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise GenerationTimeout(f"La generación superó {timeout:.0f}s")
+
+    def _on_done(self, future: concurrent.futures.Future, cleanup: Optional[Callable[[], None]]) -> None:
+        with self._lock:
+            self._admitted -= 1
+            if future.cancelled():
+                self.stats["cancelled"] += 1
+            elif future.exception() is not None:
+                self.stats["errors"] += 1
+            else:
+                self.stats["completed"] += 1
+        if cleanup is not None:
+            cleanup()
+
+    def get_status(self) -> dict:
+        """Estado del pool para los endpoints de estado"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_size": self.queue_size,
+                "timeout_s": self.timeout,
+                "in_flight": self._admitted,
+                **self.stats
+            }
+
+    def shutdown(self) -> None:
+        """Detiene el pool sin esperar a las generaciones en curso"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que libera los recursos de la petición al terminar
+
+    El `finally` del generador no basta: si el cliente se desconecta antes del
+    primer chunk, Starlette cancela la respuesta sin llegar a arrancarlo.
+    `release` se llama una vez al salir de la respuesta, termine como termine
+    (stream completo, desconexión o cancelación).
+    """
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Pool de procesos de inferencia que comparten un modelo de solo lectura
+
+Por el GIL, un proceso solo usa un núcleo para `generate()`. Este módulo
+arranca N procesos worker por adelantado y cada uno mapea el mismo archivo
+.uelm (ver `UltraEfficientLLM.save_model`): las tablas de patrones, el grafo
+y los embeddings son vistas sobre el mapa, así que los N workers comparten
+las mismas páginas físicas en lugar de tener N copias del modelo.
+"""
+
+import concurrent.futures
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+# Modelo cargado en cada proceso worker y barrera de arranque (ver _init_worker)
+_worker_model = None
+_ready_barrier = None
+
+
+def _init_worker(model_class, model_path: str, ready_barrier) -> None:
+    """Inicializador de cada worker: mapea el modelo una sola vez"""
+    global _worker_model, _ready_barrier
+    _worker_model = model_class()
+    _ready_barrier = ready_barrier
+    with contextlib.redirect_stdout(io.StringIO()):
+        _worker_model.load_model(model_path)
+
+
+def _worker_ready() -> int:
+    """
+    Espera en la barrera hasta que todos los workers tengan el modelo cargado
+
+    Un worker bloqueado aquí no puede tomar otra tarea, así que N tareas
+    llegan a N workers distintos.
+    """
+    _ready_barrier.wait(timeout=60)
+    return os.getpid()
+
+
+def generate_with_analysis(model, prompt: str, max_length: int, temperature: float) -> Dict:
+    """Genera texto y resume los patrones activos del prompt (formato de /api/generate)"""
+    generated_text = model.generate(prompt=prompt, max_length=max_length, temperature=temperature)
+    active_patterns = model._get_active_patterns(prompt)
+    return {
+        "generated_text": generated_text,
+        "active_patterns": len(active_patterns),
+        "patterns": [{"pattern": p[0], "score": p[1]} for p in active_patterns[:5]]
+    }
+
+
+def worker_generate(prompt: str, max_length: int, temperature: float) -> Dict:
+    """Generación dentro de un worker con el modelo compartido"""
+    result = generate_with_analysis(_worker_model, prompt, max_length, temperature)
+    result["worker_pid"] = os.getpid()
+    return result
+
+
+class InferencePool:
+    """
+    N procesos pre-arrancados sobre un mismo modelo mapeado en memoria
+
+    La cola de tareas del ProcessPoolExecutor hace de dispatcher: cada worker
+    toma la siguiente petición en cuanto queda libre.
+    """
+
+    def __init__(self, model_class, model_path: str, num_workers: Optional[int] = None):
+        self.model_class = model_class
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self._converted_dir = None
+        self.model_path = self._ensure_mmap_model(model_path)
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            initializer=_init_worker,
+            initargs=(model_class, self.model_path, multiprocessing.Barrier(self.num_workers))
+        )
+        self.worker_pids: List[int] = []
+
+    def _ensure_mmap_model(self, model_path: str) -> str:
+        """Convierte un modelo pickle a .uelm (una vez) para que los workers lo compartan"""
+        model = self.model_class()
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.load_model(model_path)
+        if getattr(model, '_mmap', None) is not None:
+            return model_path
+
+        self._converted_dir = tempfile.mkdtemp(prefix="uelm_")
+        converted_path = os.path.join(self._converted_dir, "model.uelm")
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.save_model(converted_path, format='mmap')
+        return converted_path
+
+    def start(self) -> List[int]:
+        """Arranca los workers y espera a que todos tengan el modelo cargado"""
+        futures = [self.executor.submit(_worker_ready) for _ in range(self.num_workers)]
+        self.worker_pids = sorted({future.result() for future in futures})
+        return self.worker_pids
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Detiene los workers (las peticiones ya encoladas terminan si wait=True)"""
+        self.executor.shutdown(wait=wait)
+        if self._converted_dir is not None:
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(self._converted_dir, "model.uelm"))
+                os.rmdir(self._converted_dir)
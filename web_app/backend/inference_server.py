@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+UltraEfficientLLM Inference API
+Servidor de solo inferencia con N procesos worker sobre un modelo compartido
+
+Uso:
+    MODEL_PATH=models/modelo.uelm INFERENCE_PROCESSES=4 python inference_server.py
+
+Variables de entorno:
+- MODEL_PATH: modelo entrenado (.uelm o pickle; un pickle se convierte a .uelm al arrancar)
+- INFERENCE_PROCESSES: procesos worker (default: núcleos disponibles)
+- GENERATION_QUEUE_SIZE / GENERATION_TIMEOUT: backpressure y timeout (ver generation_pool)
+
+POST /api/model/reload arranca un pool nuevo sobre otro modelo .uelm de
+MODELS_DIR (default: models) y lo activa con un solo cambio de referencia;
+el pool anterior termina sus peticiones antes de detenerse.
+"""
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Form
+import uvicorn
+
+# Agregar el directorio src al path para importar UltraEfficientLLM
+sys.path.append(str(Path(__file__).parent.parent.parent / "src"))
+sys.path.append(str(Path(__file__).parent))
+
+from ultra_efficient_llm import MMAP_EXTENSION, MMAP_MAGIC, UltraEfficientLLM
+from generation_pool import GenerationExecutor, GenerationQueueFull, GenerationTimeout
+from inference_pool import InferencePool, worker_generate
+
+app = FastAPI(
+    title="UltraEfficientLLM Inference API",
+    description="Inferencia multi-proceso con un modelo de solo lectura compartido",
+    version="1.0.0",
+    docs_url="/api/docs",
+    redoc_url="/api/redoc"
+)
+
+# Pool de procesos y dispatcher con backpressure (se crean en el arranque)
+inference_pool: Optional[InferencePool] = None
+generation_pool: Optional[GenerationExecutor] = None
+model_version = 0
+
+# Directorio de modelos que se pueden activar con /api/model/reload
+MODELS_DIR = Path(os.environ.get("MODELS_DIR", "models"))
+
+def start_pools(model_path: str):
+    """Pre-arranca un pool de workers sobre `model_path` y su dispatcher"""
+    num_workers = int(os.environ.get("INFERENCE_PROCESSES", os.cpu_count() or 1))
+    pool = InferencePool(UltraEfficientLLM, model_path, num_workers)
+    pool.start()
+    return pool, GenerationExecutor(max_workers=num_workers, executor=pool.executor)
+
+@app.on_event("startup")
+async def startup_event():
+    """Pre-fork the worker processes over the shared model"""
+    global inference_pool, generation_pool, model_version
+    model_path = os.environ.get("MODEL_PATH")
+    if not model_path:
+        raise RuntimeError("Defina MODEL_PATH con la ruta del modelo entrenado")
+
+    inference_pool, generation_pool = start_pools(model_path)
+    model_version = 1
+    print(f"🚀 Inference API iniciada: {len(inference_pool.worker_pids)} workers sobre {inference_pool.model_path}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the worker processes"""
+    if inference_pool is not None:
+        inference_pool.shutdown()
+
+@app.get("/api/health")
+async def health_check():
+    """Health check endpoint"""
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "model_loaded": inference_pool is not None
+    }
+
+@app.get("/api/model/status")
+async def get_model_status():
+    """Get the shared model and worker pool status"""
+    if inference_pool is None:
+        return {
+            "status": "not_initialized",
+            "message": "Modelo no inicializado"
+        }
+
+    return {
+        "status": "trained",
+        "model_path": inference_pool.model_path,
+        "model_version": model_version,
+        "workers": inference_pool.worker_pids,
+        "generation_pool": generation_pool.get_status()
+    }
+
+@app.post("/api/generate")
+async def generate_text(
+    prompt: str = Form(...),
+    max_length: int = Form(20),
+    temperature: float = Form(0.7)
+):
+    """Generate text in one of the worker processes"""
+    # Referencias locales: una recarga puede activar otro pool mientras tanto
+    pool, version = generation_pool, model_version
+    if pool is None:
+        raise HTTPException(status_code=400, detail="Modelo no inicializado")
+
+    try:
+        result = await pool.run(worker_generate, prompt, max_length, temperature)
+    except GenerationQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except GenerationTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en generación: {str(e)}")
+
+    return {
+        "prompt": prompt,
+        "generated_text": result["generated_text"],
+        "parameters": {
+            "max_length": max_length,
+            "temperature": temperature
+        },
+        "analysis": {
+            "active_patterns": result["active_patterns"],
+            "patterns": result["patterns"]
+        },
+        "worker_pid": result["worker_pid"],
+        "model_version": version
+    }
+
+@app.post("/api/model/reload")
+async def reload_model(model_path: str = Form(...)):
+    """Hot-swap the served model without dropping in-flight requests"""
+    global inference_pool, generation_pool, model_version
+    models_root = MODELS_DIR.resolve()
+    model_file = (MODELS_DIR / model_path).resolve()
+    # Solo modelos .uelm dentro de MODELS_DIR: un pickle ejecuta código al cargarse
+    if models_root not in model_file.parents or not model_file.is_file():
+        raise HTTPException(status_code=404, detail=f"Modelo no encontrado: {model_path}")
+    # load_model decide el formato por la cabecera, no por la extensión
+    with open(model_file, 'rb') as f:
+        is_mmap = f.read(len(MMAP_MAGIC)) == MMAP_MAGIC
+    if model_file.suffix != MMAP_EXTENSION or not is_mmap:
+        raise HTTPException(status_code=400, detail=f"Solo se admiten modelos {MMAP_EXTENSION}")
+
+    try:
+        # El pool nuevo arranca fuera del event loop; el actual sigue atendiendo
+        new_inference_pool, new_generation_pool = await asyncio.to_thread(start_pools, str(model_file))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al cargar modelo: {str(e)}")
+
+    old_pool = inference_pool
+    inference_pool, generation_pool = new_inference_pool, new_generation_pool
+    model_version += 1
+
+    # Las peticiones ya despachadas al pool anterior terminan antes de detenerlo
+    asyncio.get_running_loop().run_in_executor(None, lambda: old_pool.shutdown(wait=True))
+    return {
+        "message": "Modelo recargado exitosamente",
+        "model_path": inference_pool.model_path,
+        "model_version": model_version,
+        "workers": inference_pool.worker_pids
+    }
+
+if __name__ == "__main__":
+    print("🚀 Iniciando UltraEfficientLLM Inference API...")
+    print("📍 Backend: http://localhost:8001")
+    print("📚 Documentación: http://localhost:8001/api/docs")
+    print("=" * 50)
+
+    uvicorn.run(
+        "inference_server:app",
+        host="0.0.0.0",
+        port=8001,
+        log_level="info"
+    )
@@ -22,6 +22,11 @@ sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from src.ultra_efficient_llm import UltraEfficientLLM
 
+sys.path.append(str(Path(__file__).parent))
+from training_jobs import TrainingJobRunner
+from generation_pool import GenerationExecutor, GenerationQueueFull, GenerationTimeout, ReleasingStreamingResponse
+from model_registry import DEFAULT_MODEL, ModelNotFound, ModelRegistry
+
 # Initialize FastAPI app
 app = FastAPI(
     title="UltraEfficientLLM Web API",
@@ -40,12 +45,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global model instance
-model: Optional[UltraEfficientLLM] = None
+def create_model() -> UltraEfficientLLM:
+    """Modelo sin entrenar con los parámetros por defecto de la API"""
+    return UltraEfficientLLM(
+        max_pattern_length=8,
+        min_frequency=1,
+        max_patterns=10000
+    )
+
+def load_model_file(path: str) -> UltraEfficientLLM:
+    """Carga un archivo de save_model (.uelm se mapea en memoria)"""
+    loaded_model = UltraEfficientLLM()
+    loaded_model.load_model(path)
+    return loaded_model
+
+# Modelos con nombre y versión; cada petición fija la versión activa al empezar
+registry = ModelRegistry(load_model_file)
 training_status = {
     "is_training": False,
     "progress": 0,
     "status": "idle",
+    "stage": None,
+    "job_id": None,
     "message": "Modelo no entrenado"
 }
 
@@ -53,47 +74,88 @@ training_status = {
 UPLOADS_DIR = Path("uploads")
 UPLOADS_DIR.mkdir(exist_ok=True)
 
+# Directorio de modelos entrenados por los trabajos en segundo plano
+MODELS_DIR = Path("models")
+
+# Runner de entrenamientos (se crea en el arranque)
+training_jobs: Optional[TrainingJobRunner] = None
+
+# Pool acotado de generación (workers, cola y timeout configurables por entorno)
+generation_pool = GenerationExecutor()
+
+def on_training_update(job: dict):
+    """Refleja el estado de un trabajo de entrenamiento en training_status"""
+    training_status.update({
+        "is_training": job["status"] in ("queued", "training"),
+        "progress": job["progress"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "job_id": job["job_id"],
+        "message": job["message"]
+    })
+
+def on_training_complete(job: dict, trained_model: UltraEfficientLLM):
+    """Activa el modelo recién entrenado como versión nueva (la anterior se descarga al quedar libre)"""
+    registry.register(trained_model, job["model_name"], path=job["model_path"],
+                      owns_file=True, source="training")
+    on_training_update(job)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize the model on startup"""
-    global model
-    model = UltraEfficientLLM(
-        max_pattern_length=8,
-        min_frequency=1,
-        max_patterns=10000
+    registry.register(create_model(), DEFAULT_MODEL)
+    global training_jobs
+    training_jobs = TrainingJobRunner(
+        UltraEfficientLLM, MODELS_DIR,
+        on_update=on_training_update,
+        on_complete=on_training_complete
     )
     print("🚀 UltraEfficientLLM Web API iniciado")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the background training pool"""
+    if training_jobs is not None:
+        training_jobs.shutdown()
+    generation_pool.shutdown()
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "model_loaded": model is not None
+        "model_loaded": registry.active_version() is not None
     }
 
 @app.get("/api/model/status")
-async def get_model_status():
+async def get_model_status(model_name: str = DEFAULT_MODEL):
     """Get current model status"""
-    global model, training_status
+    global training_status
     
-    if model is None:
+    try:
+        with registry.pinned(model_name) as (version, current_model):
+            stats = current_model.get_efficiency_report() if hasattr(current_model, 'get_efficiency_report') else {}
+    except ModelNotFound:
         return {
             "status": "not_initialized",
             "message": "Modelo no inicializado"
         }
     
-    stats = model.get_efficiency_report() if hasattr(model, 'get_efficiency_report') else {}
-    
     return {
         "status": training_status["status"],
         "is_training": training_status["is_training"],
         "progress": training_status["progress"],
+        "stage": training_status["stage"],
+        "job_id": training_status["job_id"],
         "message": training_status["message"],
         "model_stats": stats,
         "patterns_stored": stats.get("patterns_stored", 0),
-        "memory_kb": stats.get("memory_kb", 0)
+        "memory_kb": stats.get("memory_kb", 0),
+        "training_profile": stats.get("training_profile"),
+        "model_name": model_name,
+        "model_version": version,
+        "generation_pool": generation_pool.get_status()
     }
 
 @app.post("/api/upload")
@@ -129,15 +191,27 @@ async def upload_training_file(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al subir archivo: {str(e)}")
 
-@app.post("/api/train")
+def read_training_files(file_paths: List[Path]) -> List[str]:
+    """Líneas no vacías de los archivos de entrenamiento"""
+    training_texts = []
+    for file_path in file_paths:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+            # Split into sentences/lines
+            lines = [line.strip() for line in content.split('\n') if line.strip()]
+            training_texts.extend(lines)
+    return training_texts
+
+@app.post("/api/train", status_code=202)
 async def train_model(
     files: List[str] = Form(...),
     max_patterns: int = Form(10000),
     max_pattern_length: int = Form(8),
-    min_frequency: int = Form(1)
+    min_frequency: int = Form(1),
+    model_name: str = Form(DEFAULT_MODEL)
 ):
-    """Train the model with uploaded files"""
-    global model, training_status
+    """Start training the model with uploaded files in the background"""
+    global training_status
     
     if training_status["is_training"]:
         raise HTTPException(status_code=400, detail="El modelo ya está entrenando")
@@ -153,63 +227,26 @@ async def train_model(
             raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {file_path}")
         file_paths.append(full_path)
     
-    # Start training
-    training_status.update({
-        "is_training": True,
-        "progress": 0,
-        "status": "training",
-        "message": "Iniciando entrenamiento..."
-    })
-    
     try:
-        # Read training data
-        training_texts = []
-        for file_path in file_paths:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Split into sentences/lines
-                lines = [line.strip() for line in content.split('\n') if line.strip()]
-                training_texts.extend(lines)
-        
-        training_status.update({
-            "progress": 20,
-            "message": f"Leyendo {len(training_texts)} líneas de texto..."
-        })
-        
-        # Initialize model with new parameters
-        model = UltraEfficientLLM(
-            max_pattern_length=max_pattern_length,
-            min_frequency=min_frequency,
-            max_patterns=max_patterns
-        )
+        # Leer y partir los archivos en un hilo: con archivos grandes bloquearía el event loop
+        training_texts = await asyncio.to_thread(read_training_files, file_paths)
         
-        training_status.update({
-            "progress": 40,
-            "message": "Modelo inicializado, comenzando entrenamiento..."
-        })
-        
-        # Train model
-        model.train(training_texts)
-        
-        training_status.update({
-            "is_training": False,
-            "progress": 100,
-            "status": "trained",
-            "message": f"Entrenamiento completado. {len(training_texts)} líneas procesadas."
-        })
-        
-        # Get final stats
-        stats = model.get_efficiency_report()
+        # El entrenamiento corre en el pool de procesos; el modelo actual sigue sirviendo
+        job = training_jobs.submit(training_texts, {
+            "max_pattern_length": max_pattern_length,
+            "min_frequency": min_frequency,
+            "max_patterns": max_patterns
+        }, model_name=model_name)
         
         return {
-            "message": "Entrenamiento completado exitosamente",
+            "message": "Entrenamiento iniciado",
+            "job_id": job["job_id"],
+            "model_name": model_name,
+            "status_url": f"/api/train/jobs/{job['job_id']}",
             "training_data": {
                 "files_processed": len(files),
-                "lines_processed": len(training_texts),
-                "patterns_extracted": stats.get("patterns_stored", 0),
-                "memory_used_kb": stats.get("memory_kb", 0)
-            },
-            "model_stats": stats
+                "lines_processed": len(training_texts)
+            }
         }
         
     except Exception as e:
@@ -220,47 +257,158 @@ async def train_model(
         })
         raise HTTPException(status_code=500, detail=f"Error en entrenamiento: {str(e)}")
 
+@app.get("/api/train/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """Get the status of a background training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de entrenamiento no encontrado")
+    return job
+
 @app.post("/api/generate")
 async def generate_text(
     prompt: str = Form(...),
     max_length: int = Form(20),
-    temperature: float = Form(0.7)
+    temperature: float = Form(0.7),
+    model_name: str = Form(DEFAULT_MODEL)
 ):
     """Generate text using the trained model"""
-    global model, training_status
-    
-    if model is None:
+    # Fija la versión activa: un reentrenamiento puede activar otra mientras tanto
+    try:
+        version, current_model = registry.acquire(model_name)
+    except ModelNotFound:
         raise HTTPException(status_code=400, detail="Modelo no inicializado")
     
-    if training_status["status"] != "trained":
+    if not current_model.is_trained():
+        registry.release(model_name, version)
         raise HTTPException(status_code=400, detail="Modelo no entrenado. Entrene primero el modelo.")
     
-    try:
+    def run_generation():
         # Generate text
-        generated_text = model.generate(
+        generated_text = current_model.generate(
             prompt=prompt,
             max_length=max_length,
             temperature=temperature
         )
         
         # Get active patterns for analysis
-        active_patterns = model._get_active_patterns(prompt) if hasattr(model, '_get_active_patterns') else []
-        
-        return {
-            "prompt": prompt,
-            "generated_text": generated_text,
-            "parameters": {
-                "max_length": max_length,
-                "temperature": temperature
-            },
-            "analysis": {
-                "active_patterns": len(active_patterns),
-                "patterns": [{"pattern": p[0], "score": p[1]} for p in active_patterns[:5]]
-            }
-        }
-        
+        active_patterns = current_model._get_active_patterns(prompt) if hasattr(current_model, '_get_active_patterns') else []
+        return generated_text, active_patterns
+    
+    try:
+        # La generación corre en el pool de hilos: el event loop sigue atendiendo peticiones
+        generated_text, active_patterns = await generation_pool.run(
+            run_generation,
+            # El modelo fijado se libera cuando el trabajo termina o se cancela en cola
+            cleanup=lambda: registry.release(model_name, version)
+        )
+    except GenerationQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except GenerationTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en generación: {str(e)}")
+    
+    return {
+        "prompt": prompt,
+        "generated_text": generated_text,
+        "parameters": {
+            "max_length": max_length,
+            "temperature": temperature
+        },
+        "analysis": {
+            "active_patterns": len(active_patterns),
+            "patterns": [{"pattern": p[0], "score": p[1]} for p in active_patterns[:5]]
+        },
+        "model_name": model_name,
+        "model_version": version
+    }
+
+def sse_event(event: str, data: dict) -> str:
+    """Formatea un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/generate/stream")
+async def generate_text_stream(
+    prompt: str,
+    max_length: int = 20,
+    temperature: float = 0.7,
+    model_name: str = DEFAULT_MODEL
+):
+    """Generate text token by token as Server-Sent Events"""
+    # La versión queda fijada hasta que termina el stream
+    try:
+        version, stream_model = registry.acquire(model_name)
+    except ModelNotFound:
+        raise HTTPException(status_code=400, detail="Modelo no inicializado")
+    
+    if not stream_model.is_trained():
+        registry.release(model_name, version)
+        raise HTTPException(status_code=400, detail="Modelo no entrenado. Entrene primero el modelo.")
+    
+    # El streaming comparte el límite de peticiones admitidas con /api/generate
+    if not generation_pool.try_acquire():
+        registry.release(model_name, version)
+        raise HTTPException(status_code=429, detail="Cola de generación llena", headers={"Retry-After": "1"})
+    
+    def events():
+        # Iterador síncrono: Starlette lo consume en su threadpool sin bloquear el event loop
+        tokens = []
+        try:
+            for event in stream_model.generate_stream(prompt, max_length, temperature):
+                tokens.append(event["token"])
+                yield sse_event("token", event)
+            prompt_tokens = stream_model._smart_tokenize(prompt)
+            yield sse_event("done", {
+                "prompt": prompt,
+                "generated_text": " ".join(prompt_tokens + tokens),
+                "tokens_generated": len(tokens),
+                "model_version": version
+            })
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error en generación: {str(e)}"})
+    
+    def release_stream():
+        generation_pool.release()
+        registry.release(model_name, version)
+    
+    # La plaza y la versión se liberan al salir de la respuesta, aunque el
+    # cliente se desconecte antes de que el generador llegue a arrancar
+    return ReleasingStreamingResponse(
+        events(),
+        release_stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/models")
+async def list_models():
+    """List the resident model versions"""
+    return {"models": registry.list_models()}
+
+@app.post("/api/models/load")
+async def load_model_version(
+    filename: str = Form(...),
+    model_name: str = Form(DEFAULT_MODEL)
+):
+    """Load a saved model from the models directory as a new active version"""
+    models_root = MODELS_DIR.resolve()
+    model_file = (MODELS_DIR / filename).resolve()
+    # Solo archivos dentro de MODELS_DIR (los pickles ejecutan código al cargarse)
+    if models_root not in model_file.parents or not model_file.is_file():
+        raise HTTPException(status_code=404, detail=f"Modelo no encontrado: {filename}")
+    
+    try:
+        # La carga corre fuera del event loop; las peticiones siguen con la versión actual
+        version = await asyncio.to_thread(registry.load, str(model_file), model_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al cargar modelo: {str(e)}")
+    
+    return {
+        "message": "Modelo cargado exitosamente",
+        "model_name": model_name,
+        "model_version": version
+    }
 
 @app.get("/api/files")
 async def list_uploaded_files():
@@ -293,18 +441,16 @@ async def delete_file(filename: str):
 @app.post("/api/reset")
 async def reset_model():
     """Reset the model to initial state"""
-    global model, training_status
+    global training_status
     
-    model = UltraEfficientLLM(
-        max_pattern_length=8,
-        min_frequency=1,
-        max_patterns=10000
-    )
+    registry.register(create_model(), DEFAULT_MODEL)
     
     training_status.update({
         "is_training": False,
         "progress": 0,
         "status": "idle",
+        "stage": None,
+        "job_id": None,
         "message": "Modelo reiniciado"
     })
     
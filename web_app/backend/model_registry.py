@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Registro de modelos con nombre y versión para la API web
+
+Cada petición fija (pin) la versión activa al empezar y la libera al
+terminar. Activar una versión nueva es un único cambio de referencia bajo
+lock, así que las peticiones en curso siguen con su versión hasta acabar y
+ninguna ve un modelo a medio construir. Las versiones retiradas se
+descargan en cuanto no quedan peticiones que las usen.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_MODEL = "default"
+
+
+class ModelNotFound(Exception):
+    """No hay ningún modelo activo con ese nombre"""
+
+
+class ModelRegistry:
+    """
+    Modelos por nombre, cada uno con versiones numeradas
+
+    Args:
+        loader: Función `ruta -> modelo` para archivos de save_model
+    """
+
+    def __init__(self, loader: Callable[[str], object]):
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, int], Dict] = {}  # (nombre, versión) -> entrada
+        self._active: Dict[str, int] = {}  # nombre -> versión activa
+        self._last_version: Dict[str, int] = {}
+
+    def register(self, model, name: str = DEFAULT_MODEL, path: Optional[str] = None,
+                 owns_file: bool = False, source: str = "memory") -> int:
+        """
+        Registra un modelo ya construido y lo activa
+
+        Args:
+            model: Modelo completamente construido (no se modifica después)
+            name: Nombre del modelo
+            path: Archivo del que procede, si lo hay
+            owns_file: Borrar `path` al descargar esta versión
+            source: Origen informativo (memory, file, training...)
+
+        Returns:
+            int: versión asignada
+        """
+        with self._lock:
+            version = self._last_version.get(name, 0) + 1
+            self._last_version[name] = version
+            self._entries[(name, version)] = {
+                "model": model,
+                "path": path,
+                "owns_file": owns_file,
+                "source": source,
+                "refs": 0,
+                "loaded_at": datetime.now().isoformat()
+            }
+            # Cambio atómico de la versión activa
+            previous = self._active.get(name)
+            self._active[name] = version
+            evicted = self._evict_if_idle(name, previous) if previous is not None else None
+        self._release_files([evicted])
+        return version
+
+    def load(self, path: str, name: str = DEFAULT_MODEL) -> int:
+        """Carga un archivo de save_model (fuera del lock) y lo activa como versión nueva"""
+        model = self.loader(path)
+        return self.register(model, name, path=path, source="file")
+
+    def acquire(self, name: str = DEFAULT_MODEL) -> Tuple[int, object]:
+        """
+        Fija la versión activa de `name` para una petición
+
+        Returns:
+            (versión, modelo); hay que llamar a release(name, versión) al terminar
+        """
+        with self._lock:
+            version = self._active.get(name)
+            if version is None:
+                raise ModelNotFound(f"Modelo no encontrado: {name}")
+            entry = self._entries[(name, version)]
+            entry["refs"] += 1
+            return version, entry["model"]
+
+    def release(self, name: str, version: int) -> None:
+        """Libera una versión fijada; si ya estaba retirada y queda libre, se descarga"""
+        with self._lock:
+            entry = self._entries.get((name, version))
+            if entry is None:
+                return
+            entry["refs"] -= 1
+            evicted = self._evict_if_idle(name, version)
+        self._release_files([evicted])
+
+    @contextmanager
+    def pinned(self, name: str = DEFAULT_MODEL):
+        """Context manager sobre acquire/release que produce (versión, modelo)"""
+        version, model = self.acquire(name)
+        try:
+            yield version, model
+        finally:
+            self.release(name, version)
+
+    def active_version(self, name: str = DEFAULT_MODEL) -> Optional[int]:
+        """Versión activa de `name` (None si no existe)"""
+        with self._lock:
+            return self._active.get(name)
+
+    def list_models(self) -> List[Dict]:
+        """Versiones residentes (activas o retiradas aún en uso)"""
+        with self._lock:
+            return [
+                {
+                    "name": name,
+                    "version": version,
+                    "active": self._active.get(name) == version,
+                    "in_flight": entry["refs"],
+                    "path": entry["path"],
+                    "source": entry["source"],
+                    "loaded_at": entry["loaded_at"]
+                }
+                for (name, version), entry in sorted(self._entries.items())
+            ]
+
+    def _evict_if_idle(self, name: str, version: int) -> Optional[Dict]:
+        """Quita una versión retirada sin peticiones en curso (llamar con el lock tomado)"""
+        entry = self._entries.get((name, version))
+        if entry is None or entry["refs"] > 0 or self._active.get(name) == version:
+            return None
+        del self._entries[(name, version)]
+        if entry["owns_file"]:
+            # Otra versión cargada desde el mismo archivo hereda su borrado
+            real_path = os.path.realpath(entry["path"])
+            for other in self._entries.values():
+                if other["path"] and os.path.realpath(other["path"]) == real_path:
+                    other["owns_file"] = True
+                    return None
+        return entry
+
+    def _release_files(self, entries: List[Optional[Dict]]) -> None:
+        """Borra los archivos propios de las versiones descargadas"""
+        for entry in entries:
+            if entry is not None and entry["owns_file"] and entry["path"]:
+                # En Linux los mapas ya abiertos siguen siendo válidos tras borrar el archivo
+                try:
+                    os.remove(entry["path"])
+                except OSError:
+                    pass
@@ -22,6 +22,11 @@ sys.path.append(str(Path(__file__).parent.parent.parent / "src"))
 
 from ultra_efficient_llm import UltraEfficientLLM
 
+sys.path.append(str(Path(__file__).parent))
+from training_jobs import TrainingJobRunner
+from generation_pool import GenerationExecutor, GenerationQueueFull, GenerationTimeout, ReleasingStreamingResponse
+from model_registry import DEFAULT_MODEL, ModelNotFound, ModelRegistry
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -52,7 +57,12 @@ app.add_middleware(
 
 # Wrapper para el modelo real UltraEfficientLLM
 class UltraEfficientLLMWrapper:
-    def __init__(self, max_pattern_length=8, min_frequency=1, max_patterns=10000):
+    def __init__(self, max_pattern_length=8, min_frequency=1, max_patterns=10000, model=None):
+        if model is not None:
+            # Envolver un modelo ya entrenado (p. ej. el de un trabajo en segundo plano)
+            self.model = model
+            logger.info(f"🔧 Modelo UltraEfficientLLM entrenado cargado: {len(model.patterns)} patrones")
+            return
         self.model = UltraEfficientLLM(
             max_pattern_length=max_pattern_length,
             min_frequency=min_frequency,
@@ -86,6 +96,12 @@ class UltraEfficientLLMWrapper:
         logger.info(f"✅ Texto generado: '{generated_text[:50]}...'")
         return generated_text
         
+    def generate_stream(self, prompt, max_length=20, temperature=0.7):
+        """Generación real token a token"""
+        logger.info(f"🎨 Generando texto en streaming con prompt: '{prompt[:50]}...'")
+        logger.info(f"⚙️ Parámetros: max_length={max_length}, temperature={temperature}")
+        return self.model.generate_stream(prompt, max_length, temperature)
+        
     def get_efficiency_report(self):
         """Reporte real de eficiencia"""
         if not self.model.is_trained():
@@ -110,12 +126,20 @@ class UltraEfficientLLMWrapper:
         logger.info(f"🎯 Patrones activos encontrados: {len(active_patterns)}")
         return active_patterns
 
-# Global model instance
-model = UltraEfficientLLMWrapper()
+def load_model_file(path: str) -> UltraEfficientLLMWrapper:
+    """Carga un archivo de save_model (.uelm se mapea en memoria)"""
+    loaded_model = UltraEfficientLLM()
+    loaded_model.load_model(path)
+    return UltraEfficientLLMWrapper(model=loaded_model)
+
+# Modelos con nombre y versión; cada petición fija la versión activa al empezar
+registry = ModelRegistry(load_model_file)
 training_status = {
     "is_training": False,
     "progress": 0,
     "status": "idle",
+    "stage": None,
+    "job_id": None,
     "message": "Modelo no entrenado"
 }
 
@@ -124,18 +148,59 @@ UPLOADS_DIR = Path("uploads")
 UPLOADS_DIR.mkdir(exist_ok=True)
 logger.info(f"📁 Directorio de uploads creado: {UPLOADS_DIR.absolute()}")
 
+# Directorio de modelos entrenados por los trabajos en segundo plano
+MODELS_DIR = Path("models")
+
+# Runner de entrenamientos (se crea en el arranque)
+training_jobs: Optional[TrainingJobRunner] = None
+
+# Pool acotado de generación (workers, cola y timeout configurables por entorno)
+generation_pool = GenerationExecutor()
+logger.info(f"🧵 Pool de generación: {generation_pool.max_workers} workers, cola de {generation_pool.queue_size}, timeout {generation_pool.timeout:.0f}s")
+
+def on_training_update(job: dict):
+    """Refleja el estado de un trabajo de entrenamiento en training_status"""
+    logger.info(f"📈 Trabajo {job['job_id']}: {job['status']} - {job['message']} ({job['progress']}%)")
+    training_status.update({
+        "is_training": job["status"] in ("queued", "training"),
+        "progress": job["progress"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "job_id": job["job_id"],
+        "message": job["message"]
+    })
+
+def on_training_complete(job: dict, trained_model: UltraEfficientLLM):
+    """Activa el modelo recién entrenado como versión nueva (la anterior se descarga al quedar libre)"""
+    version = registry.register(UltraEfficientLLMWrapper(model=trained_model), job["model_name"],
+                                path=job["model_path"], owns_file=True, source="training")
+    on_training_update(job)
+    logger.info(f"🎉 Entrenamiento completado exitosamente: {job['model_name']} v{version}")
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize the model on startup"""
-    global model
     logger.info("🚀 Iniciando UltraEfficientLLM Web API...")
-    model = UltraEfficientLLMWrapper(
+    registry.register(UltraEfficientLLMWrapper(
         max_pattern_length=8,
         min_frequency=1,
         max_patterns=10000
+    ), DEFAULT_MODEL)
+    global training_jobs
+    training_jobs = TrainingJobRunner(
+        UltraEfficientLLM, MODELS_DIR,
+        on_update=on_training_update,
+        on_complete=on_training_complete
     )
     logger.info("✅ UltraEfficientLLM Web API iniciado con modelo real")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the background training pool"""
+    if training_jobs is not None:
+        training_jobs.shutdown()
+    generation_pool.shutdown()
+
 @app.get("/")
 async def root():
     """Root endpoint - redirect to API docs"""
@@ -149,7 +214,11 @@ async def root():
             "model_status": "/api/model/status",
             "upload": "/api/upload",
             "train": "/api/train",
+            "train_job": "/api/train/jobs/{job_id}",
             "generate": "/api/generate",
+            "generate_stream": "/api/generate/stream",
+            "models": "/api/models",
+            "models_load": "/api/models/load",
             "files": "/api/files",
             "docs": "/api/docs",
             "redoc": "/api/redoc"
@@ -164,37 +233,45 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "model_loaded": model is not None,
+        "model_loaded": registry.active_version() is not None,
         "version": "mock"
     }
 
 @app.get("/api/model/status")
-async def get_model_status():
+async def get_model_status(model_name: str = DEFAULT_MODEL):
     """Get current model status"""
-    global model, training_status
+    global training_status
     
     logger.info("📊 Consulta de estado del modelo")
     
-    if model is None:
+    try:
+        with registry.pinned(model_name) as (version, current_model):
+            stats = current_model.get_efficiency_report()
+            is_trained = current_model.model.is_trained()
+    except ModelNotFound:
         logger.warning("⚠️ Modelo no inicializado")
         return {
             "status": "not_initialized",
             "message": "Modelo no inicializado"
         }
     
-    stats = model.get_efficiency_report()
-    
     logger.info(f"📈 Estado actual: {training_status['status']}, Progreso: {training_status['progress']}%")
     
     return {
         "status": training_status["status"],
         "is_training": training_status["is_training"],
         "progress": training_status["progress"],
+        "stage": training_status["stage"],
+        "job_id": training_status["job_id"],
         "message": training_status["message"],
         "model_stats": stats,
         "patterns_stored": stats.get("patterns_stored", 0),
         "memory_kb": stats.get("memory_kb", 0),
-        "is_trained": model.model.is_trained() if hasattr(model, 'model') else False
+        "training_profile": stats.get("training_profile"),
+        "is_trained": is_trained,
+        "model_name": model_name,
+        "model_version": version,
+        "generation_pool": generation_pool.get_status()
     }
 
 @app.post("/api/upload")
@@ -240,15 +317,50 @@ async def upload_training_file(file: UploadFile = File(...)):
         logger.error(f"❌ Error al subir archivo: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error al subir archivo: {str(e)}")
 
-@app.post("/api/train")
+def read_training_files(filenames: List[str]) -> List[str]:
+    """Textos de los archivos subidos (columna texto/text de un CSV o párrafos de texto plano)"""
+    training_texts = []
+    
+    for filename in filenames:
+        file_path = UPLOADS_DIR / filename
+        if file_path.exists():
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                    
+                # Procesar contenido según el tipo de archivo
+                if filename.endswith('.csv'):
+                    # Procesar CSV
+                    import csv
+                    import io
+                    csv_reader = csv.DictReader(io.StringIO(content))
+                    for row in csv_reader:
+                        if 'texto' in row:
+                            training_texts.append(row['texto'])
+                        elif 'text' in row:
+                            training_texts.append(row['text'])
+                else:
+                    # Procesar texto plano
+                    paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
+                    training_texts.extend(paragraphs)
+                    
+                logger.info(f"✅ Archivo {filename} procesado: {len(training_texts)} textos")
+                
+            except Exception as e:
+                logger.error(f"❌ Error procesando archivo {filename}: {str(e)}")
+                continue
+    return training_texts
+
+@app.post("/api/train", status_code=202)
 async def train_model(
     files: List[str] = Form(...),
     max_patterns: int = Form(10000),
     max_pattern_length: int = Form(8),
-    min_frequency: int = Form(1)
+    min_frequency: int = Form(1),
+    model_name: str = Form(DEFAULT_MODEL)
 ):
-    """Train the model with uploaded files"""
-    global model, training_status
+    """Start training the model with uploaded files in the background"""
+    global training_status
     
     logger.info(f"🎯 Iniciando entrenamiento con {len(files)} archivos")
     logger.info(f"⚙️ Parámetros: max_patterns={max_patterns}, max_pattern_length={max_pattern_length}, min_frequency={min_frequency}")
@@ -261,100 +373,31 @@ async def train_model(
         logger.error("❌ No se proporcionaron archivos")
         raise HTTPException(status_code=400, detail="No se proporcionaron archivos")
     
-    # Start training
-    logger.info("🚀 Iniciando proceso de entrenamiento...")
-    training_status.update({
-        "is_training": True,
-        "progress": 0,
-        "status": "training",
-        "message": "Iniciando entrenamiento..."
-    })
-    
     try:
-        # Leer archivos de entrenamiento
+        # Leer y partir los archivos en un hilo: con archivos grandes bloquearía el event loop
         logger.info("📖 Leyendo archivos de entrenamiento...")
-        training_texts = []
-        
-        for filename in files:
-            file_path = UPLOADS_DIR / filename
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        
-                    # Procesar contenido según el tipo de archivo
-                    if filename.endswith('.csv'):
-                        # Procesar CSV
-                        import csv
-                        import io
-                        csv_reader = csv.DictReader(io.StringIO(content))
-                        for row in csv_reader:
-                            if 'texto' in row:
-                                training_texts.append(row['texto'])
-                            elif 'text' in row:
-                                training_texts.append(row['text'])
-                    else:
-                        # Procesar texto plano
-                        paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-                        training_texts.extend(paragraphs)
-                        
-                    logger.info(f"✅ Archivo {filename} procesado: {len(training_texts)} textos")
-                    
-                except Exception as e:
-                    logger.error(f"❌ Error procesando archivo {filename}: {str(e)}")
-                    continue
-        
-        training_status.update({
-            "progress": 25,
-            "message": f"Leyendo archivos... {len(training_texts)} textos encontrados"
-        })
+        training_texts = await asyncio.to_thread(read_training_files, files)
         
         if not training_texts:
             raise Exception("No se pudieron extraer textos válidos de los archivos")
         
-        logger.info("🔍 Extrayendo patrones...")
-        training_status.update({
-            "progress": 50,
-            "message": "Extrayendo patrones..."
-        })
-        
-        logger.info("🧠 Inicializando modelo...")
-        # Initialize model with new parameters
-        model = UltraEfficientLLMWrapper(
-            max_pattern_length=max_pattern_length,
-            min_frequency=min_frequency,
-            max_patterns=max_patterns
-        )
-        
-        training_status.update({
-            "progress": 75,
-            "message": "Entrenando modelo..."
-        })
-        
-        # Train model with real data
-        model.train(training_texts)
-        
-        training_status.update({
-            "is_training": False,
-            "progress": 100,
-            "status": "trained",
-            "message": f"Entrenamiento completado. {len(files)} archivos procesados."
-        })
-        
-        logger.info("🎉 Entrenamiento completado exitosamente")
-        
-        # Get final stats
-        stats = model.get_efficiency_report()
+        # El entrenamiento corre en el pool de procesos; el modelo actual sigue sirviendo
+        logger.info("🚀 Enviando entrenamiento al pool de procesos...")
+        job = training_jobs.submit(training_texts, {
+            "max_pattern_length": max_pattern_length,
+            "min_frequency": min_frequency,
+            "max_patterns": max_patterns
+        }, model_name=model_name)
         
         return {
-            "message": "Entrenamiento completado exitosamente",
+            "message": "Entrenamiento iniciado",
+            "job_id": job["job_id"],
+            "model_name": model_name,
+            "status_url": f"/api/train/jobs/{job['job_id']}",
             "training_data": {
                 "files_processed": len(files),
-                "texts_processed": len(training_texts),
-                "patterns_extracted": stats.get("patterns_stored", 0),
-                "memory_used_kb": stats.get("memory_kb", 0)
-            },
-            "model_stats": stats
+                "texts_processed": len(training_texts)
+            }
         }
         
     except Exception as e:
@@ -366,56 +409,188 @@ async def train_model(
         })
         raise HTTPException(status_code=500, detail=f"Error en entrenamiento: {str(e)}")
 
+@app.get("/api/train/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """Get the status of a background training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        logger.warning(f"⚠️ Trabajo de entrenamiento no encontrado: {job_id}")
+        raise HTTPException(status_code=404, detail="Trabajo de entrenamiento no encontrado")
+    return job
+
 @app.post("/api/generate")
 async def generate_text(
     prompt: str = Form(...),
     max_length: int = Form(20),
-    temperature: float = Form(0.7)
+    temperature: float = Form(0.7),
+    model_name: str = Form(DEFAULT_MODEL)
 ):
     """Generate text using the trained model"""
-    global model, training_status
+    global training_status
     
     logger.info(f"🎨 Solicitud de generación de texto")
     logger.info(f"📝 Prompt: '{prompt[:50]}...'")
     logger.info(f"⚙️ Parámetros: max_length={max_length}, temperature={temperature}")
     
-    if model is None:
-        logger.error("❌ Modelo no inicializado")
+    # Fija la versión activa: un reentrenamiento puede activar otra mientras tanto
+    try:
+        version, current_model = registry.acquire(model_name)
+    except ModelNotFound:
+        logger.error(f"❌ Modelo no inicializado: {model_name}")
         raise HTTPException(status_code=400, detail="Modelo no inicializado")
     
-    if not model.model.is_trained():
+    if not current_model.model.is_trained():
+        registry.release(model_name, version)
         logger.warning("⚠️ Modelo no entrenado")
         raise HTTPException(status_code=400, detail="Modelo no entrenado. Entrene primero el modelo.")
     
-    try:
+    def run_generation():
         # Generate text
-        generated_text = model.generate(
+        generated_text = current_model.generate(
             prompt=prompt,
             max_length=max_length,
             temperature=temperature
         )
         
         # Get active patterns for analysis
-        active_patterns = model._get_active_patterns(prompt)
-        
-        logger.info(f"✅ Generación completada: '{generated_text[:50]}...'")
-        
-        return {
-            "prompt": prompt,
-            "generated_text": generated_text,
-            "parameters": {
-                "max_length": max_length,
-                "temperature": temperature
-            },
-            "analysis": {
-                "active_patterns": len(active_patterns),
-                "patterns": [{"pattern": p[0], "score": p[1]} for p in active_patterns[:5]]
-            }
-        }
-        
+        active_patterns = current_model._get_active_patterns(prompt)
+        return generated_text, active_patterns
+    
+    try:
+        # La generación corre en el pool de hilos: el event loop sigue atendiendo peticiones
+        generated_text, active_patterns = await generation_pool.run(
+            run_generation,
+            # El modelo fijado se libera cuando el trabajo termina o se cancela en cola
+            cleanup=lambda: registry.release(model_name, version)
+        )
+    except GenerationQueueFull as e:
+        logger.warning(f"⚠️ {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except GenerationTimeout as e:
+        logger.error(f"⏰ {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"❌ Error en generación: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error en generación: {str(e)}")
+    
+    logger.info(f"✅ Generación completada: '{generated_text[:50]}...'")
+    
+    return {
+        "prompt": prompt,
+        "generated_text": generated_text,
+        "parameters": {
+            "max_length": max_length,
+            "temperature": temperature
+        },
+        "analysis": {
+            "active_patterns": len(active_patterns),
+            "patterns": [{"pattern": p[0], "score": p[1]} for p in active_patterns[:5]]
+        },
+        "model_name": model_name,
+        "model_version": version
+    }
+
+def sse_event(event: str, data: dict) -> str:
+    """Formatea un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/generate/stream")
+async def generate_text_stream(
+    prompt: str,
+    max_length: int = 20,
+    temperature: float = 0.7,
+    model_name: str = DEFAULT_MODEL
+):
+    """Generate text token by token as Server-Sent Events"""
+    global training_status
+    
+    logger.info(f"🎨 Solicitud de generación en streaming")
+    logger.info(f"📝 Prompt: '{prompt[:50]}...'")
+    
+    # La versión queda fijada hasta que termina el stream
+    try:
+        version, stream_model = registry.acquire(model_name)
+    except ModelNotFound:
+        logger.error(f"❌ Modelo no inicializado: {model_name}")
+        raise HTTPException(status_code=400, detail="Modelo no inicializado")
+    
+    if not stream_model.model.is_trained():
+        registry.release(model_name, version)
+        logger.warning("⚠️ Modelo no entrenado")
+        raise HTTPException(status_code=400, detail="Modelo no entrenado. Entrene primero el modelo.")
+    
+    # El streaming comparte el límite de peticiones admitidas con /api/generate
+    if not generation_pool.try_acquire():
+        registry.release(model_name, version)
+        logger.warning("⚠️ Cola de generación llena")
+        raise HTTPException(status_code=429, detail="Cola de generación llena", headers={"Retry-After": "1"})
+    
+    def events():
+        # Iterador síncrono: Starlette lo consume en su threadpool sin bloquear el event loop
+        tokens = []
+        try:
+            for event in stream_model.generate_stream(prompt, max_length, temperature):
+                tokens.append(event["token"])
+                yield sse_event("token", event)
+            prompt_tokens = stream_model.model._smart_tokenize(prompt)
+            logger.info(f"✅ Streaming completado: {len(tokens)} tokens")
+            yield sse_event("done", {
+                "prompt": prompt,
+                "generated_text": " ".join(prompt_tokens + tokens),
+                "tokens_generated": len(tokens),
+                "model_version": version
+            })
+        except Exception as e:
+            logger.error(f"❌ Error en generación: {str(e)}")
+            yield sse_event("error", {"detail": f"Error en generación: {str(e)}"})
+    
+    def release_stream():
+        generation_pool.release()
+        registry.release(model_name, version)
+    
+    # La plaza y la versión se liberan al salir de la respuesta, aunque el
+    # cliente se desconecte antes de que el generador llegue a arrancar
+    return ReleasingStreamingResponse(
+        events(),
+        release_stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/models")
+async def list_models():
+    """List the resident model versions"""
+    logger.info("🗂️ Listando versiones de modelos")
+    return {"models": registry.list_models()}
+
+@app.post("/api/models/load")
+async def load_model_version(
+    filename: str = Form(...),
+    model_name: str = Form(DEFAULT_MODEL)
+):
+    """Load a saved model from the models directory as a new active version"""
+    logger.info(f"📦 Cargando modelo {filename} como '{model_name}'")
+    
+    models_root = MODELS_DIR.resolve()
+    model_file = (MODELS_DIR / filename).resolve()
+    # Solo archivos dentro de MODELS_DIR (los pickles ejecutan código al cargarse)
+    if models_root not in model_file.parents or not model_file.is_file():
+        logger.error(f"❌ Modelo no encontrado: {filename}")
+        raise HTTPException(status_code=404, detail=f"Modelo no encontrado: {filename}")
+    
+    try:
+        # La carga corre fuera del event loop; las peticiones siguen con la versión actual
+        version = await asyncio.to_thread(registry.load, str(model_file), model_name)
+    except Exception as e:
+        logger.error(f"❌ Error al cargar modelo: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al cargar modelo: {str(e)}")
+    
+    logger.info(f"✅ Modelo '{model_name}' v{version} activo")
+    return {
+        "message": "Modelo cargado exitosamente",
+        "model_name": model_name,
+        "model_version": version
+    }
 
 @app.get("/api/files")
 async def list_uploaded_files():
@@ -456,20 +631,22 @@ async def delete_file(filename: str):
 @app.post("/api/reset")
 async def reset_model():
     """Reset the model to initial state"""
-    global model, training_status
+    global training_status
     
     logger.info("🔄 Reiniciando modelo")
     
-    model = UltraEfficientLLMWrapper(
+    registry.register(UltraEfficientLLMWrapper(
         max_pattern_length=8,
         min_frequency=1,
         max_patterns=10000
-    )
+    ), DEFAULT_MODEL)
     
     training_status.update({
         "is_training": False,
         "progress": 0,
         "status": "idle",
+        "stage": None,
+        "job_id": None,
         "message": "Modelo reiniciado"
     })
     
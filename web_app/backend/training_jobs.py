@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Entrenamiento en segundo plano para la API web
+
+Los entrenamientos se ejecutan en un pool de procesos, así que el event loop
+de FastAPI (y endpoints como /api/health) sigue respondiendo mientras tanto.
+Cada trabajo guarda su modelo en formato .uelm y el proceso de la API lo
+mapea en memoria al terminar y lo registra como versión nueva (ver
+model_registry).
+"""
+
+import concurrent.futures
+import multiprocessing
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Cola de progreso heredada por los procesos worker (ver _init_worker)
+_progress_queue = None
+
+
+def _init_worker(progress_queue) -> None:
+    """Inicializador de cada proceso del pool: guarda la cola de progreso"""
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def run_training_job(job_id: str, model_class, model_params: Dict, texts: List[str], model_path: str) -> Dict:
+    """
+    Entrena un modelo en el proceso worker y lo guarda en `model_path`
+
+    Returns:
+        Dict: reporte de eficiencia del modelo entrenado
+    """
+    def report(stage: str, progress: int) -> None:
+        _progress_queue.put((job_id, stage, progress))
+
+    model = model_class(**model_params)
+    model.train(texts, progress_callback=report)
+    model.save_model(model_path)
+    return model.get_efficiency_report()
+
+
+class TrainingJobRunner:
+    """
+    Cola de trabajos de entrenamiento sobre un ProcessPoolExecutor
+
+    `on_update(job)` se llama con cada cambio de etapa y `on_complete(job, model)`
+    con el modelo ya cargado desde job["model_path"], para que el backend lo
+    registre como versión nueva.
+    """
+
+    STAGE_MESSAGES = {
+        'extract': "Extrayendo patrones...",
+        'filter': "Filtrando patrones por utilidad...",
+        'graph': "Construyendo grafo de transiciones...",
+        'embed': "Creando embeddings e índices...",
+        'done': "Guardando modelo..."
+    }
+
+    def __init__(self, model_class, models_dir: Path,
+                 on_update: Callable[[Dict], None],
+                 on_complete: Callable[[Dict, object], None],
+                 max_workers: int = 1):
+        self.model_class = model_class
+        self.models_dir = Path(models_dir)
+        self.models_dir.mkdir(exist_ok=True)
+        self.on_update = on_update
+        self.on_complete = on_complete
+        self.jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        self._progress_queue = multiprocessing.Queue()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(self._progress_queue,)
+        )
+        self._listener = threading.Thread(target=self._listen_progress, daemon=True)
+        self._listener.start()
+
+    def submit(self, texts: List[str], model_params: Dict, model_name: str = "default") -> Dict:
+        """Encola un entrenamiento y devuelve su trabajo sin esperar a que termine"""
+        job_id = uuid.uuid4().hex[:12]
+        model_path = self.models_dir / f"{job_id}.uelm"
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "stage": None,
+            "progress": 0,
+            "message": f"Entrenamiento en cola con {len(texts)} textos",
+            "texts": len(texts),
+            "parameters": model_params,
+            "model_name": model_name,
+            "model_path": str(model_path),
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+
+        future = self._executor.submit(run_training_job, job_id, self.model_class,
+                                       model_params, texts, str(model_path))
+        future.add_done_callback(lambda f: self._finish(job_id, model_path, f))
+        self.on_update(dict(job))
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Copia del estado de un trabajo, o None si no existe"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def shutdown(self) -> None:
+        """Detiene el pool y el hilo que escucha el progreso"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._progress_queue.put(None)
+
+    def _listen_progress(self) -> None:
+        """Traslada los avisos de etapa de los workers al estado de cada trabajo"""
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                break
+            job_id, stage, progress = message
+            with self._lock:
+                job = self.jobs.get(job_id)
+                # Un aviso tardío no debe pisar el estado final del trabajo
+                if job is None or job["status"] not in ("queued", "training"):
+                    continue
+                job.update({
+                    "status": "training",
+                    "stage": stage,
+                    "progress": progress,
+                    "message": self.STAGE_MESSAGES.get(stage, stage)
+                })
+                snapshot = dict(job)
+            self.on_update(snapshot)
+
+    def _finish(self, job_id: str, model_path: Path, future: concurrent.futures.Future) -> None:
+        """Carga el modelo entrenado y lo entrega al backend (o registra el error)"""
+        model = None
+        try:
+            result = future.result()
+            model = self.model_class()
+            model.load_model(str(model_path))
+            update = {
+                "status": "trained",
+                "stage": "done",
+                "progress": 100,
+                "message": f"Entrenamiento completado. {result.get('patterns_stored', 0)} patrones extraídos.",
+                "result": result
+            }
+        except Exception as e:
+            update = {
+                "status": "error",
+                "message": f"Error en entrenamiento: {str(e)}",
+                "error": str(e)
+            }
+
+        with self._lock:
+            job = self.jobs[job_id]
+            job.update(update)
+            job["finished_at"] = datetime.now().isoformat()
+            snapshot = dict(job)
+
+        if model is not None:
+            self.on_complete(snapshot, model)
+        else:
+            self.on_update(snapshot)
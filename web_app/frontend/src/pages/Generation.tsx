@@ -1,7 +1,7 @@
-import { useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Send, Copy, RotateCcw, MessageSquare, Settings, Lightbulb, BarChart3, Zap } from 'lucide-react';
 import toast from 'react-hot-toast';
-import { generateText } from '../services/api';
+import { generateText, streamText } from '../services/api';
 import { GenerationResult } from '../types';
 
 const Generation: React.FC = () => {
@@ -10,6 +10,40 @@ const Generation: React.FC = () => {
   const [temperature, setTemperature] = useState(0.7);
   const [generating, setGenerating] = useState(false);
   const [result, setResult] = useState<GenerationResult | null>(null);
+  const [streaming, setStreaming] = useState(false);
+  const [streamedText, setStreamedText] = useState('');
+  const sourceRef = useRef<EventSource | null>(null);
+
+  // Cerrar el stream abierto al salir de la página
+  useEffect(() => () => sourceRef.current?.close(), []);
+
+  const closeStream = () => {
+    sourceRef.current?.close();
+    sourceRef.current = null;
+  };
+
+  const handleStream = () => {
+    closeStream();
+    setResult(null);
+    setStreamedText(prompt.trim());
+    sourceRef.current = streamText(
+      prompt,
+      (token) => setStreamedText((text) => `${text} ${token.token}`),
+      (generatedText) => {
+        sourceRef.current = null;
+        setStreamedText(generatedText);
+        setGenerating(false);
+        toast.success('Texto generado exitosamente');
+      },
+      (detail) => {
+        sourceRef.current = null;
+        setGenerating(false);
+        toast.error(detail);
+      },
+      maxLength,
+      temperature
+    );
+  };
 
   const handleGenerate = async () => {
     if (!prompt.trim()) {
@@ -18,6 +52,11 @@ const Generation: React.FC = () => {
     }
 
     setGenerating(true);
+    if (streaming) {
+      handleStream();
+      return;
+    }
+    setStreamedText('');
     try {
       const response = await generateText(prompt, maxLength, temperature);
       setResult(response);
@@ -30,13 +69,17 @@ const Generation: React.FC = () => {
   };
 
   const handleCopy = () => {
-    if (result) {
-      navigator.clipboard.writeText(result.generated_text);
+    const text = result ? result.generated_text : streamedText;
+    if (text) {
+      navigator.clipboard.writeText(text);
       toast.success('Texto copiado al portapapeles');
     }
   };
 
   const handleReset = () => {
+    closeStream();
+    setGenerating(false);
+    setStreamedText('');
     setPrompt('');
     setMaxLength(20);
     setTemperature(0.7);
@@ -123,6 +166,17 @@ const Generation: React.FC = () => {
             </div>
           </div>
 
+          <label className="flex items-center space-x-3 text-sm font-bold text-slate-300 cursor-pointer">
+            <input
+              type="checkbox"
+              checked={streaming}
+              onChange={(e) => setStreaming(e.target.checked)}
+              disabled={generating}
+              className="checkbox-custom"
+            />
+            <span>Streaming (mostrar los tokens a medida que se generan)</span>
+          </label>
+
           <div className="flex items-center justify-between pt-6">
             <button
               onClick={handleReset}
@@ -153,7 +207,7 @@ const Generation: React.FC = () => {
       </div>
 
       {/* Results Section */}
-      {result && (
+      {(result || streamedText) && (
         <div className="space-y-6">
           {/* Generated Text */}
           <div className="card card-highlight hover-lift">
@@ -173,60 +227,64 @@ const Generation: React.FC = () => {
               </button>
             </div>
             <div className="bg-slate-800/50 rounded-xl p-6 border border-slate-600/50 backdrop-blur-sm">
-              <p className="text-slate-100 whitespace-pre-wrap leading-relaxed">{result.generated_text}</p>
+              <p className="text-slate-100 whitespace-pre-wrap leading-relaxed">
+                {result ? result.generated_text : streamedText}
+              </p>
             </div>
           </div>
 
           {/* Analysis */}
-          <div className="card hover-lift">
-            <div className="flex items-center space-x-4 mb-6">
-              <div className="p-2 bg-purple-500/20 rounded-lg backdrop-blur-sm border border-purple-400/30">
-                <BarChart3 className="h-8 w-8 text-purple-400" />
-              </div>
-              <h2 className="text-2xl font-bold text-white">Análisis</h2>
-            </div>
-            <div className="grid grid-cols-1 md:grid-cols-2 gap-8">
-              <div className="p-4 bg-slate-800/50 rounded-xl border border-slate-600/50 backdrop-blur-sm">
-                <h3 className="font-bold text-white mb-4">Parámetros Utilizados</h3>
-                <div className="space-y-3">
-                  <div className="flex justify-between">
-                    <span className="text-slate-300">Prompt:</span>
-                    <span className="font-medium text-white">{result.prompt}</span>
-                  </div>
-                  <div className="flex justify-between">
-                    <span className="text-slate-300">Longitud Máxima:</span>
-                    <span className="font-medium text-emerald-400">{result.parameters.max_length}</span>
-                  </div>
-                  <div className="flex justify-between">
-                    <span className="text-slate-300">Temperatura:</span>
-                    <span className="font-medium text-blue-400">{result.parameters.temperature}</span>
-                  </div>
+          {result && (
+            <div className="card hover-lift">
+              <div className="flex items-center space-x-4 mb-6">
+                <div className="p-2 bg-purple-500/20 rounded-lg backdrop-blur-sm border border-purple-400/30">
+                  <BarChart3 className="h-8 w-8 text-purple-400" />
                 </div>
+                <h2 className="text-2xl font-bold text-white">Análisis</h2>
               </div>
-              <div className="p-4 bg-slate-800/50 rounded-xl border border-slate-600/50 backdrop-blur-sm">
-                <h3 className="font-bold text-white mb-4">Patrones Activos</h3>
-                <div className="space-y-3">
-                  <div className="flex justify-between">
-                    <span className="text-slate-300">Total de Patrones:</span>
-                    <span className="font-medium text-purple-400">{result.analysis.active_patterns}</span>
+              <div className="grid grid-cols-1 md:grid-cols-2 gap-8">
+                <div className="p-4 bg-slate-800/50 rounded-xl border border-slate-600/50 backdrop-blur-sm">
+                  <h3 className="font-bold text-white mb-4">Parámetros Utilizados</h3>
+                  <div className="space-y-3">
+                    <div className="flex justify-between">
+                      <span className="text-slate-300">Prompt:</span>
+                      <span className="font-medium text-white">{result.prompt}</span>
+                    </div>
+                    <div className="flex justify-between">
+                      <span className="text-slate-300">Longitud Máxima:</span>
+                      <span className="font-medium text-emerald-400">{result.parameters.max_length}</span>
+                    </div>
+                    <div className="flex justify-between">
+                      <span className="text-slate-300">Temperatura:</span>
+                      <span className="font-medium text-blue-400">{result.parameters.temperature}</span>
+                    </div>
                   </div>
-                  {result.analysis.patterns.length > 0 && (
-                    <div>
-                      <span className="text-slate-300 block mb-3">Patrones Principales:</span>
-                      <div className="space-y-2">
-                        {result.analysis.patterns.map((pattern, index) => (
-                          <div key={index} className="flex justify-between text-sm p-2 bg-slate-700/50 rounded-lg">
-                            <span className="text-slate-300">{pattern.pattern}</span>
-                            <span className="font-medium text-amber-400">{pattern.score.toFixed(3)}</span>
-                          </div>
-                        ))}
-                      </div>
+                </div>
+                <div className="p-4 bg-slate-800/50 rounded-xl border border-slate-600/50 backdrop-blur-sm">
+                  <h3 className="font-bold text-white mb-4">Patrones Activos</h3>
+                  <div className="space-y-3">
+                    <div className="flex justify-between">
+                      <span className="text-slate-300">Total de Patrones:</span>
+                      <span className="font-medium text-purple-400">{result.analysis.active_patterns}</span>
                     </div>
-                  )}
+                    {result.analysis.patterns.length > 0 && (
+                      <div>
+                        <span className="text-slate-300 block mb-3">Patrones Principales:</span>
+                        <div className="space-y-2">
+                          {result.analysis.patterns.map((pattern, index) => (
+                            <div key={index} className="flex justify-between text-sm p-2 bg-slate-700/50 rounded-lg">
+                              <span className="text-slate-300">{pattern.pattern}</span>
+                              <span className="font-medium text-amber-400">{pattern.score.toFixed(3)}</span>
+                            </div>
+                          ))}
+                        </div>
+                      </div>
+                    )}
+                  </div>
                 </div>
               </div>
             </div>
-          </div>
+          )}
         </div>
       )}
 
@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react';
 import { useDropzone } from 'react-dropzone';
 import { Upload, File, Trash2, Play, Settings, RefreshCw, Wifi, WifiOff, Zap, Brain, Database, Cpu, Activity } from 'lucide-react';
 import toast from 'react-hot-toast';
-import { uploadFile, listFiles, deleteFile, trainModel, getModelStatus } from '../services/api';
+import { uploadFile, listFiles, deleteFile, trainModel, getTrainingJob, getModelStatus } from '../services/api';
 import { UploadedFile, TrainingConfig } from '../types';
 
 const Training: React.FC = () => {
@@ -204,8 +204,21 @@ const Training: React.FC = () => {
     try {
       console.log('🎯 Iniciando entrenamiento con archivos:', selectedFiles);
       const result = await trainModel(selectedFiles, config);
+      console.log('Training job:', result);
+      toast.success('Entrenamiento iniciado');
+      
+      // El backend entrena en segundo plano: consultar el trabajo hasta que termine
+      let job = await getTrainingJob(result.job_id);
+      while (job.status === 'queued' || job.status === 'training') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = await getTrainingJob(result.job_id);
+        await fetchModelStatus();
+      }
+      
+      if (job.status === 'error') {
+        throw new Error(job.error || job.message);
+      }
       toast.success('Entrenamiento completado exitosamente');
-      console.log('Training result:', result);
     } catch (error: any) {
       console.error('❌ Error durante el entrenamiento:', error);
       const errorMessage = error.response?.data?.detail || error.message || 'Error desconocido';
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { ModelStatus, UploadedFile, TrainingResult, GenerationResult, TrainingConfig } from '../types';
+import { ModelStatus, UploadedFile, TrainingResult, GenerationResult, TrainingConfig, StreamedToken, TrainingJob } from '../types';
 
 // Configuración de la API - Usar URL directa al backend
 const API_BASE_URL = 'http://localhost:8000/api';
@@ -135,10 +135,10 @@ export const trainModel = async (
       headers: {
         'Content-Type': 'multipart/form-data',
       },
-      timeout: 60000, // 60 segundos para entrenamiento
+      timeout: 60000, // 60 segundos para subir los textos; el entrenamiento sigue en segundo plano
     });
     
-    console.log('✅ Entrenamiento completado:', response.data);
+    console.log('✅ Entrenamiento iniciado:', response.data);
     return response.data;
   } catch (error) {
     console.error('❌ Error en entrenamiento:', error);
@@ -146,6 +146,17 @@ export const trainModel = async (
   }
 };
 
+// Training job status
+export const getTrainingJob = async (jobId: string): Promise<TrainingJob> => {
+  try {
+    const response = await api.get(`/train/jobs/${jobId}`);
+    return response.data;
+  } catch (error) {
+    console.error('❌ Error obteniendo trabajo de entrenamiento:', error);
+    throw error;
+  }
+};
+
 // Generate text
 export const generateText = async (
   prompt: string,
@@ -174,6 +185,42 @@ export const generateText = async (
   }
 };
 
+// Generate text token by token (Server-Sent Events)
+export const streamText = (
+  prompt: string,
+  onToken: (token: StreamedToken) => void,
+  onDone: (generatedText: string) => void,
+  onError: (detail: string) => void,
+  maxLength: number = 20,
+  temperature: number = 0.7
+): EventSource => {
+  console.log('🎨 Generando texto en streaming con prompt:', prompt);
+  const params = new URLSearchParams({
+    prompt,
+    max_length: maxLength.toString(),
+    temperature: temperature.toString(),
+  });
+  const source = new EventSource(`${API_BASE_URL}/generate/stream?${params}`);
+  
+  source.addEventListener('token', (event) => {
+    onToken(JSON.parse((event as MessageEvent).data));
+  });
+  source.addEventListener('done', (event) => {
+    const data = JSON.parse((event as MessageEvent).data);
+    console.log('✅ Streaming completado:', data);
+    source.close();
+    onDone(data.generated_text);
+  });
+  source.addEventListener('error', (event) => {
+    const data = (event as MessageEvent).data;
+    console.error('❌ Error en streaming:', data);
+    source.close();
+    onError(data ? JSON.parse(data).detail : 'Conexión de streaming interrumpida');
+  });
+  
+  return source;
+};
+
 // Reset model
 export const resetModel = async () => {
   try {
@@ -1,7 +1,9 @@
 export interface ModelStatus {
-  status: 'idle' | 'training' | 'trained' | 'error' | 'not_initialized';
+  status: 'idle' | 'queued' | 'training' | 'trained' | 'error' | 'not_initialized';
   is_training: boolean;
   progress: number;
+  stage?: 'extract' | 'filter' | 'graph' | 'embed' | 'done' | null;
+  job_id?: string | null;
   message: string;
   model_stats: {
     patterns_stored?: number;
@@ -10,6 +12,8 @@ export interface ModelStatus {
   };
   patterns_stored: number;
   memory_kb: number;
+  model_name?: string;
+  model_version?: number;
 }
 
 export interface UploadedFile {
@@ -20,17 +24,36 @@ export interface UploadedFile {
 
 export interface TrainingResult {
   message: string;
+  job_id: string;
+  status_url: string;
   training_data: {
     files_processed: number;
-    lines_processed: number;
-    patterns_extracted: number;
-    memory_used_kb: number;
+    lines_processed?: number;
+    texts_processed?: number;
   };
-  model_stats: {
+}
+
+export interface TrainingJob {
+  job_id: string;
+  status: 'queued' | 'training' | 'trained' | 'error';
+  model_name: string;
+  stage: 'extract' | 'filter' | 'graph' | 'embed' | 'done' | null;
+  progress: number;
+  message: string;
+  created_at: string;
+  finished_at: string | null;
+  result: {
     patterns_stored: number;
     memory_kb: number;
-    sparsity: number;
-  };
+  } | null;
+  error: string | null;
+}
+
+export interface StreamedToken {
+  token: string;
+  index: number;
+  step_ms: number;
+  active_patterns: number;
 }
 
 export interface GenerationResult {
@@ -47,6 +70,8 @@ export interface GenerationResult {
       score: number;
     }>;
   };
+  model_name?: string;
+  model_version?: number;
 }
 
 export interface TrainingConfig {
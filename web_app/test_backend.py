@@ -4,6 +4,7 @@ Script de prueba para verificar el funcionamiento del backend
 """
 
 import requests
+import time
 import json
 import os
 from pathlib import Path
@@ -99,7 +100,16 @@ def test_train_model():
         response = requests.post(f"{BACKEND_URL}/api/train", data=data)
         print(f"✅ Status: {response.status_code}")
         print(f"📄 Response: {response.json()}")
-        return True
+        
+        # El entrenamiento corre en segundo plano: esperar a que el trabajo termine
+        job_id = response.json()['job_id']
+        while True:
+            job = requests.get(f"{BACKEND_URL}/api/train/jobs/{job_id}").json()
+            print(f"⏳ {job['status']} - {job['message']} ({job['progress']}%)")
+            if job['status'] not in ('queued', 'training'):
+                break
+            time.sleep(1)
+        return job['status'] == 'trained'
     except Exception as e:
         print(f"❌ Error: {e}")
         return False